@@ -0,0 +1,155 @@
+"""
+Measures IContactClient against the local FakeIContactServer: throughput,
+p50/p99 request latency and peak memory for single calls, bulk imports,
+pagination, streaming, stats parsing, stats aggregation across many messages
+and lookups in a synced SQLite mirror.
+
+Usage: python benchmarks/client.py [options] [scenario ...]
+
+  --contacts N       contacts on the server, and rows in the import (10000)
+  --latency SECONDS  latency the server adds to every response (0.0)
+  --throttle-rate F  fraction of requests answered 503 (0.0)
+  --error-rate F     fraction of requests answered 500 (0.0)
+  --compress         use gzip compression, and report the bytes received
+  --adaptive         use an adaptive concurrency limiter and circuit breaker
+
+Each scenario runs in a fresh interpreter, against a fresh server in this
+process, so that its peak RSS is the client's own. Request latencies are
+taken from the client's RequestEvents.
+"""
+import optparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = ('single', 'bulk', 'paging', 'streaming', 'stats', 'aggregate', 'mirror')
+SINGLE_CALLS = 500
+AGGREGATE_MESSAGES = 500
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def run(scenario, url, count, compress=False, adaptive=False):
+    from icontact.client import IContactClient
+    from icontact.retry import RetryPolicy
+
+    client = IContactClient('key', 'user', 'password', url=url,
+                            retry_policy=RetryPolicy(base_delay=0.01), compress=compress,
+                            concurrency_limiter=adaptive, circuit_breaker=adaptive)
+    client.lists()
+    latencies = []
+    client.add_observer(lambda event: latencies.append(event.total_time))
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if scenario == 'single':
+        items = SINGLE_CALLS
+        for i in range(items):
+            client.search_contacts(email='user%d@example.com' % (i * 7 % count))
+    elif scenario == 'bulk':
+        items = count
+        rows = (dict(email='import%d@example.com' % i, firstName='Import%d' % i)
+                for i in range(count))
+        result = client.create_contacts(rows, chunk_size=500, max_workers=4)
+        assert not result.errors, result.errors[:1]
+    elif scenario == 'paging':
+        items = 0
+        for contact in client.iter_contacts(page_size=500, prefetch=True):
+            items += 1
+    elif scenario == 'streaming':
+        items = 0
+        for contact in client.stream_contacts(limit=str(count), raw=True):
+            items += 1
+    elif scenario == 'stats':
+        message_id = client.messages().messages[0].messageId
+        contacts = client.message_delivery_details(message_id, 'released')['contacts']
+        items = len(contacts)
+        assert all(contact.dates for contact in contacts), 'dates were not parsed'
+    elif scenario == 'aggregate':
+        from icontact.aggregate import collect_stats
+        stats = collect_stats(client, max_workers=8)
+        stats.by_day()
+        stats.by_list()
+        items = len(stats)
+    elif scenario == 'mirror':
+        from icontact.mirror import Mirror
+        mirror = Mirror(client, ':memory:')
+        mirror.sync()
+        latencies = []
+        start = time.time()
+        items = SINGLE_CALLS
+        for i in range(items):
+            lookup_start = time.time()
+            mirror.contact_id('user%d@example.com' % (i * 7 % count))
+            latencies.append(time.time() - lookup_start)
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss
+    print('%-10s %8d items %10.0f items/s %8.3f ms p50 %8.3f ms p99 %4d requests '
+          '%8d KB peak RSS growth' % (
+              scenario, items, items / elapsed, percentile(latencies, 0.5) * 1000,
+              percentile(latencies, 0.99) * 1000, len(latencies), peak))
+    if compress:
+        traffic = client.traffic.stats()
+        print('%10s %8d KB received, %d KB before decompression' % (
+            '', traffic['wire_bytes_in'] // 1024, traffic['bytes_in'] // 1024))
+    if adaptive:
+        limiter = client.concurrency_limiter.stats()
+        print('%10s concurrency limit %.1f, %d decreases, circuit %s' % (
+            '', limiter['limit'], limiter['decreases'], client.circuit_breaker.state))
+    sys.stdout.flush()
+    client.transport.clear()
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [scenario ...]')
+    parser.add_option('--contacts', type='int', default=10000)
+    parser.add_option('--latency', type='float', default=0.0)
+    parser.add_option('--throttle-rate', type='float', default=0.0)
+    parser.add_option('--error-rate', type='float', default=0.0)
+    parser.add_option('--compress', action='store_true', default=False)
+    parser.add_option('--adaptive', action='store_true', default=False)
+    parser.add_option('--run', help=optparse.SUPPRESS_HELP)
+    parser.add_option('--url', help=optparse.SUPPRESS_HELP)
+    options, scenarios = parser.parse_args()
+    if options.run:
+        run(options.run, options.url, options.contacts, options.compress, options.adaptive)
+        return
+
+    from icontact.testing import FakeIContactServer
+
+    for scenario in scenarios or SCENARIOS:
+        if scenario not in SCENARIOS:
+            parser.error('unknown scenario %r' % scenario)
+    print('%d contacts, %.0f ms latency, %.1f%% throttled, %.1f%% errors' % (
+        options.contacts, options.latency * 1000, options.throttle_rate * 100,
+        options.error_rate * 100))
+    for scenario in scenarios or SCENARIOS:
+        server = FakeIContactServer(latency=options.latency,
+                                    throttle_rate=options.throttle_rate,
+                                    error_rate=options.error_rate,
+                                    stats_recipients=options.contacts)
+        messages = scenario == 'aggregate' and AGGREGATE_MESSAGES or 1
+        server.populate(contacts=options.contacts, lists=2, messages=messages)
+        server.start()
+        args = [sys.executable, __file__, '--run', scenario, '--url', server.url,
+                '--contacts', str(options.contacts)]
+        if options.compress:
+            args.append('--compress')
+        if options.adaptive:
+            args.append('--adaptive')
+        try:
+            subprocess.call(args)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures the cold-start cost of importing icontact.client, and the speed
+of each installed JSON backend at encoding a batch of contacts and
+decoding a page of them.
+
+Usage: python benchmarks/codec.py [contacts-per-page]
+
+Import times are the best of several fresh interpreters, less the time
+of an interpreter that imports nothing.
+"""
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+IMPORT_RUNS = 10
+ROUNDS = 20
+
+
+def startup_time(code):
+    best = None
+    for i in range(IMPORT_RUNS):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', code],
+                              cwd=os.path.join(os.path.dirname(__file__), '..'))
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def make_page(count):
+    contacts = []
+    for i in range(count):
+        contacts.append(dict(contactId=str(1000000 + i), email='user%d@example.com' % i,
+                             firstName='First%d' % i, lastName='Last%d' % i,
+                             prefix='', suffix='', street='%d Main St' % i, street2='',
+                             city='Raleigh', state='NC', postalCode='27601', phone='',
+                             fax='', business='', status='normal', bounceCount='0',
+                             createDate='2010-01-01 00:00:00'))
+    return dict(contacts=contacts, limit=count, offset=0, total=count)
+
+
+def best_of(fn, arg):
+    best = None
+    for i in range(ROUNDS):
+        start = time.time()
+        fn(arg)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    count = len(sys.argv) > 1 and int(sys.argv[1]) or 1000
+    from icontact.codec import available_backends, get_codec
+
+    base = startup_time('pass')
+    for label, code in (('import icontact.client', 'import icontact.client'),
+                        ('... and create a client',
+                         'import icontact.client; '
+                         'icontact.client.IContactClient("k", "u", "p")')):
+        print('%-28s %8.1f ms' % (label, (startup_time(code) - base) * 1000))
+
+    page = make_page(count)
+    body = get_codec('json').dumps(page)
+    print('\n%d contacts, %d KB; default backend: %s' % (count, len(body) // 1024,
+                                                         get_codec().name))
+    for name in available_backends():
+        codec = get_codec(name)
+        encode = best_of(codec.dumps, page)
+        decode = best_of(codec.loads, body)
+        print('%-12s encode %8.2f ms %8.1f MB/s   decode %8.2f ms %8.1f MB/s' % (
+            name, encode * 1000, len(body) / encode / 1e6,
+            decode * 1000, len(body) / decode / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the time and memory needed to turn a decoded page of contacts
+into attribute-access objects: the original json_to_obj (a new class and
+a __dict__ copy per object) against the lazy and compact record types.
+
+Usage: python benchmarks/records.py [contacts-per-page]
+
+Each mode runs in a fresh interpreter so that its peak RSS is its own.
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+MODES = ('legacy', 'lazy', 'lazy-read-all', 'compact')
+ROUNDS = 5
+
+
+def legacy_json_to_obj(json):
+    if isinstance(json, list):
+        json = [legacy_json_to_obj(x) for x in json]
+    if not isinstance(json, dict):
+        return json
+    class Object(object):
+        pass
+    o = Object()
+    for k in json:
+        o.__dict__[k] = legacy_json_to_obj(json[k])
+    return o
+
+
+def make_page(count):
+    contacts = []
+    for i in range(count):
+        contacts.append(dict(contactId=str(1000000 + i), email='user%d@example.com' % i,
+                             firstName='First%d' % i, lastName='Last%d' % i,
+                             prefix='', suffix='', street='%d Main St' % i, street2='',
+                             city='Raleigh', state='NC', postalCode='27601', phone='',
+                             fax='', business='', status='normal', bounceCount='0',
+                             createDate='2010-01-01 00:00:00'))
+    return simplejson.dumps(dict(contacts=contacts, limit=count, offset=0, total=count))
+
+
+def run(mode, count):
+    from icontact.client import json_to_obj
+    body = make_page(count)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = 0.0
+    for i in range(ROUNDS):
+        data = simplejson.loads(body)
+        start = time.time()
+        if mode == 'legacy':
+            result = legacy_json_to_obj(data)
+            emails = [c.email for c in result.contacts]
+        elif mode == 'compact':
+            result = json_to_obj(data, compact=True)
+            emails = [c.email for c in result.contacts]
+        elif mode == 'lazy-read-all':
+            result = json_to_obj(data)
+            emails = [c.email for c in result.contacts]
+        else:
+            result = json_to_obj(data)
+            emails = [result.contacts[0].email]
+        del data
+        elapsed += time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss
+    print('%-14s %8.2f ms/page %8d KB peak RSS growth' % (
+        mode, elapsed * 1000 / ROUNDS, peak))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[2], int(sys.argv[1]))
+    else:
+        count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+        print('Converting a page of %d contacts (%d rounds)' % (count, ROUNDS))
+        for mode in MODES:
+            subprocess.call([sys.executable, __file__, str(count), mode])
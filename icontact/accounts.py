@@ -0,0 +1,289 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Running API calls for many iContact accounts through one set of workers.
+
+An agency with one client per customer account or client folder adds
+each to an AccountManager, and submits calls by account name:
+
+  >>> manager = AccountManager(api_key, max_workers=8, rate=10)
+  >>> manager.add_account('acme', 'acme-user', 'acme-password', rate=4)
+  >>> manager.add_account('globex', 'globex-user', 'globex-password', weight=2)
+  >>> future = manager.submit('acme', 'create_contacts', rows)
+  >>> manager.stats('acme')['mean_queue_delay']
+
+Calls queue per account and are started fairly across the accounts with
+queued calls, so that one account with a long backlog does not hold up
+the others, within per-account and overall request-rate budgets.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+from icontact.client import IContactClient
+from icontact.executor import Future, ThreadPoolExecutor
+from icontact.limiter import RateBudget
+from icontact.transport import HTTPTransport
+
+
+class Tenant(object):
+    """An account managed by an AccountManager: its client, queue and counters."""
+
+    def __init__(self, name, client, weight=1, budget=None):
+        self.name = name
+        self.client = client
+        self.weight = float(weight)
+        self.budget = budget
+        self.queue = deque()
+        self.virtual_time = 0.0
+        self.added = time.time()
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.requests = 0
+        self.queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    def stats(self):
+        elapsed = max(time.time() - self.added, 1e-6)
+        return dict(queued=len(self.queue), in_flight=self.in_flight,
+                    submitted=self.submitted, completed=self.completed,
+                    failed=self.failed, requests=self.requests,
+                    throughput=self.completed / elapsed,
+                    request_rate=self.requests / elapsed,
+                    mean_queue_delay=self.completed and self.queue_delay / self.completed or 0.0,
+                    max_queue_delay=self.max_queue_delay)
+
+
+class AccountManager(object):
+    """
+    Owns an IContactClient for each of many accounts, all sharing one
+    pool of keep-alive connections, and runs calls submitted for them on
+    up to `max_workers` threads.
+
+    - rate, burst: (Optional) the most requests per second, and the
+      largest burst, sent for all accounts together. Each account can
+      have its own budget as well (see add_account).
+    - transport: (Optional) the shared `icontact.transport.HTTPTransport`.
+
+    Other keyword arguments are passed on to every IContactClient.
+
+    Queued calls are started in weighted fair order: each call advances
+    its account's virtual clock by 1/weight, and the next call comes from
+    the account with the earliest clock among those whose budget allows
+    a request, so an account of weight 2 gets twice the turns of an
+    account of weight 1 while both have calls waiting. An account that
+    has been idle starts level with the others rather than with credit
+    saved up. Budgets count every HTTP request a call makes, retries
+    included: each request waits for a token from its account's budget
+    and the manager's before it is sent, so a bulk call is paced request
+    by request, and an account's calls are only started while its own
+    budget has tokens left.
+    """
+
+    def __init__(self, api_key, max_workers=8, rate=None, burst=None, transport=None,
+                 **client_options):
+        self.api_key = api_key
+        self.max_workers = max_workers
+        if transport is None:
+            transport = HTTPTransport(maxsize=max_workers)
+        self.transport = transport
+        self.budget = rate and RateBudget(rate, burst) or None
+        self.client_options = client_options
+
+        self._tenants = OrderedDict()
+        self._condition = threading.Condition(threading.Lock())
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._dispatcher = threading.Thread(target=self._run)
+        self._dispatcher.setDaemon(True)
+        self._dispatcher.start()
+
+    def add_account(self, name, username, password, account_id=None, client_folder_id=None,
+                    weight=1, rate=None, burst=None, api_key=None, **options):
+        """
+        Adds an account under `name`, returning its IContactClient.
+
+        - weight: (Optional) the account's share of turns relative to the
+          other accounts with calls waiting.
+        - rate, burst: (Optional) the account's own request-rate budget.
+        - api_key: (Optional) the API key, if not the manager's.
+
+        Other keyword arguments are passed on to the IContactClient.
+        """
+        client_options = dict(self.client_options)
+        client_options.update(options)
+        budget = rate and RateBudget(rate, burst) or None
+        budgets = [b for b in (budget, self.budget) if b is not None]
+        client = IContactClient(api_key or self.api_key, username, password,
+                                account_id=account_id, client_folder_id=client_folder_id,
+                                transport=self.transport, rate_budgets=budgets,
+                                **client_options)
+        tenant = Tenant(name, client, weight, budget)
+        client.add_observer(lambda event: self._count(tenant, 1 + event.retries))
+        self._condition.acquire()
+        try:
+            if name in self._tenants:
+                raise ValueError("Account %r has already been added" % name)
+            self._tenants[name] = tenant
+        finally:
+            self._condition.release()
+        return client
+
+    def client(self, name):
+        """Returns the IContactClient of an account."""
+        return self._tenants[name].client
+
+    def submit(self, name, method, *args, **kwargs):
+        """
+        Queues a call for an account and returns an
+        `icontact.executor.Future` for its result. `method` is the name of
+        an IContactClient method, or a callable that is passed the
+        account's client followed by the other arguments.
+        """
+        tenant = self._tenants[name]
+        future = Future()
+        self._condition.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError("cannot submit after close")
+            if not tenant.queue:
+                tenant.virtual_time = max(tenant.virtual_time, self._virtual_time)
+            tenant.queue.append((future, method, args, kwargs, time.time()))
+            tenant.submitted += 1
+            self._condition.notify()
+        finally:
+            self._condition.release()
+        return future
+
+    def _count(self, tenant, count):
+        """Counts requests made by an account."""
+        self._condition.acquire()
+        try:
+            tenant.requests += count
+        finally:
+            self._condition.release()
+
+    # Scheduling
+
+    def _select(self):
+        """
+        Returns the account whose call should start next, or None and the
+        seconds until one may (None if no calls are waiting).
+        """
+        # The manager's budget is not checked here: calls already running
+        # would keep it empty, and hold back every other account's calls
+        # until they finished. Requests queue for it in turn instead.
+        wait = None
+        selected = None
+        for tenant in self._tenants.values():
+            if not tenant.queue:
+                continue
+            tenant_wait = tenant.budget is not None and tenant.budget.wait_time() or 0
+            if tenant_wait:
+                if wait is None or tenant_wait < wait:
+                    wait = tenant_wait
+            elif selected is None or tenant.virtual_time < selected.virtual_time:
+                selected = tenant
+        return selected, wait
+
+    def _queued(self):
+        for tenant in self._tenants.values():
+            if tenant.queue:
+                return True
+        return False
+
+    def _run(self):
+        self._condition.acquire()
+        try:
+            while True:
+                if self._in_flight >= self.max_workers:
+                    self._condition.wait()
+                    continue
+                tenant, wait = self._select()
+                if tenant is None:
+                    if self._closed and not self._queued():
+                        return
+                    self._condition.wait(wait)
+                    continue
+                job = tenant.queue.popleft()
+                self._virtual_time = tenant.virtual_time
+                tenant.virtual_time += 1.0 / tenant.weight
+                tenant.in_flight += 1
+                self._in_flight += 1
+                self._executor.submit(self._execute, tenant, job)
+        finally:
+            self._condition.release()
+
+    def _execute(self, tenant, job):
+        future, method, args, kwargs, queued_at = job
+        delay = time.time() - queued_at
+        result = error = None
+        try:
+            if callable(method):
+                result = method(tenant.client, *args, **kwargs)
+            else:
+                result = getattr(tenant.client, method)(*args, **kwargs)
+        except Exception as e:
+            error = e
+        self._condition.acquire()
+        try:
+            tenant.in_flight -= 1
+            self._in_flight -= 1
+            tenant.completed += 1
+            if error is not None:
+                tenant.failed += 1
+            tenant.queue_delay += delay
+            tenant.max_queue_delay = max(tenant.max_queue_delay, delay)
+            self._condition.notify()
+        finally:
+            self._condition.release()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # Status
+
+    def stats(self, name=None):
+        """
+        Returns the counters of one account: calls queued, in flight,
+        submitted, completed and failed; HTTP requests made; completed
+        calls and requests per second since the account was added; and
+        the mean and longest time calls waited in the queue. Without a
+        name, returns a dictionary of the stats of every account.
+        """
+        self._condition.acquire()
+        try:
+            if name is not None:
+                return self._tenants[name].stats()
+            return dict([(n, tenant.stats()) for n, tenant in self._tenants.items()])
+        finally:
+            self._condition.release()
+
+    def close(self):
+        """Waits for every queued call to finish and stops the workers."""
+        self._condition.acquire()
+        try:
+            self._closed = True
+            self._condition.notify()
+        finally:
+            self._condition.release()
+        self._dispatcher.join()
+        self._executor.shutdown()
+        self.transport.clear()
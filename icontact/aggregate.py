@@ -0,0 +1,235 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Statistics across many messages at once.
+
+`collect_stats` fetches the summary statistics of many messages
+concurrently and returns them as a `CampaignStats` table, which holds one
+column of counts per action and computes totals, rates and per-day and
+per-list rollups over whole columns:
+
+  >>> stats = collect_stats(client, max_workers=16)
+  >>> stats.rates()['opens']
+  0.2314
+  >>> for day, totals in stats.by_day().items(): ...
+
+The columns are NumPy arrays when NumPy is installed, and the rollups
+are then computed with NumPy; otherwise they are plain Python arrays.
+"""
+from array import array
+from collections import OrderedDict
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from icontact.client import IContactClient, parse_datetime
+
+UNIQUE = ('opens', 'clicks')
+COLUMNS = IContactClient.STATS_SUMMARIES + tuple(['unique_' + name for name in UNIQUE])
+
+
+class CampaignStats(object):
+    """
+    Summary statistics for a set of messages, one row per message.
+
+    - message_ids: the messageId of each row.
+    - days: the date each message was sent (or, without a scheduled send,
+      created) as a proleptic ordinal, 0 where it is not known.
+    - columns: for each name in COLUMNS, the count of each row.
+    - list_ids: the lists messages were sent to, and `memberships`, pairs
+      of (row, index into list_ids) for each list a message was sent to.
+    - errors: (message_id, exception) for messages whose statistics could
+      not be fetched; they have no row.
+    """
+
+    def __init__(self, message_ids, days, columns, list_ids, memberships, errors=(),
+                 use_numpy=True):
+        self.use_numpy = use_numpy and numpy is not None
+        self.message_ids = list(message_ids)
+        self.days = self._array(days)
+        self.columns = dict([(name, self._array(columns[name])) for name in COLUMNS])
+        self.list_ids = list(list_ids)
+        self.membership_rows = self._array([row for row, index in memberships])
+        self.membership_lists = self._array([index for row, index in memberships])
+        self.errors = list(errors)
+
+    @classmethod
+    def from_rows(cls, rows, errors=(), use_numpy=True):
+        """
+        Builds the table from (message_id, date, list_ids, stats) rows,
+        where stats is a message_stats() result and date may be None.
+        """
+        message_ids, days, list_ids, memberships = [], [], [], []
+        list_index = {}
+        columns = dict([(name, []) for name in COLUMNS])
+        for row, (message_id, day, lists, stats) in enumerate(rows):
+            message_ids.append(message_id)
+            days.append(day and day.toordinal() or 0)
+            for name in IContactClient.STATS_SUMMARIES:
+                columns[name].append((stats.get(name) or {}).get('count', 0))
+            for name in UNIQUE:
+                columns['unique_' + name].append((stats.get(name) or {}).get('unique', 0))
+            for list_id in lists:
+                if list_id not in list_index:
+                    list_index[list_id] = len(list_ids)
+                    list_ids.append(list_id)
+                memberships.append((row, list_index[list_id]))
+        return cls(message_ids, days, columns, list_ids, memberships, errors, use_numpy)
+
+    def _array(self, values):
+        if self.use_numpy:
+            return numpy.array(values, dtype=numpy.int64)
+        return array('l', values)
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    # Rollups
+
+    def totals(self):
+        """Returns the sum of each column."""
+        if self.use_numpy:
+            return dict([(name, int(column.sum())) for name, column in self.columns.items()])
+        return dict([(name, sum(column)) for name, column in self.columns.items()])
+
+    def rates(self, base='released'):
+        """
+        Returns each column's total as a fraction of the `base` column's
+        total (0.0 when that is 0).
+        """
+        return _rates(self.totals(), base)
+
+    def message_rates(self, name, base='released'):
+        """Returns `name` as a fraction of `base` for each message."""
+        counts, bases = self.columns[name], self.columns[base]
+        if self.use_numpy:
+            return numpy.where(bases > 0, counts / numpy.maximum(bases, 1).astype(float), 0.0)
+        return array('d', [b and float(c) / b or 0.0 for c, b in zip(counts, bases)])
+
+    def by_day(self, base='released'):
+        """
+        Returns an OrderedDict of the column totals of the messages sent on
+        each day, by date (None for messages with no known date), with the
+        rates relative to `base` under 'rates'.
+        """
+        if self.use_numpy:
+            days, groups = numpy.unique(self.days, return_inverse=True)
+            days = [int(day) for day in days]
+        else:
+            days = sorted(set(self.days))
+            index = dict([(day, i) for i, day in enumerate(days)])
+            groups = [index[day] for day in self.days]
+        keys = [day and date.fromordinal(day) or None for day in days]
+        return self._grouped(keys, groups, None, base)
+
+    def by_list(self, base='released'):
+        """
+        Returns an OrderedDict of the column totals of the messages sent to
+        each list, by listId, with the rates relative to `base` under
+        'rates'. A message sent to several lists is counted under each,
+        since iContact reports its statistics for the message as a whole.
+        """
+        return self._grouped(self.list_ids, self.membership_lists, self.membership_rows, base)
+
+    def _grouped(self, keys, groups, rows, base):
+        """
+        Sums each column by group, where row `rows[i]` (or row i) belongs
+        to group `groups[i]`.
+        """
+        sums = {}
+        size = len(keys)
+        for name, column in self.columns.items():
+            if self.use_numpy:
+                if rows is not None:
+                    column = column[rows]
+                sums[name] = numpy.bincount(groups, weights=column, minlength=size)
+            else:
+                if rows is not None:
+                    column = [column[row] for row in rows]
+                total = [0] * size
+                for group, count in zip(groups, column):
+                    total[group] += count
+                sums[name] = total
+        result = OrderedDict()
+        for i, key in enumerate(keys):
+            totals = dict([(name, int(sums[name][i])) for name in sums])
+            totals['rates'] = _rates(totals, base)
+            result[key] = totals
+        return result
+
+
+def _rates(totals, base):
+    denominator = totals[base]
+    return dict([(name, denominator and float(totals[name]) / denominator or 0.0)
+                 for name in COLUMNS])
+
+
+def collect_stats(client, message_ids=None, account_id=None, client_folder_id=None,
+                  max_workers=8, use_numpy=True):
+    """
+    Fetches message_stats for the given messages, or for every message,
+    up to `max_workers` at a time, and returns them as a CampaignStats.
+
+    Each message is dated and assigned to lists from its sends (their
+    scheduledTime and includeListIds), which are read with the messages
+    in a few paged requests. Messages whose statistics cannot be fetched
+    are listed in the result's `errors` rather than failing the rest.
+    """
+    account_id, client_folder_id = client._required_values(account_id, client_folder_id)
+    if message_ids is not None:
+        message_ids = [str(message_id) for message_id in message_ids]
+        wanted = set(message_ids)
+    dates = {}
+    for message in client.iter_messages(account_id, client_folder_id, page_size=1000):
+        message_id = str(message.messageId)
+        if message_ids is None or message_id in wanted:
+            dates[message_id] = _date(getattr(message, 'createDate', None))
+    if message_ids is None:
+        message_ids = sorted(dates, key=int)
+
+    lists = dict([(message_id, []) for message_id in message_ids])
+    sent = {}
+    for send in client.iter_sends(account_id, client_folder_id, page_size=1000):
+        message_id = str(send.messageId)
+        if message_id not in lists:
+            continue
+        for list_id in str(getattr(send, 'includeListIds', None) or '').split(','):
+            if list_id and list_id not in lists[message_id]:
+                lists[message_id].append(list_id)
+        day = _date(getattr(send, 'scheduledTime', None))
+        if day is not None and (message_id not in sent or day < sent[message_id]):
+            sent[message_id] = day
+
+    rows, errors = [], []
+    fetch = lambda message_id: client.message_stats(message_id, account_id, client_folder_id)
+    for item in client.map(fetch, message_ids, max_workers=max_workers):
+        message_id = message_ids[item.index]
+        if item.error is not None:
+            errors.append((message_id, item.error))
+            continue
+        day = sent.get(message_id) or dates.get(message_id)
+        rows.append((message_id, day, lists[message_id], item.result))
+    return CampaignStats.from_rows(rows, errors, use_numpy)
+
+
+def _date(value):
+    if not value:
+        return None
+    try:
+        return parse_datetime(str(value)).date()
+    except ValueError:
+        return None
@@ -0,0 +1,138 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Helpers for sending many records to the iContact API in array-valued
+requests, and for reporting the outcome of each input row.
+"""
+from icontact.executor import ThreadPoolExecutor
+
+
+def chunks(iterable, size):
+    """
+    Yields lists of up to `size` (index, item) pairs from any iterable,
+    without reading more of it than the current chunk needs.
+    """
+    chunk = []
+    for pair in enumerate(iterable):
+        chunk.append(pair)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchItem(object):
+    """
+    The outcome for one input row of a batched operation: `index` is the
+    row's position in the input, `row` the input itself, and exactly one
+    of `result` (the record returned by iContact) or `error` is set,
+    unless the row was skipped without being sent.
+    """
+    __slots__ = ('index', 'row', 'result', 'error')
+
+    def __init__(self, index, row, result=None, error=None):
+        self.index = index
+        self.row = row
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return 'icontact.batch.BatchItem(%d, error=%r)' % (self.index, self.error)
+        return 'icontact.batch.BatchItem(%d, result=%r)' % (self.index, self.result)
+
+
+class BatchResult(object):
+    """
+    Per-row results of a batched operation, in input order. Rows that
+    failed do not stop the rest of the batch; they are listed in `errors`.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.requests = 0
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    @property
+    def results(self):
+        return [item.result for item in self.items]
+
+    @property
+    def errors(self):
+        return [item for item in self.items if item.error is not None]
+
+    @property
+    def skipped(self):
+        """The rows that needed no request, such as unchanged contacts."""
+        return [item for item in self.items if item.result is None and item.error is None]
+
+    def __repr__(self):
+        return 'icontact.batch.BatchResult(%d rows, %d errors)' % (
+            len(self.items), len(self.errors))
+
+
+def run_batches(send_chunk, iterable, chunk_size, max_workers=1):
+    """
+    Splits `iterable` into chunks and calls `send_chunk(chunk)` for each,
+    where a chunk is a list of (index, row) pairs and the call returns a
+    list of BatchItems for those rows. With `max_workers` > 1 up to that
+    many chunks are sent concurrently; no more than twice that many are
+    read from the input ahead of the results. An exception raised for a
+    whole chunk is recorded as the error of each of its rows.
+    """
+    batch = BatchResult()
+
+    def collect(chunk, future):
+        try:
+            items = future.result()
+        except Exception as e:
+            items = [BatchItem(index, row, error=e) for index, row in chunk]
+        batch.items.extend(items)
+        batch.requests += 1
+
+    if max_workers <= 1:
+        for chunk in chunks(iterable, chunk_size):
+            try:
+                items = send_chunk(chunk)
+            except Exception as e:
+                items = [BatchItem(index, row, error=e) for index, row in chunk]
+            batch.items.extend(items)
+            batch.requests += 1
+        return batch
+
+    executor = ThreadPoolExecutor(max_workers)
+    try:
+        pending = []
+        for chunk in chunks(iterable, chunk_size):
+            pending.append((chunk, executor.submit(send_chunk, chunk)))
+            if len(pending) >= max_workers * 2:
+                collect(*pending.pop(0))
+        for chunk, future in pending:
+            collect(chunk, future)
+    except:
+        executor.shutdown(wait=False)
+        raise
+    # Every chunk has been collected, so the workers are idle and exit
+    # straight away.
+    executor.shutdown()
+    return batch
@@ -0,0 +1,269 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Caching of account discovery and read-mostly GET responses.
+
+A `ResponseCache` stores decoded responses in a backend: `LRUCache` keeps
+them in process memory, and `DiskCache` keeps them in a directory that
+several processes can share. Cached responses are grouped by resource
+(lists, segments, messages, ...); a write to a resource invalidates its
+whole group by giving the group a new generation token, so entries cached
+under the old token are never read again and simply expire.
+"""
+import hashlib
+import os
+import cPickle as pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    An in-process cache holding at most `max_entries` values, evicting
+    the least recently used first. Values expire after their ttl.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                return None
+            # Re-insert to mark the entry as most recently used.
+            self._data[key] = entry
+            return value
+        finally:
+            self._lock.release()
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            expires = None
+        else:
+            expires = time.time() + ttl
+        self._lock.acquire()
+        try:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            self._data.pop(key, None)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+        finally:
+            self._lock.release()
+
+
+class DiskCache(object):
+    """
+    A cache stored as one pickle file per key in `directory`, which may
+    be shared by every process on a host. Files are written to a
+    temporary name and renamed into place, so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(repr(key)).hexdigest() + '.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                stored_key, expires, value = pickle.load(f)
+            except Exception:
+                return None
+        finally:
+            f.close()
+        if stored_key != key:
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            expires = None
+        else:
+            expires = time.time() + ttl
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                pickle.dump((key, expires, value), f, 2)
+            finally:
+                f.close()
+            os.rename(tmp, self._path(key))
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def purge(self):
+        """Removes every expired entry from the directory."""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                f = open(path, 'rb')
+                try:
+                    stored_key, expires, value = pickle.load(f)
+                finally:
+                    f.close()
+                if expires is not None and expires < now:
+                    os.remove(path)
+                    self.evictions += 1
+            except Exception:
+                pass
+
+
+def _new_generation():
+    # Imported here: uuid loads ctypes and searches for libuuid on import.
+    import uuid
+    return uuid.uuid4().hex
+
+
+class ResponseCache(object):
+    """
+    Caches decoded GET responses and account/client folder discovery for
+    IContactClient.
+
+    - backend: an `LRUCache` (the default) or `DiskCache`.
+    - ttl: seconds a cached response stays valid.
+    - discovery_ttl: seconds a discovered account or client folder id
+      stays valid.
+
+    Keys include the API URL, username, account id and client folder id
+    of the client that made the request, so one cache may be shared by
+    clients for different accounts.
+    """
+
+    def __init__(self, backend=None, ttl=300, discovery_ttl=86400):
+        if backend is None:
+            backend = LRUCache()
+        self.backend = backend
+        self.ttl = ttl
+        self.discovery_ttl = discovery_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _count(self, value):
+        self._lock.acquire()
+        try:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        finally:
+            self._lock.release()
+        return value
+
+    def _generation(self, scope, group):
+        key = ('generation', scope, group)
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = _new_generation()
+            self.backend.set(key, generation)
+        return generation
+
+    def get(self, scope, group, path):
+        """
+        Returns the cached response for a path, or None, and the group's
+        generation. Pass the generation to set() when caching a response
+        fetched after a miss, so that a response fetched before the group
+        was invalidated is stored under the old generation and never read.
+        """
+        generation = self._generation(scope, group)
+        key = ('response', scope, group, generation, path)
+        return self._count(self.backend.get(key)), generation
+
+    def set(self, scope, group, path, value, generation):
+        key = ('response', scope, group, generation, path)
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self, scope, group):
+        """Discards every cached response in a group."""
+        self.backend.set(('generation', scope, group), _new_generation())
+        self._lock.acquire()
+        try:
+            self.invalidations += 1
+        finally:
+            self._lock.release()
+
+    def get_discovery(self, key):
+        """Returns a cached account or client folder id, or None."""
+        return self._count(self.backend.get(('discovery',) + key))
+
+    def set_discovery(self, key, value):
+        self.backend.set(('discovery',) + key, value, self.discovery_ttl)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    invalidations=self.invalidations,
+                    evictions=self.backend.evictions)
@@ -11,46 +11,44 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
-try:
-    from django.utils import simplejson
-except ImportError:
-    import simplejson
-import httplib
 import urllib
-import urllib2
-import urlparse
+import calendar
+import heapq
 import logging
-
-from datetime import tzinfo, timedelta
-
-# python 2.5+ has ElementTree included in it's core
-try:
-    from xml.etree import ElementTree
-    from xml.etree.ElementTree import Element, SubElement
-except ImportError:
-    from elementtree import ElementTree
-    from elementtree.ElementTree import Element, SubElement
-
-from dateutil.parser import parse
-
-def json_to_obj(json):
-    if isinstance(json, list):
-        json = [json_to_obj(x) for x in json]
-    if not isinstance(json, dict):
-        return json
-    class Object(object):
-        def __repr__(self):
-            return 'icontact.client.Object(%s)' % repr(self.__dict__)
-    o = Object()
-    for k in json:
-        o.__dict__[k] = json_to_obj(json[k])
-    return o
+import random
+import threading
+import time
+import Queue
+
+from datetime import datetime, tzinfo, timedelta
+
+from icontact.batch import BatchItem, run_batches
+from icontact.codec import get_codec
+from icontact.coalesce import RequestCoalescer
+from icontact.compression import ACCEPT_ENCODING, gzip_encode
+from icontact.executor import Future, ThreadPoolExecutor, TimeoutError
+from icontact.instrumentation import RequestEvent, TrafficStats
+from icontact.limiter import CircuitBreaker, ConcurrencyLimiter
+from icontact.records import wrap
+from icontact.retry import RetryPolicy
+from icontact.streaming import iter_json_items, iter_xml_elements
+from icontact.transport import HTTPTransport
+
+def json_to_obj(json, compact=False):
+    """
+    Wraps decoded JSON for attribute access (`result.contacts[0].email`).
+    Nested objects are only wrapped when they are first accessed. With
+    `compact`, homogeneous lists such as a page of contacts are converted
+    up front to `__slots__` records, which use far less memory than the
+    decoded dicts they replace.
+    """
+    return wrap(json, compact)
 
 class ExcessiveRetriesException(Exception):
     """
     A standard exception that represents a potentially transient fault
     where an an iContact API client fails to perform an operation more
-    than `self.max_retry_count` times.
+    than `self.max_retry_count` times, or has spent its retry budget.
     """
     pass
 
@@ -64,14 +62,25 @@ class IContactServerError(Exception):
         return '%s: %s' % (self.http_status, '\n'.join(self.errors))
 
 class IContactClient(object):
-    """Perform operations on the iContact API."""
+    """
+    Perform operations on the iContact API.
+
+    A client may be shared by any number of threads: its connections are
+    pooled, the default account and client folder are discovered once,
+    and `retry_count` is kept separately for each thread.
+    """
 
     ICONTACT_API_URL = 'https://app.icontact.com/icp/'
     ICONTACT_SANDBOX_API_URL = 'https://app.sandbox.icontact.com/icp/'
     NAMESPACE = 'http://www.w3.org/1999/xlink'
+    # Request bodies smaller than this are not worth compressing.
+    COMPRESS_MIN_SIZE = 1024
 
     def __init__(self, api_key, username, password, auth_handler=None,
-                 max_retry_count=5, account_id=None, client_folder_id=None, url=ICONTACT_API_URL):
+                 max_retry_count=5, account_id=None, client_folder_id=None, url=ICONTACT_API_URL,
+                 transport=None, retry_policy=None, compact_records=False, cache=None,
+                 coalesce=True, compress=False, concurrency_limiter=None,
+                 circuit_breaker=None, json_codec=None, fingerprints=None, rate_budgets=()):
         """
         - api_key: the API Key assigned for the OA iContact client
         - username: the iContact web site login username
@@ -80,7 +89,7 @@ class IContactClient(object):
           as the "API Application Password". It is *not* the standard
           web site login password.
         - max_retry_count: (Optional) Retry limit for logins or
-          rate-limited operations.
+          rate-limited operations, applied to each API call.
         - auth_handler: (Optional) An object that implements two callback
           methods that this client will invoke when it generates, or
           requires, authentication credentials. The authentication handler
@@ -91,6 +100,55 @@ class IContactClient(object):
         getter and setter methods::
           get_credentials() => (token,sequence)
           set_credentials(token,sequence)
+
+        - transport: (Optional) The `icontact.transport.HTTPTransport`
+          used to send requests. Every HTTP method shares the transport's
+          pool of keep-alive connections; pass a transport built with a
+          different `maxsize` or `idle_timeout` to tune the pool, or share
+          one transport among several clients.
+        - retry_policy: (Optional) The `icontact.retry.RetryPolicy` that
+          decides which failures are retried and how long to back off.
+          Its retry budget is shared by every call made by this client.
+        - compact_records: (Optional) Store lists of records in responses,
+          such as a page of contacts, in compact `__slots__` objects. This
+          costs a little more time to decode but much less memory.
+        - cache: (Optional) An `icontact.cache.ResponseCache` that remembers
+          the discovered account and client folder ids, and the responses
+          of lists(), list(), segments() and get_message(). Write methods
+          such as create_list() invalidate the matching cached responses.
+          A cache with a `DiskCache` backend can be shared across processes.
+        - coalesce: (Optional) Whether identical GET requests made at the
+          same time by several threads share one network call, with each
+          caller receiving its own copy of the result. Pass False to turn
+          this off, or an `icontact.coalesce.RequestCoalescer` limited to
+          some endpoints. Counters are available from `coalescer.stats()`.
+        - compress: (Optional) Ask for gzip or deflate compressed responses,
+          which are decompressed as they are read, and gzip request bodies
+          of COMPRESS_MIN_SIZE bytes or more. If the server rejects a
+          compressed body (415) it is resent uncompressed, and request
+          bodies are no longer compressed by this client. Bytes sent and
+          received before and after compression are counted in
+          `traffic.stats()`.
+        - concurrency_limiter: (Optional) An
+          `icontact.limiter.ConcurrencyLimiter`, or True for one with the
+          default settings, that adapts how many requests this client has
+          in flight at once to how well the server is coping.
+        - circuit_breaker: (Optional) An `icontact.limiter.CircuitBreaker`,
+          or True for one with the default settings. While the server is
+          failing, calls raise `icontact.limiter.CircuitOpenError` instead
+          of sending requests, until a trial request succeeds.
+        - json_codec: (Optional) The `icontact.codec.JSONCodec`, or the name
+          of a backend such as 'ujson', used to encode request bodies and
+          decode responses. By default the fastest library installed is
+          used (see `icontact.codec.get_codec`).
+        - fingerprints: (Optional) An
+          `icontact.fingerprints.ContactFingerprints` remembering the field
+          values written for each contact, so that update_contact() and
+          update_contacts() only send fields that have changed and skip
+          contacts with no changes.
+        - rate_budgets: (Optional) `icontact.limiter.RateBudget`s that
+          every request, retries included, waits for and takes a token
+          from before it is sent. A budget may be shared between clients.
         """
         self.api_key = api_key
         self.api_version = "2.2"
@@ -102,20 +160,118 @@ class IContactClient(object):
 
         self.account_id = account_id
         self.client_folder_id = client_folder_id
+        self._discovery_lock = threading.Lock()
 
-        # Track number of retries we have performed
-        self.retry_count = 0
+        self._local = threading.local()
         self.url = url
 
+        if transport is None:
+            transport = HTTPTransport()
+        self.transport = transport
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.compact_records = compact_records
+        self.cache = cache
+        if coalesce is True:
+            coalesce = RequestCoalescer()
+        self.coalescer = coalesce or None
+        self.compress = compress
+        self.compress_requests = compress
+        self.traffic = TrafficStats()
+        if json_codec is None or isinstance(json_codec, basestring):
+            json_codec = get_codec(json_codec)
+        self.json_codec = json_codec
+        self.fingerprints = fingerprints
+        if concurrency_limiter is True:
+            concurrency_limiter = ConcurrencyLimiter()
+        self.concurrency_limiter = concurrency_limiter or None
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker or None
+        self.rate_budgets = tuple(rate_budgets)
+        self._observers = []
+
+    @property
+    def retry_count(self):
+        """The number of retries made by this thread's most recent call."""
+        return getattr(self._local, 'retry_count', 0)
+
+    @retry_count.setter
+    def retry_count(self, count):
+        self._local.retry_count = count
+
+    def add_observer(self, observer):
+        """
+        Registers a callable that is passed an
+        `icontact.instrumentation.RequestEvent` after every API call,
+        describing its endpoint, status, sizes, timings and retries.
+        Calls are only measured while at least one observer is registered.
+        """
+        self._observers = self._observers + [observer]
+
+    def remove_observer(self, observer):
+        self._observers = [o for o in self._observers if o != observer]
+
+    def _notify(self, event):
+        for observer in self._observers:
+            try:
+                observer(event)
+            except Exception:
+                self.log.exception("Request observer %r failed", observer)
+
     def _get_account_id(self):
-        self.account_id = self.account().accountId
+        key = ('account', self.url, self.username, self.api_key)
+        account_id = None
+        if self.cache is not None:
+            account_id = self.cache.get_discovery(key)
+        if account_id is None:
+            account_id = self.account().accountId
+            if self.cache is not None:
+                self.cache.set_discovery(key, account_id)
+        self.account_id = account_id
         return self.account_id
 
     def _get_client_folder_id(self):
-        self.client_folder_id = self.clientfolder(self.account_id).clientFolderId
+        if self.account_id is None:
+            self._get_account_id()
+        key = ('clientfolder', self.url, self.username, str(self.account_id))
+        client_folder_id = None
+        if self.cache is not None:
+            client_folder_id = self.cache.get_discovery(key)
+        if client_folder_id is None:
+            client_folder_id = self.clientfolder(self.account_id).clientFolderId
+            if self.cache is not None:
+                self.cache.set_discovery(key, client_folder_id)
+        self.client_folder_id = client_folder_id
         return self.client_folder_id
 
-    def _do_request(self, call_path, parameters={}, method='get', type='json'):
+    def _cache_scope(self, account_id, client_folder_id):
+        return (self.url, self.username, str(account_id), str(client_folder_id))
+
+    def _cached_request(self, group, call_path, account_id, client_folder_id):
+        """
+        Performs a GET request through the response cache, if the client
+        has one. `group` names the resource, so that writes to it can
+        invalidate every cached response for it.
+        """
+        if self.cache is None:
+            return self._do_request(call_path)
+        scope = self._cache_scope(account_id, client_folder_id)
+        data, generation = self.cache.get(scope, group, call_path)
+        if data is None:
+            data = self._do_request(call_path, raw=True)
+            self.cache.set(scope, group, call_path, data, generation)
+        return json_to_obj(data, self.compact_records)
+
+    def _invalidate(self, account_id, client_folder_id, *groups):
+        if self.cache is not None:
+            scope = self._cache_scope(account_id, client_folder_id)
+            for group in groups:
+                self.cache.invalidate(scope, group)
+
+    def _do_request(self, call_path, parameters={}, method='get', type='json', raw=False,
+                    idempotent=None):
         """
         Performs an API request and returns the resultant json object.
         If type='xml' is passed in, returns XML document as an
@@ -126,10 +282,55 @@ class IContactClient(object):
         This method does all the hard work for API operations: building the
         URL path; adding auth headers; sending the request to iContact;
         evaluating the response; and parsing the respones to an XML node.
+        With `raw`, a JSON response is returned as decoded, without
+        conversion by json_to_obj. `idempotent` says whether the request
+        may safely be sent twice, which decides how it is retried (see
+        `icontact.retry.RetryPolicy`); by default it follows the method.
+
+        A JSON GET that is identical to one already in flight on another
+        thread waits for, and shares, that request's response.
         """
-        # Check whether this method call was a retry that exceeds the retry limit
-        if self.retry_count > self.max_retry_count:
-            raise ExcessiveRetriesException("Exceeded maximum retry count (%d)" % self.max_retry_count)
+        self.retry_count = 0
+        coalescer = self.coalescer
+        if coalescer is not None and method.lower() == 'get' and type == 'json' \
+               and coalescer.applies_to(call_path):
+            key = (self.url, call_path, tuple(sorted(parameters.items())),
+                   self.username, self.api_key, self.password, self.api_version)
+            result = coalescer.call(key, lambda: self._request(call_path, parameters,
+                                                               method, type, True, idempotent))
+            if raw:
+                return result
+            return json_to_obj(result, self.compact_records)
+        return self._request(call_path, parameters, method, type, raw, idempotent)
+
+    def _request(self, call_path, parameters, method, type, raw, idempotent=None):
+        if not self._observers:
+            url, data, headers = self._prepare_request(call_path, parameters, method, type)
+            response, body = self._send(method, url, data, headers, idempotent=idempotent)
+            return self._decode_response(response, body, type, raw)
+
+        event = RequestEvent(call_path, method)
+        start = time.time()
+        try:
+            try:
+                url, data, headers = self._prepare_request(call_path, parameters,
+                                                           method, type)
+                response, body = self._send(method, url, data, headers, event=event,
+                                            idempotent=idempotent)
+                decode_start = time.time()
+                try:
+                    return self._decode_response(response, body, type, raw)
+                finally:
+                    event.decode_time = time.time() - decode_start
+            except Exception as e:
+                event.error = e
+                raise
+        finally:
+            event.total_time = time.time() - start
+            self._notify(event)
+
+    def _prepare_request(self, call_path, parameters, method, type):
+        """Returns the URL, request body and headers for an API call."""
         params = dict(parameters)
         data = None
 
@@ -137,9 +338,10 @@ class IContactClient(object):
             url = "%s%s?%s" % (self.url, call_path, urllib.urlencode(params))
         else:
             url = "%s%s" % (self.url, call_path)
-            data = simplejson.dumps(params)
+            if method.lower() != 'get':
+                data = self.json_codec.dumps(params)
 
-        self.log.debug(u"Invoking API method %s with URL: %s" % (method, url))
+        self.log.debug(u"Invoking API method %s with URL: %s", method, url)
 
         if type == 'xml':
             type_header = 'text/xml'
@@ -151,43 +353,238 @@ class IContactClient(object):
                    'Api-AppId':self.api_key,
                    'Api-Username':self.username,
                    'API-Password':self.password }
+        if self.compress:
+            headers['Accept-Encoding'] = ACCEPT_ENCODING
 
-        # TODO: try request for urllib2.HTTPError for 503 to do rate limit retry
-
-        if method.lower() != 'get':
-            # Perform a PUT request
-            self.log.debug(u'%s Request %s body: %s' % (method, url, data))
-            scheme, host, path, params, query, fragment = urlparse.urlparse(url)
-            conn = httplib.HTTPSConnection(host, 443)
-            conn.request(method.upper(), path , data, headers)
-            response = conn.getresponse()
-            self.log.debug("response.status=%s msg=%s headers=%s" %
-                           (response.status, response.msg, response.getheaders(),))
-            response_status = response.status
-        else:
-            # Perform a GET request
-            req = urllib2.Request(url, None, headers)
-            self.log.debug("GET headers=%s url=%s" % (req.headers,url))
-            response = urllib2.urlopen(req)
-            response_status = response.code
+        if data is not None:
+            self.log.debug(u'%s Request %s body: %s', method, url, data)
+        return url, data, headers
+
+    def _decode_response(self, response, body, type, raw=False):
+        """
+        Parses a response body, raising IContactServerError for an error
+        status. With `raw`, a JSON body is returned as decoded, without
+        conversion by json_to_obj.
+        """
+        response_status = response.status
 
         if type == 'xml':
-            result = ElementTree.fromstring(response.read())
-            self.log.debug(u'Response body:\n%s' % (ElementTree.tostring(result),))
+            # Only loaded by the few calls that return XML.
+            try:
+                from xml.etree import ElementTree
+            except ImportError:
+                from elementtree import ElementTree
+            self.log.debug(u'Response body:\n%s', body)
+            result = ElementTree.fromstring(body)
         else:
             # type is json
-            jsondata = response.read()
-            self.log.debug(u"json response=\n%s" % (jsondata,))
-            result = simplejson.loads(jsondata)
-            result = json_to_obj(result)
+            jsondata = body
+            self.log.debug(u"json response=\n%s", jsondata)
+            result = self.json_codec.loads(jsondata)
+            if raw:
+                if response_status >= 400:
+                    raise IContactServerError(response_status, result.get('errors', []))
+                return result
+            result = json_to_obj(result, self.compact_records)
 
         if response_status >= 400:
             raise IContactServerError(response_status, result.errors)
 
-        # Reset retry count to 0 since we have a successful response
-        self.retry_count = 0
         return result
 
+    def _stream_request(self, call_path, collections, parameters={}, type='json',
+                        raw=False, meta=None):
+        """
+        Performs a GET request and yields records from the response as
+        they are read off the connection, without holding the whole
+        response in memory.
+
+        For JSON, `collections` names the array-valued keys to stream
+        (e.g. ['contacts']); each element is yielded wrapped by
+        json_to_obj, or as the decoded dict if `raw` is True. Other
+        top-level values are stored in the `meta` dict, if given.
+        For XML, `collections` names the element tags to yield; each
+        element is only valid until the next one is requested.
+        """
+        event = None
+        if self._observers:
+            event = RequestEvent(call_path, 'get')
+            start = time.time()
+        response = None
+        streamed = False
+        try:
+            try:
+                url, data, headers = self._prepare_request(call_path, parameters, 'get', type)
+                response, body = self._send('get', url, data, headers, stream=True,
+                                            event=event)
+                if body is not None:
+                    # An error response, which is read in full.
+                    self._decode_response(response, body, type)
+                    return
+                streamed = True
+                if type == 'xml':
+                    items = iter_xml_elements(response, collections)
+                else:
+                    items = iter_json_items(response, collections, meta)
+                if event is not None:
+                    items = _timed(items, event)
+                for item in items:
+                    if type == 'xml':
+                        yield item
+                    elif raw:
+                        yield item[1]
+                    else:
+                        yield json_to_obj(item[1], self.compact_records)
+                # Drain what is left of the body so the connection is reused.
+                while response.read(8192):
+                    pass
+            except Exception as e:
+                if event is not None:
+                    event.error = e
+                raise
+        finally:
+            if streamed:
+                response.close()
+                self.traffic.add(bytes_in=response.bytes_decoded,
+                                 wire_bytes_in=response.bytes_read)
+            if event is not None:
+                if streamed:
+                    event.bytes_in += response.bytes_decoded
+                    event.wire_bytes_in += response.bytes_read
+                event.total_time = time.time() - start
+                self._notify(event)
+
+    def _send(self, method, url, data, headers, stream=False, event=None, idempotent=None):
+        """
+        Sends a request through the transport and returns the response
+        along with its body. With `stream`, a successful response is
+        returned unread and the body is None.
+
+        Rate-limited responses (503, 429, ...) and dropped or timed out
+        connections are retried after an exponential, jittered backoff
+        that honors the server's Retry-After header. Requests that are not
+        `idempotent` (by default, those not using an idempotent method)
+        are only retried when rate limited or when they were never sent.
+        ExcessiveRetriesException is raised when a call has failed more
+        than `self.max_retry_count` times, or when the client's shared
+        retry budget has been spent. Each attempt is recorded in `event`,
+        if one is given.
+
+        Every attempt waits for a token from each of the client's rate
+        budgets, then passes through its circuit breaker and concurrency
+        limiter, if it has them. A streamed response counts as
+        in flight until its headers have arrived.
+        """
+        if event is not None:
+            event.url = url
+        wire_data = None
+        if data is not None and self.compress_requests and \
+               len(data) >= self.COMPRESS_MIN_SIZE:
+            wire_data = gzip_encode(data)
+            headers = dict(headers)
+            headers['Content-Encoding'] = 'gzip'
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        policy = self.retry_policy
+        if idempotent is None:
+            idempotent = policy.is_idempotent(method)
+        policy.start()
+        limiter = self.concurrency_limiter
+        breaker = self.circuit_breaker
+        attempt = 0
+        while True:
+            retry_after = None
+            throttled = False
+            policy.wait()
+            for budget in self.rate_budgets:
+                budget.acquire()
+            if breaker is not None:
+                breaker.before()
+            if limiter is not None:
+                limiter.acquire()
+            sent = time.time()
+            status = None
+            try:
+                try:
+                    response = self.transport.request(method.upper(), url,
+                                                      wire_data or data, headers,
+                                                      idempotent=idempotent)
+                    if stream and response.status < 400:
+                        body = None
+                    else:
+                        body = response.read()
+                    status = response.status
+                finally:
+                    if limiter is not None or breaker is not None:
+                        self._record_outcome(status, time.time() - sent)
+            except Exception as e:
+                if not policy.is_retryable_error(e, idempotent):
+                    raise
+                error = repr(e)
+            else:
+                if event is not None:
+                    event.record_attempt(response, data, body, wire_data)
+                    event.retries = attempt
+                self.traffic.add(bytes_out=len(data or ''),
+                                 wire_bytes_out=len(wire_data or data or ''))
+                if body is not None:
+                    self.traffic.add(bytes_in=len(body), wire_bytes_in=response.bytes_read)
+                if response.status == 415 and wire_data is not None:
+                    # The server does not take compressed request bodies.
+                    self.log.info("Compressed request body refused for %s, "
+                                  "sending it uncompressed", url)
+                    self.compress_requests = False
+                    wire_data = None
+                    del headers['Content-Encoding']
+                    continue
+                if debug:
+                    self.log.debug("response.status=%s msg=%s headers=%s",
+                                   response.status, response.reason, response.getheaders())
+                if body is None:
+                    self.retry_count = attempt
+                    return response, None
+                if not policy.is_retryable_status(response.status, idempotent):
+                    self.retry_count = attempt
+                    return response, body
+                error = '%s %s' % (response.status, response.reason)
+                throttled = response.status in policy.THROTTLE_STATUSES
+                retry_after = policy.parse_retry_after(response.getheader('Retry-After'))
+
+            self.retry_count = attempt
+            if attempt >= self.max_retry_count:
+                raise ExcessiveRetriesException(
+                    "Exceeded maximum retry count (%d): %s" % (self.max_retry_count, error))
+            delay = policy.backoff(attempt, retry_after)
+            if delay is None:
+                # The server wants a longer pause than we will wait for;
+                # let the caller see the error response.
+                return response, body
+            if not policy.allow_retry(throttled):
+                raise ExcessiveRetriesException(
+                    "Retry budget exhausted after %d retries: %s" % (attempt, error))
+            attempt += 1
+            self.log.info("%s %s failed (%s), retry %d in %.2fs",
+                          method.upper(), url, error, attempt, delay)
+            if throttled:
+                policy.throttle(delay)
+            else:
+                policy.sleep(delay)
+
+    def _record_outcome(self, status, latency):
+        """
+        Reports an attempt to the concurrency limiter and circuit breaker.
+        A status of None means no response was received.
+
+        Rate limiting (429 and 503) cuts the concurrency limit, but shows
+        the server is up, so only connection failures and other 5xx
+        responses count as failures towards opening the circuit.
+        """
+        throttled = status in self.retry_policy.THROTTLE_STATUSES
+        failed = status is None or (status >= 500 and not throttled)
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release(latency, failed or throttled)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(not failed)
+
     def _get_query_string(self, params={}):
         if params:
             query_string = '?' + '&'.join([k+'='+urllib.quote(str(v)) for (k,v) in params.items()])
@@ -195,48 +592,85 @@ class IContactClient(object):
             query_string = ''
         return query_string
 
+    STATS_SUMMARIES = ('released', 'bounces', 'unsubscribes', 'opens', 'clicks',
+                       'forwards', 'comments', 'complaints')
+
+    def _stats_summary(self, stats_node):
+        if stats_node == None:
+            return None
+        summary = dict(
+            count=int(stats_node.get('count') or '0'),
+            percent=float(stats_node.get('percent')),
+            href=stats_node.get('{%s}href' % self.NAMESPACE))
+        if stats_node.get('unique'):
+            summary['unique'] = int(stats_node.get('unique'))
+        return summary
+
+    def _stats_contact(self, contact_node):
+        dates = tuple([parse_datetime(date_node.get('date'))
+                       for date_node in contact_node])
+        return StatsContact(contact_node.get('email'), contact_node.get('name'),
+                            contact_node.get('{%s}href' % self.NAMESPACE), dates)
+
     def _parse_stats(self, node):
         """
         Parses statistics information from a 'stats' XML node that will
         be present in an iContact API response to the
         message_delivery_details and message_stats methods. The parsed
-        information is returned as a dictionary of dictionaries.
+        information is returned as a dictionary of dictionaries, with the
+        recipients listed under 'contacts' as StatsContact records.
         """
-        def summary_to_dict(stats_node):
-            if stats_node == None:
-                return None
-            summary = dict(
-                count=int(stats_node.get('count') or '0'),
-                percent=float(stats_node.get('percent')),
-                href=stats_node.get('{%s}href' % self.NAMESPACE))
-            if stats_node.get('unique'):
-                summary['unique'] = int(stats_node.get('unique'))
-            return summary
-
-        results = dict(
-            released=summary_to_dict(node.find('released')),
-            bounces=summary_to_dict(node.find('bounces')),
-            unsubscribes=summary_to_dict(node.find('unsubscribes')),
-            opens=summary_to_dict(node.find('opens')),
-            clicks=summary_to_dict(node.find('clicks')),
-            forwards=summary_to_dict(node.find('forwards')),
-            comments=summary_to_dict(node.find('comments')),
-            complaints=summary_to_dict(node.find('complaintss'))
-        )
-        contacts=[]
-        for c in node.findall('*/contact'):
-            contact = dict(
-                email=c.get('email'),
-                name=c.get('name'),
-                href=c.get('{%s}href' % self.NAMESPACE))
-            dates = []
-            for date_node in c.findall('*'):
-                dates.append(parse(date_node.get('date')))
-            contact['dates'] = dates
-            contacts.append(contact)
+        results = {}
+        for name in self.STATS_SUMMARIES:
+            results[name] = self._stats_summary(node.find(name))
+        results['contacts'] = [self._stats_contact(c) for c in node.findall('*/contact')]
+        return results
+
+    def _stream_stats(self, call_path):
+        """
+        Performs a stats request and parses the response as it is read,
+        returning the same structure as _parse_stats without building the
+        whole XML document in memory.
+        """
+        results = dict([(name, None) for name in self.STATS_SUMMARIES])
+        contacts = []
+        # The dates of a contact's actions are elements named after the
+        # summary (<released date="..."/>), so match by parent as well.
+        tags = dict([(name, ('stats',)) for name in self.STATS_SUMMARIES])
+        tags['contact'] = self.STATS_SUMMARIES
+        for element in self._stream_request(call_path, tags, type='xml'):
+            tag = element.tag.split('}')[-1]
+            if tag == 'contact':
+                contacts.append(self._stats_contact(element))
+            else:
+                results[tag] = self._stats_summary(element)
         results['contacts'] = contacts
         return results
 
+    def message_stats(self, message_id, account_id=None, client_folder_id=None):
+        """
+        Returns the statistics for a sent message as a dictionary with a
+        summary dictionary (count, percent, href and sometimes unique) for
+        each of released, bounces, unsubscribes, opens, clicks, forwards,
+        comments and complaints, or None where the server sent no summary.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        return self._stream_stats('a/%s/c/%s/messages/%s/stats' % (
+            account_id, client_folder_id, message_id))
+
+    def message_delivery_details(self, message_id, action='released', account_id=None,
+                                 client_folder_id=None):
+        """
+        Returns the message_stats summaries together with the recipients
+        behind one of them (e.g. action='opens') under 'contacts': a list
+        of StatsContact records with email, name, href and the dates of
+        each action. The response is parsed as it streams in, so details
+        for very large sends can be fetched without holding the document.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        return self._stream_stats('a/%s/c/%s/messages/%s/stats/%s' % (
+            account_id, client_folder_id, message_id, action))
+
     def account(self, index=0):
         """
         Returns the first account object in the accounts dictionary.
@@ -252,7 +686,7 @@ class IContactClient(object):
         Url: /icp/a/{accountId}/c
         """
         result = self._do_request('a/%s/c%s' % (account_id, self._get_query_string(filters)), type='json')
-        self.log.debug("clientfolders: %s" % (result,))
+        self.log.debug("clientfolders: %s", result)
         return result
 
     def clientfolder(self, account_id, index=0):
@@ -263,16 +697,36 @@ class IContactClient(object):
 
 
     def _required_values(self, account_id, client_folder_id):
+        """
+        Fills in the client's default account and client folder ids where
+        they are not given, looking them up the first time they are needed.
+        """
         if account_id is None:
-            if self.account_id is None:
-                self.account_id = self._get_account_id()
             account_id = self.account_id
+            if account_id is None:
+                account_id = self._discover('account_id', self._get_account_id)
         if client_folder_id is None:
-            if self.client_folder_id is None:
-                self.client_folder_id = self._get_client_folder_id()
             client_folder_id = self.client_folder_id
+            if client_folder_id is None:
+                client_folder_id = self._discover('client_folder_id',
+                                                  self._get_client_folder_id)
         return account_id, client_folder_id
 
+    def _discover(self, attribute, lookup):
+        """
+        Returns the value of a default id, calling `lookup` to find it
+        unless another thread already has; threads that need it meanwhile
+        wait for that lookup rather than making their own.
+        """
+        self._discovery_lock.acquire()
+        try:
+            value = getattr(self, attribute)
+            if value is None:
+                value = lookup()
+            return value
+        finally:
+            self._discovery_lock.release()
+
 
     def search_contacts(self, params=None, account_id=None, client_folder_id=None, **kwarg_params):
         """
@@ -290,7 +744,7 @@ class IContactClient(object):
             p += "%s=%s" % (k,urllib.quote(params[k]))
 
         result = self._do_request('a/%s/c/%s/contacts/?%s' % (account_id, client_folder_id, p), type='json')
-        self.log.debug("search_contacts(%s)=%s" % (p, result))
+        self.log.debug("search_contacts(%s)=%s", p, result)
         return result
 
 
@@ -304,8 +758,9 @@ class IContactClient(object):
         """
         account_id, client_folder_id = self._required_values(account_id, client_folder_id)
 
-        result = self._do_request('a/%s/c/%s/lists/%s' % (account_id,client_folder_id,
-                                  self._get_query_string(filters)))
+        result = self._cached_request('lists', 'a/%s/c/%s/lists/%s' % (
+            account_id, client_folder_id, self._get_query_string(filters)),
+            account_id, client_folder_id)
 
         return result
 
@@ -321,7 +776,8 @@ class IContactClient(object):
         """
         account_id, client_folder_id = self._required_values(account_id, client_folder_id)
 
-        result = self._do_request('a/%s/c/%s/lists/%s/' % (account_id,client_folder_id, list_id))
+        result = self._cached_request('lists', 'a/%s/c/%s/lists/%s/' % (
+            account_id, client_folder_id, list_id), account_id, client_folder_id)
 
         return result
 
@@ -340,6 +796,7 @@ class IContactClient(object):
 
         result = self._do_request('a/%s/c/%s/lists/' % (account_id,client_folder_id),
                                   parameters=params, method='post')
+        self._invalidate(account_id, client_folder_id, 'lists')
 
         return result
 
@@ -349,8 +806,9 @@ class IContactClient(object):
         """
         account_id, client_folder_id = self._required_values(account_id, client_folder_id)
 
-        result = self._do_request('a/%s/c/%s/segments/%s' % (account_id,client_folder_id,
-                                  self._get_query_string(filters)))
+        result = self._cached_request('segments', 'a/%s/c/%s/segments/%s' % (
+            account_id, client_folder_id, self._get_query_string(filters)),
+            account_id, client_folder_id)
 
         return result
 
@@ -372,6 +830,7 @@ class IContactClient(object):
 
         result = self._do_request('a/%s/c/%s/segments/' % (account_id,client_folder_id),
                                   parameters=params, method='post')
+        self._invalidate(account_id, client_folder_id, 'segments')
 
         return result
 
@@ -385,6 +844,7 @@ class IContactClient(object):
         result = self._do_request('a/%s/c/%s/segments/%s/criteria/' % (
             account_id, client_folder_id, segmentId),
             parameters=params, method='post')
+        self._invalidate(account_id, client_folder_id, 'segments')
 
         return result
 
@@ -415,7 +875,7 @@ class IContactClient(object):
 
         result = self._do_request('a/%s/c/%s/contacts/' % (account_id, client_folder_id),
                                   parameters=params,
-                                  method='post')
+                                  method='post', idempotent=True)
 
         return result
 
@@ -425,14 +885,137 @@ class IContactClient(object):
         contact_id - required
         kwargs - prefix, firstName, lastName, suffix, street, street2, city, state, postalCode
                - phone, fax, business, status
+
+        With fingerprints, only changed fields are sent, and None is
+        returned without a request if nothing has changed.
         """
         account_id, client_folder_id = self._required_values(account_id, client_folder_id)
-        params = dict(contact=kwargs)
-        params['contact']['contactId'] = contact_id
-        return self._do_request('a/%s/c/%s/contacts/' % (account_id, client_folder_id),
+        fields = kwargs
+        if self.fingerprints is not None:
+            fields = self.fingerprints.changes(contact_id, kwargs)
+            if not fields:
+                return None
+        params = dict(contact=dict(fields, contactId=contact_id))
+        result = self._do_request('a/%s/c/%s/contacts/' % (account_id, client_folder_id),
                                   parameters=params,
-                                  method='post')
+                                  method='post', idempotent=True)
+        if self.fingerprints is not None:
+            self.fingerprints.remember(contact_id, fields)
+        return result
+
 
+    def create_contacts(self, contacts, account_id=None, client_folder_id=None,
+                        chunk_size=500, max_workers=1):
+        """
+        Creates many contacts, posting them `chunk_size` at a time as
+        arrays rather than one request per contact, and returns an
+        `icontact.batch.BatchResult` with one item per input row.
+        contacts - any iterable of dicts with an 'email' key and the same
+                   fields create_contact accepts; status defaults to 'normal'
+        max_workers - the number of chunks to post concurrently
+
+        Returned contacts are matched back to input rows by email address.
+        A row that iContact did not return, or a chunk that failed outright,
+        is reported through that row's `error` without stopping the import.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        path = 'a/%s/c/%s/contacts/' % (account_id, client_folder_id)
+
+        def send_chunk(chunk):
+            records = []
+            for index, row in chunk:
+                record = dict(row)
+                if 'status' not in record:
+                    record['status'] = 'normal'
+                records.append(record)
+            result = self._do_request(path, parameters=dict(contact=records), method='post',
+                                      idempotent=True)
+            return self._match_batch(chunk, result, 'contacts', 'email',
+                                     lambda row: row.get('email', '').lower(),
+                                     lambda contact: contact.email.lower())
+
+        return run_batches(send_chunk, contacts, chunk_size, max_workers)
+
+    def update_contacts(self, contacts, account_id=None, client_folder_id=None,
+                        chunk_size=500, max_workers=1):
+        """
+        Updates many contacts, posting them `chunk_size` at a time, and
+        returns an `icontact.batch.BatchResult` with one item per input row.
+        contacts - any iterable of dicts with a 'contactId' key and the
+                   fields to change
+        max_workers - the number of chunks to post concurrently
+
+        With fingerprints, rows are reduced to their changed fields before
+        they are chunked, and rows with no changes are not sent: their
+        items have neither a result nor an error (see `BatchResult.skipped`).
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        path = 'a/%s/c/%s/contacts/' % (account_id, client_folder_id)
+        fingerprints = self.fingerprints
+
+        def send_chunk(chunk):
+            records = [dict(row) for index, row in chunk]
+            result = self._do_request(path, parameters=dict(contact=records), method='post',
+                                      idempotent=True)
+            items = self._match_batch(chunk, result, 'contacts', 'contactId',
+                                      lambda row: str(row.get('contactId')),
+                                      lambda contact: str(contact.contactId))
+            if fingerprints is not None:
+                for item in items:
+                    if item.error is None:
+                        fields = dict(item.row)
+                        fingerprints.remember(fields.pop('contactId'), fields)
+            return items
+
+        if fingerprints is None:
+            return run_batches(send_chunk, contacts, chunk_size, max_workers)
+
+        # Rows are renumbered as they are reduced; `sent` maps the
+        # numbering of the rows sent back to the caller's.
+        sent = []
+        skipped = []
+
+        def changed_rows():
+            for index, row in enumerate(contacts):
+                fields = dict(row)
+                contact_id = fields.pop('contactId', None)
+                fields = fingerprints.changes(contact_id, fields)
+                if not fields:
+                    skipped.append(BatchItem(index, row))
+                    continue
+                sent.append((index, row))
+                fields['contactId'] = contact_id
+                yield fields
+
+        batch = run_batches(send_chunk, changed_rows(), chunk_size, max_workers)
+        for item in batch.items:
+            item.index, item.row = sent[item.index]
+        batch.items.extend(skipped)
+        batch.items.sort(key=lambda item: item.index)
+        return batch
+
+    def _match_batch(self, chunk, result, collection, field, row_key, record_key):
+        """
+        Maps the records in `result.<collection>` back to the (index, row)
+        pairs of the chunk that produced them, returning BatchItems. Rows
+        with no matching record get the response's warnings as their error.
+        """
+        returned = {}
+        for record in getattr(result, collection, None) or []:
+            returned[record_key(record)] = record
+        warnings = getattr(result, 'warnings', None) or []
+        if warnings:
+            error = '; '.join([unicode(w) for w in warnings])
+        else:
+            error = '%s not returned by iContact' % field
+        items = []
+        for index, row in chunk:
+            record = returned.get(row_key(row))
+            if record is None:
+                items.append(BatchItem(index, row, error=error))
+            else:
+                items.append(BatchItem(index, row, result=record))
+        return items
 
     def delete_contact(self, contact_id, account_id=None, client_folder_id=None):
         """
@@ -441,6 +1024,8 @@ class IContactClient(object):
         account_id, client_folder_id = self._required_values(account_id, client_folder_id)
         result = self._do_request('a/%s/c/%s/contacts/%s' % (account_id, client_folder_id,
             contact_id), method='delete')
+        if self.fingerprints is not None:
+            self.fingerprints.forget(contact_id)
 
         return result
 
@@ -461,9 +1046,64 @@ class IContactClient(object):
         data = dict(subscription=dict(contactId=contact_id,listId=list_id, status=status))
         result = self._do_request('a/%s/c/%s/subscriptions/' % (account_id, client_folder_id),
                                   parameters=data,
-                                  method='post')
+                                  method='post', idempotent=True)
         return result
 
+    def create_subscriptions(self, subscriptions, account_id=None, client_folder_id=None,
+                             chunk_size=500, max_workers=1):
+        """
+        Creates many subscriptions, posting them `chunk_size` at a time as
+        arrays, and returns an `icontact.batch.BatchResult` with one item
+        per input row.
+        subscriptions - any iterable of (contact_id, list_id) or
+                        (contact_id, list_id, status) tuples; status
+                        defaults to 'normal'
+        max_workers - the number of chunks to post concurrently
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        path = 'a/%s/c/%s/subscriptions/' % (account_id, client_folder_id)
+
+        def send_chunk(chunk):
+            records = []
+            for index, row in chunk:
+                status = 'normal'
+                if len(row) > 2:
+                    status = row[2]
+                records.append(dict(contactId=row[0], listId=row[1], status=status))
+            result = self._do_request(path, parameters=dict(subscription=records),
+                                      method='post', idempotent=True)
+            return self._match_batch(chunk, result, 'subscriptions', 'subscription',
+                                     lambda row: (str(row[1]), str(row[0])),
+                                     lambda sub: (str(sub.listId), str(sub.contactId)))
+
+        return run_batches(send_chunk, subscriptions, chunk_size, max_workers)
+
+    def move_subscribers(self, moves, account_id=None, client_folder_id=None,
+                         chunk_size=500, max_workers=1):
+        """
+        Moves many subscribers between lists, returning an
+        `icontact.batch.BatchResult` with one item per input row.
+        moves - any iterable of (old_list, contact_id, new_list) tuples
+        max_workers - the number of chunks to post concurrently
+
+        Rather than one PUT per subscription as in move_subscriber, each
+        chunk is posted to the subscriptions resource as a single array of
+        {subscriptionId, listId} updates.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        path = 'a/%s/c/%s/subscriptions/' % (account_id, client_folder_id)
+
+        def send_chunk(chunk):
+            records = [dict(subscriptionId='%s_%s' % (old_list, contact_id), listId=new_list)
+                       for index, (old_list, contact_id, new_list) in chunk]
+            result = self._do_request(path, parameters=dict(subscription=records),
+                                      method='post')
+            return self._match_batch(chunk, result, 'subscriptions', 'subscription',
+                                     lambda row: (str(row[2]), str(row[1])),
+                                     lambda sub: (str(sub.listId), str(sub.contactId)))
+
+        return run_batches(send_chunk, moves, chunk_size, max_workers)
+
     def subscriptions(self, account_id=None, client_folder_id=None, filters=None):
         """
         Returns iContact Subscriptions
@@ -487,6 +1127,7 @@ class IContactClient(object):
         result = self._do_request('a/%s/c/%s/messages/' % (account_id, client_folder_id),
                                   parameters=data,
                                   method='post')
+        self._invalidate(account_id, client_folder_id, 'messages')
         return result
 
 
@@ -503,9 +1144,8 @@ class IContactClient(object):
         account_id, client_folder_id = self._required_values(account_id,
                                                              client_folder_id)
 
-        result = self._do_request('a/%s/c/%s/messages/%s' %
-                                  (account_id, client_folder_id, messageId),
-                                  method='get')
+        result = self._cached_request('messages', 'a/%s/c/%s/messages/%s' % (
+            account_id, client_folder_id, messageId), account_id, client_folder_id)
         return result
 
     def create_send(self, messageId, includeListIds, account_id=None,
@@ -521,6 +1161,7 @@ class IContactClient(object):
         result = self._do_request('a/%s/c/%s/sends/' % (account_id, client_folder_id),
                                   parameters=data,
                                   method='post')
+        self._invalidate(account_id, client_folder_id, 'messages')
         return result
 
     def delete_send(self, sendId, account_id=None, client_folder_id=None):
@@ -533,6 +1174,13 @@ class IContactClient(object):
         result = self._do_request('a/%s/c/%s/sends/%s' %
                                   (account_id, client_folder_id, sendId),
                                   method='delete')
+        self._invalidate(account_id, client_folder_id, 'messages')
+        return result
+
+    def sends(self, account_id=None, client_folder_id=None, filters=None):
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        result = self._do_request('a/%s/c/%s/sends/%s' % (account_id, client_folder_id,
+                                  self._get_query_string(filters)))
         return result
 
     def get_send(self, sendId, account_id=None, client_folder_id=None):
@@ -547,6 +1195,468 @@ class IContactClient(object):
                                   method='get')
         return result
 
+    def map(self, method, iterable, max_workers=8, ordered=True):
+        """
+        Calls a client method once for each item of `iterable`, running up
+        to `max_workers` calls at a time on a thread pool that shares this
+        client's connections and retry budget, and yields an
+        `icontact.batch.BatchItem` for each call as it is available. Items
+        are yielded in input order, or as they complete if `ordered` is
+        False. A call that raises is reported through its item's `error`
+        rather than stopping the others.
+
+        method - a method name such as 'create_subscription', or a callable
+        iterable - the arguments for each call: a tuple of positional
+                   arguments, a dict of keyword arguments or a single value
+
+          >>> for item in client.map('delete_contact', contact_ids):
+          ...     if item.error: print item.row, item.error
+
+        Rate limiting reported by iContact to any of the calls pauses them
+        all until the server's backoff has passed.
+        """
+        if not callable(method):
+            method = getattr(self, method)
+        self.transport.grow(max_workers)
+
+        def call(args):
+            if isinstance(args, tuple):
+                return method(*args)
+            if isinstance(args, dict):
+                return method(**args)
+            return method(args)
+
+        executor = ThreadPoolExecutor(max_workers)
+        finished = Queue.Queue()
+        pending = []
+
+        def collect(index, args, future):
+            error = future.exception()
+            if error is not None:
+                return BatchItem(index, args, error=error)
+            return BatchItem(index, args, result=future.result())
+
+        try:
+            for index, args in enumerate(iterable):
+                future = executor.submit(call, args)
+                if ordered:
+                    pending.append((index, args, future))
+                    if len(pending) >= max_workers * 2:
+                        yield collect(*pending.pop(0))
+                else:
+                    future.add_done_callback(
+                        lambda f, index=index, args=args: finished.put((index, args, f)))
+                    pending.append(index)
+                    if len(pending) >= max_workers * 2:
+                        item = collect(*finished.get())
+                        pending.remove(item.index)
+                        yield item
+            while pending:
+                if ordered:
+                    yield collect(*pending.pop(0))
+                else:
+                    item = collect(*finished.get())
+                    pending.remove(item.index)
+                    yield item
+        finally:
+            executor.shutdown(wait=False)
+
+    # Send statuses after which a send's status no longer changes.
+    SEND_FINISHED_STATUSES = ('sent', 'failed', 'canceled', 'cancelled')
+
+    def wait_for_sends(self, send_ids, timeout=None, account_id=None, client_folder_id=None,
+                       max_workers=8, min_interval=1.0, max_interval=60.0, backoff=1.5):
+        """
+        Polls the status of many sends at once and yields an
+        `icontact.batch.BatchItem` for each send as soon as it is seen to
+        have finished, with the send record as its `result` (or the error
+        that stopped it being polled, such as the send having been
+        deleted). `index` and `row` are the send's position in `send_ids`
+        and its id. Raises icontact.executor.TimeoutError if some sends
+        are still unfinished after `timeout` seconds.
+
+          >>> for item in client.wait_for_sends(send_ids, timeout=3600):
+          ...     print item.row, item.error or item.result.status
+
+        Up to `max_workers` sends are polled at a time, sharing this
+        client's connections. Each send is polled on its own schedule: a
+        pending send is next looked at around its scheduledTime, and a
+        send in progress after `min_interval` seconds, growing by
+        `backoff` each time it is still running, up to `max_interval`.
+        Failed polls are retried on the same growing schedule. Finished
+        sends are not polled again.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        send_ids = [str(send_id) for send_id in send_ids]
+        deadline = timeout is not None and time.time() + timeout or None
+        self.transport.grow(max_workers)
+        executor = ThreadPoolExecutor(max_workers)
+        finished = Queue.Queue()
+        due = [(0.0, index) for index in range(len(send_ids))]
+        intervals = {}
+        in_flight = 0
+        remaining = len(send_ids)
+
+        def poll(index):
+            return self.get_send(send_ids[index], account_id, client_folder_id)
+
+        try:
+            while remaining:
+                now = time.time()
+                while due and due[0][0] <= now and in_flight < max_workers:
+                    index = heapq.heappop(due)[1]
+                    future = executor.submit(poll, index)
+                    future.add_done_callback(lambda f, index=index: finished.put((index, f)))
+                    in_flight += 1
+                wait = None
+                if due and in_flight < max_workers:
+                    wait = max(0.0, due[0][0] - now)
+                if deadline is not None:
+                    if now >= deadline:
+                        raise TimeoutError("%d of %d sends still unfinished after %ss" % (
+                            remaining, len(send_ids), timeout))
+                    wait = min(wait is None and deadline - now or wait, deadline - now)
+                try:
+                    index, future = finished.get(True, wait)
+                except Queue.Empty:
+                    continue
+                in_flight -= 1
+                interval = min(max_interval,
+                               intervals.get(index, min_interval / backoff) * backoff)
+                intervals[index] = interval
+                error = future.exception()
+                if error is not None:
+                    if not isinstance(error, ExcessiveRetriesException) and \
+                           not self.retry_policy.is_retryable_error(error):
+                        remaining -= 1
+                        yield BatchItem(index, send_ids[index], error=error)
+                        continue
+                    send = None
+                else:
+                    send = future.result().send
+                    if send.status in self.SEND_FINISHED_STATUSES:
+                        remaining -= 1
+                        yield BatchItem(index, send_ids[index], result=send)
+                        continue
+                    scheduled = getattr(send, 'scheduledTime', None)
+                    if send.status == 'pending' and scheduled:
+                        # Nothing will change before the send starts.
+                        try:
+                            start = _timestamp(parse_datetime(str(scheduled)))
+                        except ValueError:
+                            start = None
+                        if start is not None and start - time.time() > interval:
+                            interval = min(max_interval, start - time.time())
+                            intervals[index] = min_interval / backoff
+                # A little jitter keeps sends created together from being
+                # polled in lockstep.
+                heapq.heappush(due, (time.time() + interval * random.uniform(0.9, 1.1),
+                                     index))
+        finally:
+            executor.shutdown(wait=False)
+
+    def _iter_pages(self, fetch, collection, filters, page_size, prefetch):
+        """
+        Yields every record in `collection` across as many pages as the
+        server has, calling `fetch(filters)` with `limit` and `offset` set
+        for each page. Only the current page is held in memory, plus the
+        next one when `prefetch` is True, in which case it is requested
+        in the background while the caller works through the current page.
+        Paging stops at the response's `total`, or at the first short page.
+        """
+        filters = dict(filters or {})
+        offset = int(filters.pop('offset', 0))
+
+        def get_page(offset):
+            page_filters = dict(filters)
+            page_filters['limit'] = str(page_size)
+            page_filters['offset'] = str(offset)
+            return fetch(page_filters)
+
+        executor = None
+        if prefetch:
+            executor = ThreadPoolExecutor(1)
+        try:
+            page = get_page(offset)
+            while True:
+                records = getattr(page, collection, None) or []
+                total = getattr(page, 'total', None)
+                next_offset = offset + len(records)
+                more = len(records) >= page_size
+                if total is not None:
+                    more = more and next_offset < int(total)
+                next_page = None
+                if more and executor is not None:
+                    next_page = executor.submit(get_page, next_offset)
+                page = None
+                for record in records:
+                    yield record
+                if not more:
+                    if executor is not None:
+                        executor.shutdown()
+                    return
+                records = None
+                offset = next_offset
+                if next_page is not None:
+                    page = next_page.result()
+                else:
+                    page = get_page(offset)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def stream_contacts(self, params=None, account_id=None, client_folder_id=None,
+                        raw=False, **kwarg_params):
+        """
+        Yields the contacts matching the search_contacts parameters one at
+        a time as they are read from the response, so that a very large
+        result (e.g. with a high `limit`) is never held in memory at once.
+        With `raw`, contacts are yielded as plain dicts.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        params = dict(params or {})
+        params.update(kwarg_params)
+        return self._stream_request('a/%s/c/%s/contacts/' % (account_id, client_folder_id),
+                                    ['contacts'], params, raw=raw)
+
+    def stream_subscriptions(self, account_id=None, client_folder_id=None, filters=None,
+                             raw=False):
+        """Yields subscriptions one at a time as they are read."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        return self._stream_request('a/%s/c/%s/subscriptions/' % (account_id, client_folder_id),
+                                    ['subscriptions'], filters or {}, raw=raw)
+
+    def stream_contact_history(self, contact_id, account_id=None, client_folder_id=None,
+                               filters=None, raw=False):
+        """Yields a contact's history actions one at a time as they are read."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        return self._stream_request('a/%s/c/%s/contacts/%s/actions/' % (
+            account_id, client_folder_id, contact_id), ['actions'], filters or {}, raw=raw)
+
+    def iter_contacts(self, params=None, account_id=None, client_folder_id=None,
+                      page_size=500, prefetch=False, **kwarg_params):
+        """
+        Yields every contact matching the search_contacts parameters,
+        fetching `page_size` contacts per request as the caller iterates.
+        """
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        params = dict(params or {})
+        params.update(kwarg_params)
+        fetch = lambda filters: self.search_contacts(filters, account_id, client_folder_id)
+        return self._iter_pages(fetch, 'contacts', params, page_size, prefetch)
+
+    def iter_subscriptions(self, account_id=None, client_folder_id=None, filters=None,
+                           page_size=500, prefetch=False):
+        """Yields every subscription, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.subscriptions(account_id, client_folder_id, filters=f)
+        return self._iter_pages(fetch, 'subscriptions', filters, page_size, prefetch)
+
+    def iter_messages(self, account_id=None, client_folder_id=None, filters=None,
+                      page_size=500, prefetch=False):
+        """Yields every message, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.messages(account_id, client_folder_id, filters=f)
+        return self._iter_pages(fetch, 'messages', filters, page_size, prefetch)
+
+    def iter_sends(self, account_id=None, client_folder_id=None, filters=None,
+                   page_size=500, prefetch=False):
+        """Yields every send, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.sends(account_id, client_folder_id, filters=f)
+        return self._iter_pages(fetch, 'sends', filters, page_size, prefetch)
+
+    def iter_lists(self, account_id=None, client_folder_id=None, filters=None,
+                   page_size=500, prefetch=False):
+        """Yields every list, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.lists(account_id=account_id, client_folder_id=client_folder_id,
+                                     filters=f)
+        return self._iter_pages(fetch, 'lists', filters, page_size, prefetch)
+
+    def iter_segments(self, account_id=None, client_folder_id=None, filters=None,
+                      page_size=500, prefetch=False):
+        """Yields every segment, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.segments(account_id, client_folder_id, filters=f)
+        return self._iter_pages(fetch, 'segments', filters, page_size, prefetch)
+
+    def iter_contact_history(self, contact_id, account_id=None, client_folder_id=None,
+                             filters=None, page_size=500, prefetch=False):
+        """Yields every action in a contact's history, one page at a time."""
+        account_id, client_folder_id = self._required_values(account_id, client_folder_id)
+        fetch = lambda f: self.contact_history(contact_id, account_id, client_folder_id,
+                                               filters=f)
+        return self._iter_pages(fetch, 'actions', filters, page_size, prefetch)
+
+def _timed(items, event):
+    """
+    Passes through the items of an iterator, adding the time spent
+    producing them to `event.decode_time`.
+    """
+    items = iter(items)
+    while True:
+        start = time.time()
+        try:
+            item = items.next()
+        except StopIteration:
+            event.decode_time += time.time() - start
+            return
+        event.decode_time += time.time() - start
+        yield item
+
+class AsyncIContactClient(object):
+    """
+    A non-blocking counterpart to IContactClient.
+
+    Every public IContactClient method is available with the same
+    arguments, but returns immediately with an `icontact.executor.Future`
+    whose result() is the value the blocking method would have returned.
+    Calls run on a pool of at most `concurrency` worker threads that
+    share one IContactClient, and therefore one pool of keep-alive
+    connections, one retry budget and one account/client folder lookup::
+
+      >>> client = AsyncIContactClient(api_key, username, password)
+      >>> futures = [client.create_subscription(c, list_id) for c in contact_ids]
+      >>> for future in as_completed(futures): ...
+
+    Any other keyword arguments are passed on to IContactClient.
+    """
+
+    def __init__(self, api_key, username, password, concurrency=10, **kwargs):
+        if kwargs.get('transport') is None:
+            kwargs['transport'] = HTTPTransport(maxsize=concurrency)
+        self.client = IContactClient(api_key, username, password, **kwargs)
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Runs the named IContactClient method in the background and
+        returns its Future.
+        """
+        return self.executor.submit(getattr(self.client, method), *args, **kwargs)
+
+    def wait_for_sends(self, send_ids, timeout=None, **kwargs):
+        """
+        Returns a Future for each of `send_ids`, in order, that is resolved
+        with the send record once the send has finished (see
+        IContactClient.wait_for_sends, which takes the same arguments).
+        Polling occupies one of this client's workers until every send has
+        finished; if `timeout` passes first, the unfinished futures fail
+        with icontact.executor.TimeoutError.
+        """
+        send_ids = list(send_ids)
+        futures = [Future() for send_id in send_ids]
+
+        def wait():
+            try:
+                for item in self.client.wait_for_sends(send_ids, timeout, **kwargs):
+                    if item.error is not None:
+                        futures[item.index].set_exception(item.error)
+                    else:
+                        futures[item.index].set_result(item.result)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+        self.executor.submit(wait)
+        return futures
+
+    def close(self):
+        """Waits for outstanding calls and stops the worker threads."""
+        self.executor.shutdown()
+        self.client.transport.clear()
+
+def _async_method(name):
+    def method(self, *args, **kwargs):
+        return self.submit(name, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(IContactClient, name).__doc__
+    return method
+
+for _name in dir(IContactClient):
+    # map and the iter_* and stream_* generators already run incrementally;
+    # they are used through `AsyncIContactClient.client` rather than as futures.
+    if _name in ('map', 'wait_for_sends') or _name.startswith('iter_') or _name.startswith('stream_'):
+        continue
+    if not _name.startswith('_') and callable(getattr(IContactClient, _name)):
+        setattr(AsyncIContactClient, _name, _async_method(_name))
+del _name
+
+class StatsContact(object):
+    """
+    A recipient listed in message statistics. The fields can be read as
+    attributes or, as with the dictionaries returned by earlier versions
+    of _parse_stats, by key: contact.email == contact['email'].
+    """
+    __slots__ = ('email', 'name', 'href', 'dates')
+
+    def __init__(self, email, name, href, dates):
+        self.email = email
+        self.name = name
+        self.href = href
+        self.dates = dates
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __repr__(self):
+        return 'icontact.client.StatsContact(%r, %r, %r, %r)' % (
+            self.email, self.name, self.href, self.dates)
+
+_offsets = {}
+
+def parse_datetime(value):
+    """
+    Parses the date-times found in iContact responses, such as
+    '2009-03-02T11:32:10-05:00' or '2009-03-02 11:32:10', without the
+    overhead of dateutil's general parser. Values in any other format
+    are handed to dateutil.
+    """
+    try:
+        if len(value) >= 19 and value[4] == '-' and value[7] == '-' and \
+               value[10] in 'T ' and value[13] == ':' and value[16] == ':':
+            dt = datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                          int(value[11:13]), int(value[14:16]), int(value[17:19]))
+            rest = value[19:]
+            if rest[:1] == '.':
+                end = 1
+                while end < len(rest) and rest[end].isdigit():
+                    end += 1
+                if end == 1:
+                    raise ValueError(value)
+                dt = dt.replace(microsecond=int((rest[1:end] + '000000')[:6]))
+                rest = rest[end:]
+            if not rest:
+                return dt
+            if rest in ('Z', 'z'):
+                minutes = 0
+            elif len(rest) == 6 and rest[0] in '+-' and rest[3] == ':':
+                minutes = int(rest[1:3]) * 60 + int(rest[4:6])
+            elif len(rest) == 5 and rest[0] in '+-':
+                minutes = int(rest[1:3]) * 60 + int(rest[3:5])
+            else:
+                raise ValueError(value)
+            if rest[0] == '-':
+                minutes = -minutes
+            tz = _offsets.get(minutes)
+            if tz is None:
+                tz = _offsets.setdefault(minutes, FixedOffset(minutes))
+            return dt.replace(tzinfo=tz)
+    except ValueError:
+        pass
+    from dateutil.parser import parse
+    return parse(value)
+
+def _timestamp(dt):
+    """Returns a datetime as seconds since the epoch, taking naive ones as local."""
+    if dt.tzinfo is not None and dt.utcoffset() is not None:
+        return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+    return time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+
 class FixedOffset(tzinfo):
     """
     Fixed offset value that extends the `datetime.tzinfo` object to
@@ -0,0 +1,96 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Coalescing of identical API calls made at the same time by several threads.
+"""
+import threading
+
+from icontact.executor import Future
+from icontact.instrumentation import endpoint_template
+
+
+class RequestCoalescer(object):
+    """
+    Lets concurrent identical calls share a single execution: while a
+    call for a key is in flight, further calls for the same key wait for
+    it and receive its result (or its exception) instead of running again.
+    Nothing is remembered once the call has finished.
+
+    - endpoints: (Optional) the endpoint templates whose GETs may be
+      coalesced, such as 'a/{accountId}/c/{clientFolderId}/lists/' (see
+      `icontact.instrumentation.endpoint_template`). By default every GET
+      is.
+    """
+
+    def __init__(self, endpoints=None):
+        if endpoints is not None:
+            endpoints = frozenset(endpoints)
+        self.endpoints = endpoints
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.deduplicated = 0
+
+    def applies_to(self, call_path):
+        """Returns True if GETs of this API path may be coalesced."""
+        if self.endpoints is None:
+            return True
+        return endpoint_template(call_path) in self.endpoints
+
+    def call(self, key, fn):
+        """Returns `fn()`, or the result of an identical call in flight."""
+        self._lock.acquire()
+        try:
+            future = self._calls.get(key)
+            if future is not None:
+                self.deduplicated += 1
+            else:
+                self.executed += 1
+                self._calls[key] = leader = Future()
+        finally:
+            self._lock.release()
+        if future is not None:
+            return future.result()
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key)
+            leader.set_exception(e)
+            raise
+        except:
+            # e.g. KeyboardInterrupt: let the waiting callers make their
+            # own attempt rather than see an error that is not theirs.
+            self._finish(key)
+            leader.set_exception(RequestInterrupted())
+            raise
+        self._finish(key)
+        leader.set_result(result)
+        return result
+
+    def _finish(self, key):
+        self._lock.acquire()
+        try:
+            del self._calls[key]
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return dict(executed=self.executed, deduplicated=self.deduplicated,
+                    in_flight=len(self._calls))
+
+
+class RequestInterrupted(Exception):
+    """Raised to callers waiting on a shared call that was interrupted."""
+    pass
@@ -0,0 +1,134 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+JSON encoding and decoding of request and response bodies.
+
+The client encodes and decodes through a codec, which by default uses the
+fastest JSON library installed: orjson, ujson, simplejson (with its C
+speedups) or the standard library's json, in that order. The library is
+only imported when a codec is first asked for, not when this module is.
+"""
+import threading
+
+BACKENDS = ('orjson', 'ujson', 'simplejson', 'json')
+
+
+class JSONCodec(object):
+    """
+    Encodes request bodies with `dumps(obj)`, returning a byte string, and
+    decodes response bodies with `loads(data)`, which raises ValueError
+    for malformed JSON. `name` identifies the library used.
+
+    Subclass this to plug in another library, and pass an instance to
+    IContactClient as `json_codec`.
+    """
+    name = None
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+
+class ModuleCodec(JSONCodec):
+    """
+    A codec for simplejson or the standard library's json, which encodes
+    without spaces after separators, as orjson and ujson do. `module` is
+    kept for callers that need its JSONDecoder.
+    """
+
+    def __init__(self, module):
+        self.name = module.__name__
+        self.module = module
+        self.dumps = module.JSONEncoder(separators=(',', ':')).encode
+        self.loads = module.loads
+
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+class UjsonCodec(JSONCodec):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._dumps = ujson.dumps
+        self.loads = ujson.loads
+
+    def dumps(self, obj):
+        # ujson escapes '/' unless told not to; the others never do.
+        return self._dumps(obj, escape_forward_slashes=False)
+
+
+def _load(name):
+    if name == 'orjson':
+        return OrjsonCodec()
+    if name == 'ujson':
+        return UjsonCodec()
+    if name == 'simplejson':
+        import simplejson
+        return ModuleCodec(simplejson)
+    if name == 'json':
+        import json
+        return ModuleCodec(json)
+    raise ValueError("Unknown JSON backend %r; expected one of %s" % (
+        name, ', '.join(BACKENDS)))
+
+
+_codecs = {}
+_lock = threading.Lock()
+
+
+def get_codec(name=None):
+    """
+    Returns the codec for a backend in BACKENDS, or for the first one
+    installed if no name is given. Raises ImportError if the named
+    library is not installed.
+    """
+    _lock.acquire()
+    try:
+        if name in _codecs:
+            return _codecs[name]
+        if name is not None:
+            codec = _load(name)
+        else:
+            for backend in BACKENDS:
+                try:
+                    codec = _load(backend)
+                    break
+                except ImportError:
+                    continue
+        _codecs[name] = codec
+        return codec
+    finally:
+        _lock.release()
+
+
+def available_backends():
+    """Returns the names of the backends that are installed."""
+    names = []
+    for name in BACKENDS:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
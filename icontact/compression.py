@@ -0,0 +1,69 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+gzip and deflate content coding for request and response bodies.
+"""
+import zlib
+
+ACCEPT_ENCODING = 'gzip, deflate'
+ENCODINGS = ('gzip', 'x-gzip', 'deflate')
+
+
+def gzip_encode(data, level=6):
+    """Returns `data` compressed in gzip format."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class Decoder(object):
+    """
+    Incrementally decompresses a body sent with a gzip or deflate
+    Content-Encoding, so that it can be decoded as it is read.
+
+    'deflate' should be a zlib stream, but some servers send raw deflate
+    data instead; both are accepted.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'deflate':
+            self._obj = zlib.decompressobj()
+        else:
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._started = False
+
+    def decompress(self, data):
+        try:
+            result = self._obj.decompress(data)
+        except zlib.error:
+            if self.encoding != 'deflate' or self._started:
+                raise
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            result = self._obj.decompress(data)
+        self._started = True
+        return result
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def decoder_for(encoding):
+    """
+    Returns a Decoder for a Content-Encoding header value, or None if the
+    body is not compressed (or is compressed in a way we do not handle).
+    """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ENCODINGS:
+        return Decoder(encoding)
+    return None
@@ -0,0 +1,179 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+A small thread-pool executor and future, used to run iContact API calls
+concurrently over a shared connection pool.
+"""
+import threading
+import Queue
+
+
+class Future(object):
+    """The pending result of a call submitted to a `ThreadPoolExecutor`."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def _wait(self, timeout):
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._condition.wait(timeout)
+            if not self._done:
+                raise TimeoutError()
+        finally:
+            self._condition.release()
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to finish and returns its result, re-raising
+        the call's exception if it failed.
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Waits for the call to finish and returns its exception, if any."""
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        Calls `fn(future)` once the call has finished, immediately if it
+        already has.
+        """
+        self._condition.acquire()
+        try:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._condition.release()
+        fn(self)
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+    def _finish(self, result, exception):
+        self._condition.acquire()
+        try:
+            self._result = result
+            self._exception = exception
+            self._done = True
+            self._condition.notifyAll()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._condition.release()
+        for fn in callbacks:
+            fn(self)
+
+
+class TimeoutError(Exception):
+    """Raised when a future's result is not available in time."""
+    pass
+
+
+class ThreadPoolExecutor(object):
+    """
+    Runs submitted calls on at most `max_workers` daemon threads, which
+    are started on demand.
+    """
+
+    def __init__(self, max_workers=10):
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules `fn(*args, **kwargs)` and returns its `Future`."""
+        future = Future()
+        self._lock.acquire()
+        try:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            self._queue.put((future, fn, args, kwargs))
+            if self._idle <= 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._idle -= 1
+        finally:
+            self._lock.release()
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            del item, future, fn, args, kwargs
+            self._lock.acquire()
+            try:
+                self._idle += 1
+            finally:
+                self._lock.release()
+
+    def shutdown(self, wait=True):
+        """Stops the worker threads once all submitted calls have run."""
+        self._lock.acquire()
+        try:
+            self._shutdown = True
+            threads = list(self._threads)
+        finally:
+            self._lock.release()
+        for thread in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def as_completed(futures, timeout=None):
+    """
+    Yields the given futures as they finish, in completion order. Raises
+    TimeoutError if they have not all finished within `timeout` seconds.
+    """
+    futures = list(futures)
+    finished = Queue.Queue()
+    for future in futures:
+        future.add_done_callback(finished.put)
+    for i in range(len(futures)):
+        try:
+            yield finished.get(True, timeout)
+        except Queue.Empty:
+            raise TimeoutError()
@@ -0,0 +1,274 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Export of contacts, subscriptions and contact history to NDJSON or CSV.
+
+Records are streamed page by page from the API straight into the output
+file as plain dicts, so memory use does not grow with the size of the
+account. From the command line:
+
+  python -m icontact.export contacts contacts.csv.gz --format csv
+
+with the API credentials in ICONTACT_API_KEY, ICONTACT_USERNAME and
+ICONTACT_PASSWORD (or given as options; see --help).
+"""
+import csv
+import gzip
+import optparse
+import os
+import sys
+import threading
+import Queue
+
+from icontact.codec import get_codec
+
+FORMATS = ('ndjson', 'csv')
+
+# Default CSV columns; NDJSON output always has every field.
+FIELDS = {
+    'contacts': ('contactId', 'email', 'prefix', 'firstName', 'lastName', 'suffix',
+                 'street', 'street2', 'city', 'state', 'postalCode', 'phone', 'fax',
+                 'business', 'status', 'bounceCount', 'createDate'),
+    'subscriptions': ('subscriptionId', 'contactId', 'listId', 'status', 'addDate'),
+    'history': ('contactId', 'actionType', 'actionTime', 'details'),
+}
+
+
+class NDJSONWriter(object):
+    """Writes each record as one line of JSON."""
+
+    def __init__(self, fp, fields=None):
+        self.fp = fp
+        self._codec = get_codec()
+
+    def write(self, record):
+        self.fp.write(self._codec.dumps(record))
+        self.fp.write('\n')
+
+
+class CSVWriter(object):
+    """
+    Writes records as CSV rows with a header line. Fields missing from a
+    record are left empty, and fields not in `fields` are dropped.
+    """
+
+    def __init__(self, fp, fields):
+        self.fields = list(fields)
+        self._codec = get_codec()
+        self._writer = csv.writer(fp)
+        self._writer.writerow(self.fields)
+
+    def write(self, record):
+        row = []
+        for field in self.fields:
+            value = record.get(field)
+            if value is None:
+                value = ''
+            elif isinstance(value, unicode):
+                value = value.encode('utf-8')
+            elif not isinstance(value, str):
+                value = self._codec.dumps(value)
+            row.append(value)
+        self._writer.writerow(row)
+
+
+def open_output(path, compress=None):
+    """
+    Opens `path` for writing, or returns stdout for '-'. The output is
+    gzip-compressed if `compress` is True, or by default if the path ends
+    in '.gz'.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    if path == '-':
+        fp = sys.stdout
+        if compress:
+            return gzip.GzipFile(fileobj=fp, mode='wb')
+        return fp
+    if compress:
+        return gzip.open(path, 'wb')
+    return open(path, 'wb')
+
+
+def write_records(records, fp, format='ndjson', fields=None):
+    """Writes records (dicts) to a file in the given format, returning the count."""
+    if format == 'csv':
+        writer = CSVWriter(fp, fields)
+    elif format == 'ndjson':
+        writer = NDJSONWriter(fp)
+    else:
+        raise ValueError("Unknown export format %r" % format)
+    count = 0
+    for record in records:
+        writer.write(record)
+        count += 1
+    return count
+
+
+def iter_pages(fetch, page_size):
+    """
+    Yields the records of `fetch(filters)` for successive pages of
+    `page_size`, until a page comes back short. `fetch` should stream the
+    page rather than build it, as the client's stream_* methods do.
+    """
+    offset = 0
+    while True:
+        count = 0
+        for record in fetch(dict(limit=str(page_size), offset=str(offset))):
+            count += 1
+            yield record
+        if count < page_size:
+            return
+        offset += count
+
+
+def in_background(records, maxsize=1000):
+    """
+    Produces the records of an iterable on another thread, at most
+    `maxsize` ahead of the caller, so that fetching from the network
+    overlaps with whatever the caller does with them (writing to disk).
+    """
+    queue = Queue.Queue(maxsize)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        # Give up if the caller stops iterating while the queue is full.
+        while not stopped.isSet():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for record in records:
+                if not put((record, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    thread = threading.Thread(target=produce)
+    thread.setDaemon(True)
+    thread.start()
+    try:
+        while True:
+            record, error = queue.get()
+            if record is done:
+                if error is not None:
+                    raise error
+                return
+            yield record
+    finally:
+        stopped.set()
+
+
+def contact_records(client, params=None, page_size=1000):
+    """Yields every contact matching the search params, as a dict."""
+    params = dict(params or {})
+    return iter_pages(lambda page: client.stream_contacts(dict(params, **page), raw=True),
+                      page_size)
+
+
+def subscription_records(client, filters=None, page_size=1000):
+    """Yields every subscription matching the filters, as a dict."""
+    filters = dict(filters or {})
+    return iter_pages(lambda page: client.stream_subscriptions(filters=dict(filters, **page),
+                                                               raw=True), page_size)
+
+
+def history_records(client, contact_ids=None, page_size=1000):
+    """
+    Yields the history actions of the given contacts, or of every
+    contact, each with the contactId it belongs to added.
+    """
+    if contact_ids is None:
+        contact_ids = (c['contactId'] for c in contact_records(client, page_size=page_size))
+    for contact_id in contact_ids:
+        fetch = lambda page: client.stream_contact_history(contact_id, filters=page, raw=True)
+        for action in iter_pages(fetch, page_size):
+            action['contactId'] = contact_id
+            yield action
+
+
+RESOURCES = dict(contacts=contact_records, subscriptions=subscription_records,
+                 history=history_records)
+
+
+def export(client, resource, path, format='ndjson', fields=None, compress=None,
+           page_size=1000, background=True, **options):
+    """
+    Exports 'contacts', 'subscriptions' or 'history' to `path` ('-' for
+    stdout) as NDJSON or CSV, returning the number of records written.
+    CSV columns default to the resource's standard fields. With
+    `background`, the next records are fetched while earlier ones are
+    being written. Other keyword arguments (params for contacts, filters
+    for subscriptions, contact_ids for history) select the records.
+    """
+    if format not in FORMATS:
+        raise ValueError("Unknown export format %r" % format)
+    records = RESOURCES[resource](client, page_size=page_size, **options)
+    if background:
+        records = in_background(records, page_size)
+    fp = open_output(path, compress)
+    try:
+        return write_records(records, fp, format, fields or FIELDS[resource])
+    finally:
+        if fp is not sys.stdout:
+            fp.close()
+
+
+def main(argv=None):
+    from icontact.client import IContactClient
+
+    parser = optparse.OptionParser(
+        usage='%prog [options] contacts|subscriptions|history OUTPUT')
+    parser.add_option('--format', choices=FORMATS,
+                      help='ndjson (the default) or csv')
+    parser.add_option('--fields', help='comma-separated CSV columns')
+    parser.add_option('--gzip', action='store_true', default=None,
+                      help='compress the output (the default for .gz files)')
+    parser.add_option('--page-size', type='int', default=1000)
+    parser.add_option('--api-key', default=os.environ.get('ICONTACT_API_KEY'))
+    parser.add_option('--username', default=os.environ.get('ICONTACT_USERNAME'))
+    parser.add_option('--password', default=os.environ.get('ICONTACT_PASSWORD'))
+    parser.add_option('--url', default=IContactClient.ICONTACT_API_URL)
+    parser.add_option('--account-id')
+    parser.add_option('--client-folder-id')
+    options, args = parser.parse_args(argv)
+    if len(args) != 2 or args[0] not in RESOURCES:
+        parser.error('expected a resource (contacts, subscriptions or history) and an output')
+    if not (options.api_key and options.username and options.password):
+        parser.error('API credentials are required')
+    resource, path = args
+    format = options.format
+    if format is None:
+        format = ('.csv' in path) and 'csv' or 'ndjson'
+    fields = options.fields and options.fields.split(',') or None
+
+    client = IContactClient(options.api_key, options.username, options.password,
+                            url=options.url, account_id=options.account_id,
+                            client_folder_id=options.client_folder_id)
+    count = export(client, resource, path, format, fields, options.gzip, options.page_size)
+    client.transport.clear()
+    sys.stderr.write('Exported %d %s\n' % (count, resource))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
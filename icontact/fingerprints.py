@@ -0,0 +1,205 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Change detection for contact updates.
+
+A sync that pushes every contact from another system each night mostly
+rewrites contacts that have not changed. Given ContactFingerprints, an
+IContactClient remembers a short hash of each field value it has written
+for each contact, and update_contact() and update_contacts() only send
+the fields whose values differ, skipping contacts with no changes at all:
+
+  >>> fingerprints = ContactFingerprints('/var/lib/myapp/fingerprints.pickle')
+  >>> client = IContactClient(api_key, username, password, fingerprints=fingerprints)
+  >>> client.update_contacts(rows)
+  >>> fingerprints.save()
+  >>> fingerprints.stats()['unchanged']
+  118243
+"""
+import hashlib
+import os
+import cPickle as pickle
+import tempfile
+import threading
+
+
+def _hash(value):
+    if value is None:
+        value = u''
+    elif not isinstance(value, basestring):
+        value = unicode(value)
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return hashlib.md5(value).digest()[:8]
+
+
+_UNKNOWN = '\0' * 8
+
+
+class ContactFingerprints(object):
+    """
+    The field values last written for each contact, kept as 8-byte
+    hashes, and saved to and loaded from a pickle file at `path` (if
+    given; it need not exist yet).
+
+    Field names are numbered in the order they are first seen, in one
+    tuple shared by every contact, and each contact's hashes are packed
+    into a single string with the hash of field n at offset 8 * n (zero
+    bytes for a field not remembered). A contact with 20 fields costs
+    about 200 bytes rather than a dictionary of its own.
+
+    Values are compared as text, as iContact stores them, so 5 and '5'
+    are the same value. Fingerprints record what this client has sent,
+    not what iContact holds: a change made elsewhere (in the iContact
+    web interface, or by a bounce changing a contact's status) is not
+    seen, and writing the old value back again would be skipped. Call
+    forget() for contacts known to have changed elsewhere, or clear() to
+    write everything again.
+
+    A ContactFingerprints may be shared between threads and clients.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._names = ()
+        self._slots = {}
+        self._contacts = {}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.unchanged = 0
+        self.fields_sent = 0
+        self.fields_skipped = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._contacts)
+
+    def _slot(self, name):
+        name = intern(str(name))
+        index = self._slots.get(name)
+        if index is None:
+            index = self._slots[name] = len(self._names)
+            self._names += (name,)
+        return index
+
+    def changes(self, contact_id, fields):
+        """
+        Returns the items of `fields` whose values differ from those last
+        remembered for the contact (all of them for a contact not seen
+        before), or an empty dictionary if there are none.
+        """
+        self._lock.acquire()
+        try:
+            known = self._contacts.get(str(contact_id), '')
+            changed = {}
+            for name, value in fields.items():
+                index = self._slots.get(name)
+                if index is None or known[8 * index:8 * index + 8] != _hash(value):
+                    changed[name] = value
+            self.checked += 1
+            if not changed:
+                self.unchanged += 1
+            self.fields_skipped += len(fields) - len(changed)
+            return changed
+        finally:
+            self._lock.release()
+
+    def remember(self, contact_id, fields):
+        """
+        Records the values of `fields` as written for the contact. Call
+        this once the update has succeeded; the fields are counted as
+        sent.
+        """
+        self._lock.acquire()
+        try:
+            contact_id = str(contact_id)
+            known = self._contacts.get(contact_id, '')
+            hashes = [known[offset:offset + 8] for offset in range(0, len(known), 8)]
+            for name, value in fields.items():
+                index = self._slot(name)
+                if index >= len(hashes):
+                    hashes.extend([_UNKNOWN] * (index + 1 - len(hashes)))
+                hashes[index] = _hash(value)
+            self._contacts[contact_id] = ''.join(hashes)
+            self.fields_sent += len(fields)
+        finally:
+            self._lock.release()
+
+    def forget(self, contact_id):
+        """Discards the fingerprints of one contact."""
+        self._lock.acquire()
+        try:
+            self._contacts.pop(str(contact_id), None)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._contacts.clear()
+        finally:
+            self._lock.release()
+
+    def load(self, path=None):
+        """Replaces the fingerprints with those saved at `path`."""
+        f = open(path or self.path, 'rb')
+        try:
+            names, contacts = pickle.load(f)
+        finally:
+            f.close()
+        names = tuple([intern(name) for name in names])
+        self._lock.acquire()
+        try:
+            self._names = names
+            self._slots = dict([(name, index) for index, name in enumerate(names)])
+            self._contacts = contacts
+        finally:
+            self._lock.release()
+
+    def save(self, path=None):
+        """
+        Saves the fingerprints to `path`, or the path they were created
+        with. The file is written to a temporary name and renamed into
+        place, so an interrupted save leaves the previous file intact.
+        """
+        path = path or self.path
+        self._lock.acquire()
+        try:
+            data = pickle.dumps((self._names, self._contacts), 2)
+        finally:
+            self._lock.release()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                   suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def stats(self):
+        """
+        Returns the number of contacts fingerprinted; of updates checked
+        and of those skipped as unchanged (writes avoided); and of fields
+        written (counted by remember()) and left out as unchanged.
+        """
+        return dict(contacts=len(self._contacts), checked=self.checked,
+                    unchanged=self.unchanged, fields_sent=self.fields_sent,
+                    fields_skipped=self.fields_skipped)
@@ -0,0 +1,144 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Per-request measurements reported to IContactClient observers.
+"""
+import re
+import threading
+
+_ID_SEGMENT = re.compile(r'^[0-9]+(_[0-9]+)?$')
+
+# Names for the id that follows each collection in an API path.
+_ID_NAMES = {
+    'a': '{accountId}',
+    'c': '{clientFolderId}',
+    'contacts': '{contactId}',
+    'lists': '{listId}',
+    'segments': '{segmentId}',
+    'subscriptions': '{subscriptionId}',
+    'messages': '{messageId}',
+    'sends': '{sendId}',
+    'campaigns': '{campaignId}',
+}
+
+
+def endpoint_template(call_path):
+    """
+    Returns the API path with its ids replaced by placeholders, e.g.
+    'a/{accountId}/c/{clientFolderId}/contacts/{contactId}', so that
+    measurements for the same endpoint can be grouped together.
+    """
+    path = call_path.split('?', 1)[0]
+    segments = path.split('/')
+    for i in range(len(segments)):
+        if _ID_SEGMENT.match(segments[i]):
+            previous = i and segments[i - 1] or ''
+            segments[i] = _ID_NAMES.get(previous, '{id}')
+    return '/'.join(segments)
+
+
+class RequestEvent(object):
+    """
+    A description of one API call, passed to each observer registered
+    with `IContactClient.add_observer` once the call has finished.
+
+    - endpoint: the call path with ids replaced (see endpoint_template)
+    - method: the HTTP method, in upper case
+    - url: the full request URL
+    - status: the HTTP status of the final response, or None
+    - bytes_out, bytes_in: request and response body sizes, summed over
+      every attempt
+    - wire_bytes_out, wire_bytes_in: the same after compression, i.e. as
+      sent and received on the network
+    - connect_time, tls_time: seconds spent opening connections and in
+      TLS handshakes (0 when a pooled connection was reused)
+    - server_time: seconds from sending each request to receiving the
+      response headers
+    - decode_time: seconds spent parsing the response body
+    - total_time: seconds for the whole call, including retry backoff
+    - retries: the number of retries the call needed
+    - error: the exception the call raised, or None
+    """
+
+    def __init__(self, call_path, method):
+        self.endpoint = endpoint_template(call_path)
+        self.method = method.upper()
+        self.url = None
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.wire_bytes_out = 0
+        self.wire_bytes_in = 0
+        self.connect_time = 0.0
+        self.tls_time = 0.0
+        self.server_time = 0.0
+        self.decode_time = 0.0
+        self.total_time = 0.0
+        self.retries = 0
+        self.error = None
+
+    def record_attempt(self, response, data, body, wire_data=None):
+        """
+        Adds the measurements of one attempt at the request. `wire_data`
+        is the request body as sent, if it was compressed.
+        """
+        self.status = response.status
+        self.connect_time += response.connect_time
+        self.tls_time += response.tls_time
+        self.server_time += response.wait_time
+        if data is not None:
+            self.bytes_out += len(data)
+            self.wire_bytes_out += len(wire_data or data)
+        if body is not None:
+            self.bytes_in += len(body)
+            self.wire_bytes_in += response.bytes_read
+
+    def __repr__(self):
+        return ('icontact.instrumentation.RequestEvent(%s %s status=%s retries=%d '
+                'total=%.3fs)' % (self.method, self.endpoint, self.status,
+                                  self.retries, self.total_time))
+
+
+class TrafficStats(object):
+    """
+    Running totals of the request and response body bytes sent and
+    received by a client, before and after compression.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_out = 0
+        self.wire_bytes_out = 0
+        self.bytes_in = 0
+        self.wire_bytes_in = 0
+
+    def add(self, bytes_out=0, wire_bytes_out=0, bytes_in=0, wire_bytes_in=0):
+        self._lock.acquire()
+        try:
+            self.bytes_out += bytes_out
+            self.wire_bytes_out += wire_bytes_out
+            self.bytes_in += bytes_in
+            self.wire_bytes_in += wire_bytes_in
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """
+        Returns the totals, with `saved` the number of bytes compression
+        kept off the network.
+        """
+        return dict(bytes_out=self.bytes_out, wire_bytes_out=self.wire_bytes_out,
+                    bytes_in=self.bytes_in, wire_bytes_in=self.wire_bytes_in,
+                    saved=(self.bytes_out - self.wire_bytes_out) +
+                          (self.bytes_in - self.wire_bytes_in))
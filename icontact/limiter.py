@@ -0,0 +1,265 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Client-side overload protection: an adaptive limit on the number of
+requests in flight, a circuit breaker that stops sending requests while
+iContact is down, and request-rate budgets.
+"""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class ConcurrencyLimiter(object):
+    """
+    Limits how many requests a client has in flight at once, adjusting
+    the limit to what the server is handling well (additive increase,
+    multiplicative decrease, as TCP does with its congestion window).
+
+    Each healthy response raises the limit by 1/limit, so by about one
+    request per round of requests. A rate-limited or failed response, or
+    one that took more than `latency_tolerance` times the usual latency,
+    multiplies the limit by `backoff`, at most once per round trip so that
+    a burst of errors from one overloaded moment counts once.
+
+    - initial, min_limit, max_limit: the starting limit and its bounds.
+    - latency_tolerance: how many times slower than the smoothed latency
+      of healthy responses a response must be to count as overload.
+      Responses faster than `latency_floor` seconds never do.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, backoff=0.5,
+                 latency_tolerance=2.0, latency_floor=0.05, smoothing=0.1):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.smoothing = smoothing
+        self.clock = time.time
+
+        self.in_flight = 0
+        self.latency = None
+        self._hold_until = 0.0
+        self._condition = threading.Condition(threading.Lock())
+        self.increases = 0
+        self.decreases = 0
+        self.latency_spikes = 0
+        self.waits = 0
+
+    def acquire(self):
+        """Waits until a request may be sent, and counts it as in flight."""
+        self._condition.acquire()
+        try:
+            if self.in_flight >= int(self.limit):
+                self.waits += 1
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait()
+            self.in_flight += 1
+        finally:
+            self._condition.release()
+
+    def release(self, latency, overloaded=False):
+        """
+        Records the outcome of a request that acquire() let through:
+        its latency in seconds, and whether the server showed signs of
+        overload (a 503 or 429, a 5xx or a failed connection).
+        """
+        self._condition.acquire()
+        try:
+            saturated = self.in_flight >= int(self.limit) // 2
+            self.in_flight -= 1
+            if not overloaded and self.latency is not None and \
+                   latency > self.latency_floor and \
+                   latency > self.latency_tolerance * self.latency:
+                overloaded = True
+                self.latency_spikes += 1
+            now = self.clock()
+            if overloaded:
+                if now >= self._hold_until:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.decreases += 1
+                    self._hold_until = now + max(latency, self.latency or 0.0)
+            else:
+                if self.latency is None:
+                    self.latency = latency
+                else:
+                    self.latency += self.smoothing * (latency - self.latency)
+                # Only grow while the limit is actually being used.
+                if saturated and self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                    self.increases += 1
+            self._condition.notifyAll()
+        finally:
+            self._condition.release()
+
+    def stats(self):
+        return dict(limit=self.limit, in_flight=self.in_flight, latency=self.latency,
+                    increases=self.increases, decreases=self.decreases,
+                    latency_spikes=self.latency_spikes, waits=self.waits)
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests fast while the server appears to be down.
+
+    After `failure_threshold` consecutive failures (connection errors, or
+    5xx responses other than 503 rate limiting) the circuit opens, and
+    requests raise CircuitOpenError without being sent. After
+    `reset_timeout` seconds it is half-open: up to `half_open_probes`
+    requests are let through, and the circuit closes again if they
+    succeed or reopens if one fails.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.clock = time.time
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def before(self):
+        """
+        Called before each request is sent. Raises CircuitOpenError if
+        the request must not be sent.
+        """
+        self._lock.acquire()
+        try:
+            if self.state == OPEN:
+                retry_in = self.opened_at + self.reset_timeout - self.clock()
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(retry_in)
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(0.0)
+                self._probes += 1
+        finally:
+            self._lock.release()
+
+    def record(self, success):
+        """Records whether a request let through by before() succeeded."""
+        self._lock.acquire()
+        try:
+            if success:
+                self.failures = 0
+                if self.state == HALF_OPEN:
+                    self.state = CLOSED
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or \
+                   (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self.opened += 1
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return dict(state=self.state, failures=self.failures, opened=self.opened,
+                    rejected=self.rejected)
+
+
+class RateBudget(object):
+    """
+    A token bucket allowing `rate` requests per second on average, and
+    bursts of up to `burst` requests (by default, one second's worth).
+
+    Each request takes a token with acquire(), which waits for one if the
+    bucket is empty. charge() adjusts the bucket directly, and may take
+    it below zero; it must then refill before a request may be sent.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        if burst is None:
+            burst = max(1.0, self.rate)
+        self.burst = float(burst)
+        self.clock = time.time
+        self.sleep = time.sleep
+        self.tokens = self.burst
+        self._updated = self.clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self):
+        """Returns True if a request may be sent now."""
+        return self.wait_time() == 0
+
+    def wait_time(self):
+        """Returns the seconds until a request may be sent."""
+        self._lock.acquire()
+        try:
+            self._refill()
+            if self.tokens >= 1:
+                return 0
+            return (1 - self.tokens) / self.rate
+        finally:
+            self._lock.release()
+
+    def acquire(self):
+        """
+        Takes a token for a request, waiting until it has refilled if the
+        bucket is empty. Tokens are handed out in the order they are
+        asked for, so a caller sending requests back to back cannot
+        starve another one waiting on the same budget.
+        """
+        self._lock.acquire()
+        try:
+            self._refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        finally:
+            self._lock.release()
+        if wait > 0:
+            self.sleep(wait)
+
+    def charge(self, count=1):
+        """Takes `count` tokens (or gives them back, if negative)."""
+        self._lock.acquire()
+        try:
+            self._refill()
+            self.tokens = min(self.burst, self.tokens - count)
+        finally:
+            self._lock.release()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    `retry_in` is the number of seconds until requests are tried again.
+    """
+
+    def __init__(self, retry_in):
+        Exception.__init__(self, "iContact is unavailable; circuit open for another "
+                                 "%.1fs" % retry_in)
+        self.retry_in = retry_in
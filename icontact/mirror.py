@@ -0,0 +1,334 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+A local SQLite mirror of the contacts, lists and subscriptions in one
+iContact client folder.
+
+Looking a contact up by email in the mirror takes microseconds, where
+search_contacts() needs an HTTP round trip:
+
+  >>> mirror = Mirror(client, '/var/lib/myapp/icontact.db')
+  >>> mirror.sync()
+  {'lists': 4, 'contacts': 120000, 'subscriptions': 180000}
+  >>> mirror.contact_id('someone@example.com')
+  u'1234567'
+
+The first sync copies everything. Later syncs only fetch contacts and
+subscriptions created since the newest one already mirrored, using
+iContact's createDate/addDate search filters; `sync(full=True)` copies
+everything again, picking up changes to existing records and removing
+records that were deleted. Progress is checkpointed after every page, so
+an interrupted sync resumes where it stopped the next time it is run.
+"""
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from icontact.client import parse_datetime
+from icontact.codec import get_codec
+from icontact.records import wrap
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    contact_id TEXT PRIMARY KEY,
+    email TEXT,
+    generation INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email);
+CREATE TABLE IF NOT EXISTS lists (
+    list_id TEXT PRIMARY KEY,
+    generation INTEGER,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    subscription_id TEXT PRIMARY KEY,
+    list_id TEXT,
+    contact_id TEXT,
+    status TEXT,
+    generation INTEGER,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS subscriptions_list ON subscriptions (list_id, status);
+CREATE INDEX IF NOT EXISTS subscriptions_contact ON subscriptions (contact_id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    resource TEXT PRIMARY KEY,
+    generation INTEGER,
+    full INTEGER,
+    since TEXT,
+    offset INTEGER,
+    high_water TEXT,
+    synced_at REAL
+);
+"""
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class Mirror(object):
+    """
+    Mirrors one account and client folder into the SQLite database at
+    `path`, which is created if need be.
+
+    - client: the IContactClient used to sync.
+    - account_id, client_folder_id: (Optional) the folder to mirror; by
+      default the client's own.
+    - page_size: records fetched per request, and per checkpoint.
+    - overlap: how far before the newest mirrored record an incremental
+      sync starts, to allow for records created within the same second
+      as the last sync or reported late by the server.
+
+    Read methods return records wrapped like client responses, e.g.
+    `mirror.contact(id).email`. A mirror may be shared between threads.
+    """
+
+    # The creation date fields searched by incremental syncs.
+    INCREMENTAL_FIELDS = dict(contacts='createDate', subscriptions='addDate')
+
+    def __init__(self, client, path, account_id=None, client_folder_id=None,
+                 page_size=1000, overlap=timedelta(days=1)):
+        self.client = client
+        self._codec = get_codec()
+        self.path = path
+        self.account_id = account_id
+        self.client_folder_id = client_folder_id
+        self.page_size = page_size
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _query(self, sql, args=()):
+        self._lock.acquire()
+        try:
+            return self._db.execute(sql, args).fetchall()
+        finally:
+            self._lock.release()
+
+    def _records(self, sql, args=()):
+        return [wrap(self._codec.loads(row[0])) for row in self._query(sql, args)]
+
+    # Reads
+
+    def contact_id(self, email):
+        """Returns the contactId for an email address, or None."""
+        rows = self._query('SELECT contact_id FROM contacts WHERE email = ?',
+                           (email.lower(),))
+        return rows and rows[0][0] or None
+
+    def find_contact(self, email):
+        """Returns the contact with an email address, or None."""
+        records = self._records('SELECT data FROM contacts WHERE email = ?', (email.lower(),))
+        return records and records[0] or None
+
+    def contact(self, contact_id):
+        records = self._records('SELECT data FROM contacts WHERE contact_id = ?',
+                                (str(contact_id),))
+        return records and records[0] or None
+
+    def lists(self):
+        return self._records('SELECT data FROM lists ORDER BY list_id')
+
+    def list_members(self, list_id, status='normal'):
+        """
+        Returns the contacts subscribed to a list with the given
+        subscription status, or with any status if `status` is None.
+        """
+        sql = ('SELECT contacts.data FROM subscriptions JOIN contacts '
+               'ON contacts.contact_id = subscriptions.contact_id '
+               'WHERE subscriptions.list_id = ?')
+        args = [str(list_id)]
+        if status is not None:
+            sql += ' AND subscriptions.status = ?'
+            args.append(status)
+        return self._records(sql + ' ORDER BY contacts.contact_id', args)
+
+    def subscriptions(self, contact_id):
+        """Returns a contact's subscriptions."""
+        return self._records('SELECT data FROM subscriptions WHERE contact_id = ? '
+                             'ORDER BY list_id', (str(contact_id),))
+
+    # Writes
+
+    def _store(self, resource, records, generation):
+        if resource == 'contacts':
+            self._db.executemany(
+                'INSERT OR REPLACE INTO contacts VALUES (?, ?, ?, ?)',
+                [(str(r['contactId']), r.get('email', '').lower(), generation,
+                  self._codec.dumps(r)) for r in records])
+        elif resource == 'subscriptions':
+            self._db.executemany(
+                'INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, ?, ?)',
+                [(str(r['subscriptionId']), str(r['listId']), str(r['contactId']),
+                  r.get('status'), generation, self._codec.dumps(r)) for r in records])
+        else:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO lists VALUES (?, ?, ?)',
+                [(str(r['listId']), generation, self._codec.dumps(r)) for r in records])
+
+    def _write(self, resource, records):
+        records = [_as_dict(r) for r in records]
+        self._lock.acquire()
+        try:
+            generation = self._checkpoint(resource)
+            generation = generation and generation['generation'] or 0
+            self._store(resource, records, generation)
+            self._db.commit()
+        finally:
+            self._lock.release()
+
+    def add_contacts(self, contacts):
+        """
+        Stores contacts returned by the client, e.g. the results of
+        create_contacts(), so the mirror reflects writes made since the
+        last sync.
+        """
+        self._write('contacts', contacts)
+
+    def add_subscriptions(self, subscriptions):
+        self._write('subscriptions', subscriptions)
+
+    def remove_contact(self, contact_id):
+        self._lock.acquire()
+        try:
+            self._db.execute('DELETE FROM contacts WHERE contact_id = ?', (str(contact_id),))
+            self._db.execute('DELETE FROM subscriptions WHERE contact_id = ?',
+                             (str(contact_id),))
+            self._db.commit()
+        finally:
+            self._lock.release()
+
+    # Syncing
+
+    def _checkpoint(self, resource):
+        cursor = self._db.execute('SELECT generation, full, since, offset, high_water, '
+                                  'synced_at FROM checkpoints WHERE resource = ?',
+                                  (resource,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(('generation', 'full', 'since', 'offset', 'high_water',
+                         'synced_at'), row))
+
+    def _save_checkpoint(self, resource, checkpoint):
+        self._db.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (resource, checkpoint['generation'], checkpoint['full'],
+                          checkpoint['since'], checkpoint['offset'],
+                          checkpoint['high_water'], checkpoint['synced_at']))
+
+    def checkpoint(self, resource):
+        """
+        Returns the sync state of 'contacts', 'subscriptions' or 'lists'
+        as a dict, or None if it has never been synced. `offset` is not
+        None while a sync is in progress (or was interrupted).
+        """
+        self._lock.acquire()
+        try:
+            return self._checkpoint(resource)
+        finally:
+            self._lock.release()
+
+    def sync(self, full=False):
+        """
+        Brings the mirror up to date, returning the number of lists,
+        contacts and subscriptions fetched. An interrupted sync is
+        resumed rather than started over.
+        """
+        account_id, client_folder_id = self.client._required_values(
+            self.account_id, self.client_folder_id)
+        self.account_id, self.client_folder_id = account_id, client_folder_id
+
+        def fetch_contacts(filters):
+            return self.client.stream_contacts(filters, account_id, client_folder_id,
+                                               raw=True)
+
+        def fetch_subscriptions(filters):
+            return self.client.stream_subscriptions(account_id, client_folder_id,
+                                                    filters=filters, raw=True)
+
+        def fetch_lists(filters):
+            return [_as_dict(l) for l in self.client.lists(
+                account_id=account_id, client_folder_id=client_folder_id,
+                filters=filters).lists]
+
+        # Lists are few, so they are always copied in full.
+        return dict(lists=self._sync('lists', fetch_lists, True),
+                    contacts=self._sync('contacts', fetch_contacts, full),
+                    subscriptions=self._sync('subscriptions', fetch_subscriptions, full))
+
+    def _since(self, high_water):
+        if not high_water:
+            return None
+        since = parse_datetime(high_water) - self.overlap
+        return since.strftime(DATE_FORMAT)
+
+    def _sync(self, resource, fetch, full):
+        field = self.INCREMENTAL_FIELDS.get(resource)
+        self._lock.acquire()
+        try:
+            checkpoint = self._checkpoint(resource)
+            if checkpoint is None or checkpoint['offset'] is None:
+                previous = checkpoint or dict(generation=0, high_water=None, synced_at=None)
+                full = full or field is None or previous['high_water'] is None
+                since = None
+                if not full:
+                    since = self._since(previous['high_water'])
+                checkpoint = dict(generation=previous['generation'] + 1, full=int(full),
+                                  since=since, offset=0, high_water=previous['high_water'],
+                                  synced_at=previous['synced_at'])
+                self._save_checkpoint(resource, checkpoint)
+                self._db.commit()
+        finally:
+            self._lock.release()
+
+        count = 0
+        while True:
+            filters = dict(limit=str(self.page_size), offset=str(checkpoint['offset']))
+            if checkpoint['since']:
+                filters[field] = checkpoint['since']
+                filters[field + 'SearchType'] = 'gt'
+            records = list(fetch(filters))
+            dates = [r.get(field) for r in records if r.get(field)]
+            if dates:
+                checkpoint['high_water'] = max([checkpoint['high_water'] or ''] + dates)
+            checkpoint['offset'] += len(records)
+            if len(records) < self.page_size:
+                checkpoint['offset'] = None
+                checkpoint['synced_at'] = time.time()
+            self._lock.acquire()
+            try:
+                self._store(resource, records, checkpoint['generation'])
+                if checkpoint['offset'] is None and checkpoint['full']:
+                    self._db.execute('DELETE FROM %s WHERE generation != ?' % resource,
+                                     (checkpoint['generation'],))
+                self._save_checkpoint(resource, checkpoint)
+                self._db.commit()
+            finally:
+                self._lock.release()
+            count += len(records)
+            if checkpoint['offset'] is None:
+                return count
+
+
+def _as_dict(value):
+    """Returns the plain data behind a wrapped response record."""
+    if isinstance(value, list):
+        return [_as_dict(v) for v in value]
+    if hasattr(value, '__dict__') and not isinstance(value, dict):
+        return dict([(k, _as_dict(v)) for k, v in value.__dict__.items()])
+    return value
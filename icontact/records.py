@@ -0,0 +1,241 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Record types that give attribute access to decoded iContact responses.
+
+`Object` and `ObjectList` wrap the decoded JSON without copying it, and
+only wrap a nested dict or list when it is first accessed. For large
+homogeneous lists, such as a page of contacts, `compact_list` instead
+stores each row in a `__slots__` class generated once per set of keys,
+so the decoded dicts can be freed.
+"""
+import keyword
+import re
+import threading
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def wrap(value, compact=False):
+    """
+    Wraps a decoded JSON value for attribute access: dicts become Objects,
+    lists become ObjectLists (or compact lists, if `compact` is True and
+    the list is homogeneous) and anything else is returned unchanged.
+    """
+    if isinstance(value, dict):
+        if compact:
+            value = compact_dict(value)
+        return Object(value, compact)
+    if isinstance(value, ObjectList):
+        return value
+    if isinstance(value, list):
+        if compact:
+            rows = compact_list(value)
+            if rows is not None:
+                return rows
+        return ObjectList(value, compact)
+    return value
+
+
+class Object(object):
+    """
+    A read-through view of a decoded JSON object: `obj.key` returns
+    `data['key']`, wrapping nested values the first time they are read.
+    Attributes may also be set, which shadows the underlying data.
+    """
+    __slots__ = ('_data', '_attrs', '_compact')
+
+    def __init__(self, data, compact=False):
+        object.__setattr__(self, '_data', data)
+        object.__setattr__(self, '_attrs', None)
+        object.__setattr__(self, '_compact', compact)
+
+    def __getattr__(self, name):
+        if name in Object.__slots__:
+            # Not yet initialised, e.g. while being unpickled.
+            raise AttributeError(name)
+        attrs = self._attrs
+        if attrs is not None and name in attrs:
+            return attrs[name]
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name)
+        if isinstance(value, (dict, list)) and not isinstance(value, ObjectList):
+            value = wrap(value, self._compact)
+            self._set(name, value)
+        return value
+
+    def _set(self, name, value):
+        attrs = self._attrs
+        if attrs is None:
+            attrs = {}
+            object.__setattr__(self, '_attrs', attrs)
+        attrs[name] = value
+
+    def __setattr__(self, name, value):
+        self._set(name, value)
+
+    def __contains__(self, name):
+        return name in self._data or (self._attrs is not None and name in self._attrs)
+
+    @property
+    def __dict__(self):
+        d = dict([(k, getattr(self, k)) for k in self._data])
+        if self._attrs:
+            d.update(self._attrs)
+        return d
+
+    def __getstate__(self):
+        return (self._data, self._attrs, self._compact)
+
+    def __setstate__(self, state):
+        for name, value in zip(Object.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return 'icontact.client.Object(%s)' % repr(self.__dict__)
+
+
+class ObjectList(list):
+    """
+    A list of decoded JSON values that wraps each dict or list element the
+    first time it is read, replacing the raw value in place.
+    """
+
+    def __init__(self, data=(), compact=False):
+        list.__init__(self, data)
+        self._compact = compact
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ObjectList(list.__getitem__(self, index), self._compact)
+        value = list.__getitem__(self, index)
+        if isinstance(value, (dict, list)) and not isinstance(value, ObjectList):
+            value = wrap(value, self._compact)
+            list.__setitem__(self, index, value)
+        return value
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(max(0, i), max(0, j)))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CompactRecord(object):
+    """
+    Base class of the `__slots__` record types built by `compact_list`.
+    Each subclass holds the fields of one set of JSON keys; rows with
+    nested values hold them already wrapped.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    @property
+    def __dict__(self):
+        return dict([(k, getattr(self, k)) for k in self.__slots__])
+
+    def __reduce__(self):
+        # The generated classes cannot be found by name, so pickle the
+        # field names and rebuild the class when unpickling.
+        return (_make_record, (self.__slots__,
+                               tuple([getattr(self, k) for k in self.__slots__])))
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def __repr__(self):
+        return 'icontact.client.Object(%s)' % repr(self.__dict__)
+
+
+_record_classes = {}
+_record_classes_lock = threading.Lock()
+
+
+def record_class(fields):
+    """
+    Returns the CompactRecord subclass for a tuple of field names,
+    creating it the first time those fields are seen.
+    """
+    cls = _record_classes.get(fields)
+    if cls is None:
+        _record_classes_lock.acquire()
+        try:
+            cls = _record_classes.get(fields)
+            if cls is None:
+                cls = type('Record', (CompactRecord,), {'__slots__': fields})
+                _record_classes[fields] = cls
+        finally:
+            _record_classes_lock.release()
+    return cls
+
+
+def _make_record(fields, values):
+    return record_class(fields)(*values)
+
+
+def compact_dict(data):
+    """
+    Returns a shallow copy of a decoded JSON object in which every
+    homogeneous list of dicts has been converted by `compact_list`, so
+    that the original rows can be freed once the caller drops `data`.
+    """
+    result = {}
+    for name, value in data.iteritems():
+        if isinstance(value, list) and not isinstance(value, ObjectList):
+            rows = compact_list(value)
+            if rows is not None:
+                value = rows
+        result[name] = value
+    return result
+
+
+def compact_list(data):
+    """
+    Converts a list of dicts that all have the same keys into an
+    ObjectList of CompactRecords, or returns None if the list is empty,
+    mixed, or has keys that cannot be used as attribute names.
+    """
+    if not data or not isinstance(data[0], dict):
+        return None
+    fields = tuple(sorted(data[0]))
+    for name in fields:
+        if not _IDENTIFIER.match(name) or keyword.iskeyword(name) or \
+               name.startswith('__'):
+            return None
+    for row in data:
+        if not isinstance(row, dict) or len(row) != len(fields):
+            return None
+    cls = record_class(fields)
+    rows = ObjectList((), True)
+    try:
+        for row in data:
+            values = []
+            for name in fields:
+                value = row[name]
+                if isinstance(value, (dict, list)):
+                    value = wrap(value, True)
+                values.append(value)
+            rows.append(cls(*values))
+    except KeyError:
+        return None
+    return rows
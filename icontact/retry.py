@@ -0,0 +1,204 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Retry policy for rate-limited and transiently failing iContact requests.
+"""
+import httplib
+import random
+import socket
+import threading
+import time
+
+from icontact.transport import IDEMPOTENT_METHODS, RequestNotSentError
+
+
+class RetryBudget(object):
+    """
+    A token bucket shared by every request made through one client.
+
+    Each original request deposits `ratio` tokens and each retry of a
+    failed request withdraws one, so that over time at most `ratio` such
+    retries are sent per original request (plus the `initial` allowance).
+    This keeps a client from multiplying its own load on a struggling
+    server: once the bucket is empty further failures are raised instead
+    of retried, and the budget recovers as new requests are made.
+
+    Retries of rate-limited responses are not charged: those are already
+    paced by RetryPolicy.throttle(), and under sustained rate limiting
+    calls should slow down rather than fail.
+    """
+
+    def __init__(self, ratio=0.2, initial=10, capacity=100):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = float(initial)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        self._lock.acquire()
+        try:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+        finally:
+            self._lock.release()
+
+    def withdraw(self):
+        """Takes one token, returning False if the budget is spent."""
+        self._lock.acquire()
+        try:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+        finally:
+            self._lock.release()
+
+
+class RetryPolicy(object):
+    """
+    Decides whether, and after how long, a failed request is retried.
+
+    - base_delay: the first backoff interval in seconds; it doubles with
+      each further attempt, up to `max_delay`. The actual delay is chosen
+      at random below that ceiling ("full jitter") so that many clients
+      throttled at once do not retry in lockstep.
+    - max_retry_after: the longest `Retry-After` interval the client will
+      wait for. A server asking for a longer pause fails the call.
+    - budget: (Optional) the `RetryBudget` shared across calls.
+
+    Responses with a status in `RETRY_STATUSES`, and connection errors or
+    timeouts listed in `RETRY_ERRORS`, are retried for idempotent
+    requests. A request that is not idempotent, such as creating a send
+    or a message, may already have been acted on when a connection drops
+    or a gateway times out, so it is only retried when the server turned
+    it away (a status in `THROTTLE_STATUSES`) or when it was never sent
+    (`icontact.transport.RequestNotSentError`). Requests use the HTTP
+    method's idempotency unless the call says otherwise; contact and
+    subscription writes, which iContact keys on email, contactId or
+    list and contact, are idempotent.
+
+    A rate-limited response (a status in `THROTTLE_STATUSES`) also pauses
+    every other request sent through the same policy until the backoff
+    has passed, so that concurrent callers do not keep hitting the limit.
+    """
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+    THROTTLE_STATUSES = (429, 503)
+    RETRY_ERRORS = (socket.error, socket.timeout, httplib.HTTPException)
+
+    def __init__(self, base_delay=0.5, max_delay=30.0, max_retry_after=300.0,
+                 budget=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        if budget is None:
+            budget = RetryBudget()
+        self.budget = budget
+        self.sleep = time.sleep
+
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.throttled = 0
+        self.resume_at = 0.0
+
+    def is_idempotent(self, method):
+        return method.upper() in IDEMPOTENT_METHODS
+
+    def is_retryable_status(self, status, idempotent=True):
+        if not idempotent:
+            return status in self.THROTTLE_STATUSES
+        return status in self.RETRY_STATUSES
+
+    def is_retryable_error(self, error, idempotent=True):
+        if not idempotent:
+            return isinstance(error, RequestNotSentError)
+        return isinstance(error, self.RETRY_ERRORS)
+
+    def parse_retry_after(self, value):
+        """
+        Parses a `Retry-After` header, given either as a number of seconds
+        or as an HTTP date, into a delay in seconds. Returns None if the
+        header is missing or unparseable.
+        """
+        if not value:
+            return None
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        from email.utils import parsedate_tz, mktime_tz
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Returns the delay before retry number `attempt` (starting at 0),
+        or None if the server asked us to wait longer than we are
+        prepared to.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+    def start(self):
+        """Called once for every original (non-retry) request."""
+        self.budget.deposit()
+
+    def allow_retry(self, throttled=False):
+        """
+        Withdraws a retry from the shared budget, returning False if the
+        budget is spent. Retries of `throttled` requests are free.
+        """
+        if throttled or self.budget.withdraw():
+            self._lock.acquire()
+            try:
+                self.retries += 1
+            finally:
+                self._lock.release()
+            return True
+        self._lock.acquire()
+        try:
+            self.budget_exhausted += 1
+        finally:
+            self._lock.release()
+        return False
+
+    def throttle(self, delay):
+        """Holds back all requests for the next `delay` seconds."""
+        self._lock.acquire()
+        try:
+            self.resume_at = max(self.resume_at, time.time() + delay)
+            self.throttled += 1
+        finally:
+            self._lock.release()
+
+    def wait(self):
+        """Sleeps until any pause requested by throttle() has passed."""
+        delay = self.resume_at - time.time()
+        while delay > 0:
+            self.sleep(delay)
+            delay = self.resume_at - time.time()
+
+    def stats(self):
+        return dict(retries=self.retries,
+                    budget_exhausted=self.budget_exhausted,
+                    throttled=self.throttled,
+                    budget_tokens=self.budget.tokens)
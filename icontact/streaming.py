@@ -0,0 +1,185 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+Incremental readers for large iContact responses.
+
+`iter_json_items` yields the elements of selected array-valued keys of a
+JSON object as they arrive, and `iter_xml_elements` does the same for
+XML elements, so that only one record at a time has to be held in memory
+rather than the whole response body and everything decoded from it.
+"""
+from icontact.codec import get_codec
+
+WHITESPACE = ' \t\n\r'
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class _Buffer(object):
+    """A read buffer over a file-like object that drops consumed data."""
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.data = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Reads another chunk, returning False at end of input."""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > self.chunk_size:
+            self.data = self.data[self.pos:]
+            self.pos = 0
+        self.data += chunk
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character, or '' at the end."""
+        while True:
+            data = self.data
+            pos = self.pos
+            while pos < len(data) and data[pos] in WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(data):
+                return data[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise JSONStreamError("Expected %r at offset %d" % (char, self.pos))
+        self.pos += 1
+
+    def decode(self, decoder):
+        """
+        Decodes one JSON value at the current position, reading more
+        input until the value is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.data, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            if end >= len(self.data) and not self.eof:
+                # A number at the end of the buffer may continue in the
+                # next chunk; decode it again once more data is present.
+                if self.fill():
+                    continue
+            self.pos = end
+            return value
+
+
+def _json_decoder():
+    # Decoding one value at a time needs raw_decode(), which only
+    # simplejson and the standard library's decoders have, so fall back
+    # to them if the default codec is another library.
+    for name in (None, 'simplejson', 'json'):
+        try:
+            module = getattr(get_codec(name), 'module', None)
+        except ImportError:
+            continue
+        if module is not None:
+            return module.JSONDecoder()
+
+
+def iter_json_items(fp, keys, meta=None, chunk_size=65536, decoder=None):
+    """
+    Reads a JSON object from the file-like `fp` and yields a (key, item)
+    pair for each element of the arrays stored under any of `keys`, e.g.
+    ('contacts', {...}), without decoding the whole document at once.
+    Other top-level values (such as `total` or `warnings`) are stored in
+    the `meta` dict, if one is given.
+    """
+    if decoder is None:
+        decoder = _json_decoder()
+    buf = _Buffer(fp, chunk_size)
+    buf.expect('{')
+    while True:
+        char = buf.peek()
+        if char == '}':
+            return
+        if char == ',':
+            buf.pos += 1
+            continue
+        key = buf.decode(decoder)
+        buf.expect(':')
+        if key in keys and buf.peek() == '[':
+            buf.pos += 1
+            while True:
+                char = buf.peek()
+                if char == ']':
+                    buf.pos += 1
+                    break
+                if char == ',':
+                    buf.pos += 1
+                    continue
+                if char == '':
+                    raise JSONStreamError("Unterminated array for key %r" % key)
+                yield key, buf.decode(decoder)
+        else:
+            value = buf.decode(decoder)
+            if meta is not None:
+                meta[key] = value
+
+
+def _local_name(tag):
+    if tag[:1] == '{':
+        return tag.split('}', 1)[1]
+    return tag
+
+
+def iter_xml_elements(fp, tags):
+    """
+    Parses XML from the file-like `fp` and yields each element whose local
+    name is in `tags` once its end tag has been read. The element is
+    cleared and detached from its parent as soon as the caller asks for
+    the next one, so it must be used (or copied) before then.
+
+    `tags` may instead be a dictionary mapping local names to the local
+    names of the parents they must have; elements of the same name
+    elsewhere in the document are left in place.
+    """
+    try:
+        from xml.etree.ElementTree import iterparse
+    except ImportError:
+        from elementtree.ElementTree import iterparse
+    parents = isinstance(tags, dict) and tags or None
+    stack = []
+    for event, elem in iterparse(fp, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        name = _local_name(elem.tag)
+        if name not in tags:
+            continue
+        if parents is not None and \
+               not (stack and _local_name(stack[-1].tag) in parents[name]):
+            continue
+        yield elem
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
@@ -0,0 +1,653 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+An in-process stand-in for the iContact API, for tests and benchmarks.
+
+`FakeIContactServer` serves the resources IContactClient uses (accounts,
+client folders, contacts, lists, subscriptions, messages and their stats,
+sends and segments) from memory, over HTTP or HTTPS on a local port:
+
+  >>> server = FakeIContactServer(latency=0.05, throttle_rate=0.01).start()
+  >>> server.populate(contacts=10000, lists=5)
+  >>> client = IContactClient('key', 'user', 'password', url=server.url)
+  >>> client.search_contacts(email='user1@example.com').contacts[0].firstName
+  u'First1'
+  >>> server.stop()
+
+It is not a faithful copy of iContact: searches only support equality,
+`*` wildcards and date comparisons, and validation is limited to what the
+client relies on.
+"""
+import BaseHTTPServer
+import SocketServer
+import cgi
+import fnmatch
+import random
+import ssl
+import threading
+import time
+import urlparse
+import zlib
+from xml.sax.saxutils import quoteattr
+
+from icontact.codec import get_codec
+from icontact.compression import decoder_for, gzip_encode
+from icontact.instrumentation import endpoint_template
+
+CONTACT_FIELDS = ('prefix', 'firstName', 'lastName', 'suffix', 'street', 'street2',
+                  'city', 'state', 'postalCode', 'phone', 'fax', 'business')
+
+STATS_ACTIONS = ('released', 'bounces', 'unsubscribes', 'opens', 'clicks',
+                 'forwards', 'comments', 'complaints')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 10000
+
+
+class FakeIContactHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's
+    # algorithm and the client's delayed ACK add ~40ms to each response.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = length and self.rfile.read(length) or ''
+        path, query = urlparse.urlparse(self.path)[2], urlparse.urlparse(self.path)[4]
+        if path.startswith(server.prefix):
+            path = path[len(server.prefix):]
+        server.count(method, path)
+        server.delay()
+
+        injected = server.injected_failure()
+        if injected is not None:
+            status, retry_after = injected
+            headers = {}
+            if retry_after is not None:
+                headers['Retry-After'] = str(retry_after)
+            return self.respond(status, dict(errors=['Injected failure']), headers)
+        if not self.headers.get('Api-AppId') or not self.headers.get('Api-Username'):
+            return self.respond(401, dict(errors=['Authentication failed']))
+        if body and self.headers.get('Content-Encoding'):
+            decoder = decoder_for(self.headers['Content-Encoding'])
+            if decoder is None or not server.compressed_requests:
+                return self.respond(415, dict(errors=['Unsupported Content-Encoding']))
+            try:
+                body = decoder.decompress(body) + decoder.flush()
+            except zlib.error:
+                return self.respond(400, dict(errors=['Corrupt request body']))
+
+        params = dict(cgi.parse_qsl(query))
+        data = None
+        if body:
+            try:
+                data = get_codec().loads(body)
+            except ValueError:
+                return self.respond(400, dict(errors=['Malformed JSON body']))
+        try:
+            result = server.api.handle(method, path.strip('/').split('/'), params, data)
+        except NotFound as e:
+            return self.respond(404, dict(errors=[str(e)]))
+        except BadRequest as e:
+            return self.respond(400, dict(errors=[str(e)]))
+        if isinstance(result, basestring):
+            self.respond(200, result, content_type='text/xml')
+        else:
+            self.respond(200, result)
+
+    def respond(self, status, result, headers={}, content_type='application/json'):
+        if content_type == 'application/json':
+            body = get_codec().dumps(result)
+        else:
+            body = result
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if self.server.compress_responses and \
+               'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip_encode(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _matches(record, params):
+    """
+    Applies search parameters: case-insensitive equality or `*` wildcards,
+    or for a field with a `<field>SearchType` of 'gt' or 'lt' (such as
+    createDate), a comparison.
+    """
+    for key, value in params.items():
+        if key in ('limit', 'offset', 'orderby', 'fields') or key.endswith('SearchType'):
+            continue
+        actual = record.get(key)
+        if actual is None:
+            return False
+        actual, value = unicode(actual).lower(), value.lower()
+        search_type = params.get(key + 'SearchType', 'eq')
+        if search_type == 'gt':
+            if not actual > value:
+                return False
+        elif search_type == 'lt':
+            if not actual < value:
+                return False
+        elif '*' in value:
+            if not fnmatch.fnmatchcase(actual, value):
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+class FakeAPI(object):
+    """
+    The in-memory account behind a FakeIContactServer. Records are kept
+    as plain dicts in insertion order, keyed by their ids as strings.
+    """
+
+    def __init__(self, account_id='1000', client_folder_id='2000', field_size=0,
+                 extra_fields=0, stats_recipients=100, history_actions=5, send_duration=1.0,
+                 seed=0):
+        self.account_id = str(account_id)
+        self.client_folder_id = str(client_folder_id)
+        self.field_size = field_size
+        self.extra_fields = extra_fields
+        self.stats_recipients = stats_recipients
+        self.history_actions = history_actions
+        self.send_duration = send_duration
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.contacts = {}
+        self.contact_order = []
+        self.emails = {}
+        self.lists = {}
+        self.subscriptions = {}
+        self.messages = {}
+        self.sends = {}
+        self.send_starts = {}
+        self.segments = {}
+        self.next_id = 1000001
+
+    def new_id(self):
+        value = str(self.next_id)
+        self.next_id += 1
+        return value
+
+    def now(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Record factories
+
+    def add_contact(self, values):
+        email = values.get('email')
+        if not email or '@' not in email:
+            return None
+        contact = self.contacts.get(self.emails.get(email.lower()))
+        if contact is None:
+            contact_id = self.new_id()
+            contact = dict(contactId=contact_id, email=email, status='normal',
+                           bounceCount='0', createDate=self.now())
+            for field in CONTACT_FIELDS:
+                contact[field] = ''
+            for i in range(self.extra_fields):
+                contact['custom%d' % i] = 'x' * self.field_size
+            self.contacts[contact_id] = contact
+            self.contact_order.append(contact_id)
+            self.emails[email.lower()] = contact_id
+        self.update_record(contact, values, ('contactId', 'createDate'))
+        return contact
+
+    def update_record(self, record, values, readonly):
+        for key, value in values.items():
+            if key not in readonly:
+                record[key] = unicode(value)
+
+    def add_list(self, values):
+        list_id = self.new_id()
+        record = dict(listId=list_id, name='', description='', emailOwnerOnChange='0',
+                      welcomeOnManualAdd='0', welcomeOnSignupAdd='0', welcomeMessageId='')
+        self.update_record(record, values, ('listId',))
+        self.lists[list_id] = record
+        return record
+
+    def add_subscription(self, contact_id, list_id, status='normal'):
+        contact_id, list_id = str(contact_id), str(list_id)
+        if contact_id not in self.contacts or list_id not in self.lists:
+            return None
+        subscription_id = '%s_%s' % (list_id, contact_id)
+        record = self.subscriptions.get(subscription_id)
+        if record is None:
+            record = dict(subscriptionId=subscription_id, contactId=contact_id,
+                          listId=list_id, addDate=self.now())
+            self.subscriptions[subscription_id] = record
+        record['status'] = unicode(status)
+        return record
+
+    def move_subscription(self, subscription_id, list_id):
+        record = self.subscriptions.get(subscription_id)
+        if record is None or str(list_id) not in self.lists:
+            return None
+        del self.subscriptions[subscription_id]
+        moved = self.add_subscription(record['contactId'], list_id, record['status'])
+        moved['addDate'] = record['addDate']
+        return moved
+
+    def add_message(self, values):
+        message_id = self.new_id()
+        record = dict(messageId=message_id, subject='', messageType='normal',
+                      campaignId='', htmlBody='', textBody='', createDate=self.now())
+        self.update_record(record, values, ('messageId', 'createDate'))
+        self.messages[message_id] = record
+        return record
+
+    def populate(self, contacts=0, lists=0, messages=0, subscriptions_per_contact=1):
+        """
+        Adds generated records: `contacts` contacts with addresses of the
+        form userN@example.com, `lists` lists and `messages` messages. Each
+        contact is subscribed to `subscriptions_per_contact` of the lists.
+        """
+        self.lock.acquire()
+        try:
+            new_lists = [self.add_list(dict(name='List %d' % i)) for i in range(lists)]
+            list_ids = [l['listId'] for l in new_lists] or self.lists.keys()
+            for i in range(messages):
+                self.add_message(dict(subject='Message %d' % i))
+            start = len(self.contacts)
+            for i in range(start, start + contacts):
+                contact = self.add_contact(dict(email='user%d@example.com' % i,
+                                                firstName='First%d' % i,
+                                                lastName='Last%d' % i,
+                                                city='Raleigh', state='NC'))
+                for j in range(min(subscriptions_per_contact, len(list_ids))):
+                    self.add_subscription(contact['contactId'], list_ids[(i + j) % len(list_ids)])
+        finally:
+            self.lock.release()
+
+    # Request handling
+
+    def handle(self, method, segments, params, data):
+        if segments[:1] != ['a']:
+            raise NotFound('Unknown resource')
+        if len(segments) == 1:
+            return dict(accounts=[dict(accountId=self.account_id, enabled='1')])
+        if segments[1] != self.account_id:
+            raise NotFound('Unknown account %s' % segments[1])
+        if segments[2:] == ['c']:
+            return dict(clientfolders=[dict(clientFolderId=self.client_folder_id)])
+        if segments[2:3] != ['c'] or segments[3:4] != [self.client_folder_id]:
+            raise NotFound('Unknown client folder')
+        resource = segments[4:5] and segments[4] or ''
+        handler = getattr(self, '%s_%s' % (method.lower(), resource), None)
+        if handler is None:
+            raise NotFound('Unsupported %s on %s' % (method, resource or 'folder'))
+        self.lock.acquire()
+        try:
+            return handler(segments[5:], params, data or {})
+        finally:
+            self.lock.release()
+
+    def page(self, collection, records, params):
+        records = [r for r in records if _matches(r, params)]
+        try:
+            limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            raise BadRequest('Invalid limit or offset')
+        result = {collection: records[offset:offset + limit], 'total': len(records)}
+        return result
+
+    def items(self, data, key):
+        value = data.get(key)
+        if value is None:
+            raise BadRequest('Missing %s' % key)
+        if isinstance(value, dict):
+            return [value]
+        return value
+
+    def get_contacts(self, rest, params, data):
+        if rest and rest[1:2] == ['actions']:
+            contact = self.find(self.contacts, rest[0], 'contact')
+            actions = [dict(actionType='open', actionTime=contact['createDate'],
+                            details='Message %d' % i) for i in range(self.history_actions)]
+            return self.page('actions', actions, params)
+        if rest and rest[0]:
+            return dict(contact=self.find(self.contacts, rest[0], 'contact'))
+        if 'email' in params and '*' not in params['email']:
+            # Served from the email index, as iContact does.
+            contact_id = self.emails.get(params['email'].lower())
+            records = contact_id and [self.contacts[contact_id]] or []
+            return self.page('contacts', records, params)
+        return self.page('contacts', [self.contacts[i] for i in self.contact_order], params)
+
+    def post_contacts(self, rest, params, data):
+        contacts, warnings = [], []
+        for values in self.items(data, 'contact'):
+            if 'contactId' in values:
+                contact = self.contacts.get(str(values['contactId']))
+                if contact is not None:
+                    if 'email' in values and values['email'] != contact['email']:
+                        self.emails.pop(contact['email'].lower(), None)
+                        self.emails[values['email'].lower()] = contact['contactId']
+                    self.update_record(contact, values, ('contactId', 'createDate'))
+            else:
+                contact = self.add_contact(values)
+            if contact is None:
+                warnings.append('Invalid contact: %s' % values.get('email', values.get('contactId')))
+            else:
+                contacts.append(contact)
+        return dict(contacts=contacts, warnings=warnings)
+
+    def delete_contacts(self, rest, params, data):
+        contact = self.find(self.contacts, rest[:1] and rest[0] or '', 'contact')
+        del self.contacts[contact['contactId']]
+        self.contact_order.remove(contact['contactId'])
+        self.emails.pop(contact['email'].lower(), None)
+        for key in [k for k, s in self.subscriptions.items()
+                    if s['contactId'] == contact['contactId']]:
+            del self.subscriptions[key]
+        return []
+
+    def get_lists(self, rest, params, data):
+        if rest and rest[0]:
+            return dict(list=self.find(self.lists, rest[0], 'list'))
+        return self.page('lists', sorted(self.lists.values(), key=lambda l: int(l['listId'])),
+                         params)
+
+    def post_lists(self, rest, params, data):
+        if 'list' in data:
+            values = self.items(data, 'list')
+        else:
+            values = [data]
+        return dict(lists=[self.add_list(v) for v in values], warnings=[])
+
+    def get_subscriptions(self, rest, params, data):
+        if rest and rest[0]:
+            return dict(subscription=self.find(self.subscriptions, rest[0], 'subscription'))
+        return self.page('subscriptions', sorted(self.subscriptions.values(),
+                                                 key=lambda s: s['subscriptionId']), params)
+
+    def post_subscriptions(self, rest, params, data):
+        subscriptions, warnings = [], []
+        for values in self.items(data, 'subscription'):
+            if 'subscriptionId' in values:
+                record = self.move_subscription(values['subscriptionId'], values.get('listId'))
+            else:
+                record = self.add_subscription(values.get('contactId'), values.get('listId'),
+                                               values.get('status', 'normal'))
+            if record is None:
+                warnings.append('Invalid subscription: %s' % get_codec().dumps(values))
+            else:
+                subscriptions.append(record)
+        return dict(subscriptions=subscriptions, warnings=warnings)
+
+    def put_subscriptions(self, rest, params, data):
+        self.find(self.subscriptions, rest[:1] and rest[0] or '', 'subscription')
+        record = self.move_subscription(rest[0], data.get('listId'))
+        if record is None:
+            raise BadRequest('Invalid list %s' % data.get('listId'))
+        return dict(subscription=record)
+
+    def get_messages(self, rest, params, data):
+        if rest and rest[1:2] == ['stats']:
+            message = self.find(self.messages, rest[0], 'message')
+            return self.stats(message, rest[2:3] and rest[2] or None)
+        if rest and rest[0]:
+            return dict(message=self.find(self.messages, rest[0], 'message'))
+        return self.page('messages', sorted(self.messages.values(),
+                                            key=lambda m: int(m['messageId'])), params)
+
+    def post_messages(self, rest, params, data):
+        return dict(messages=[self.add_message(v) for v in self.items(data, 'message')],
+                    warnings=[])
+
+    def stats(self, message, action):
+        """Renders generated statistics as iContact's XML stats document."""
+        count = self.stats_recipients
+        parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<response xmlns:xlink="http://www.w3.org/1999/xlink"><stats>']
+        for name in STATS_ACTIONS:
+            if name == 'released':
+                n = count
+            else:
+                n = count // (STATS_ACTIONS.index(name) + 1)
+            href = '/icp/a/%s/c/%s/messages/%s/stats/%s' % (
+                self.account_id, self.client_folder_id, message['messageId'], name)
+            attrs = 'count="%d" percent="%.1f" xlink:href=%s' % (
+                n, count and 100.0 * n / count or 0, quoteattr(href))
+            if name in ('opens', 'clicks'):
+                attrs += ' unique="%d"' % n
+            if name != action:
+                parts.append('<%s %s/>' % (name, attrs))
+                continue
+            parts.append('<%s %s>' % (name, attrs))
+            for i in range(n):
+                parts.append('<contact email="user%d@example.com" name="First%d Last%d" '
+                             'xlink:href="/icp/a/%s/c/%s/contacts/%d"><%s date="2009-03-02T'
+                             '11:%02d:%02d-05:00"/></contact>' % (
+                                 i, i, i, self.account_id, self.client_folder_id,
+                                 1000001 + i, name.rstrip('s'), i // 60 % 60, i % 60))
+            parts.append('</%s>' % name)
+        parts.append('</stats></response>')
+        return ''.join(parts)
+
+    def get_sends(self, rest, params, data):
+        for send in self.sends.values():
+            self.update_send_status(send)
+        if rest and rest[0]:
+            return dict(send=self.find(self.sends, rest[0], 'send'))
+        return self.page('sends', sorted(self.sends.values(), key=lambda s: int(s['sendId'])),
+                         params)
+
+    def update_send_status(self, send):
+        """
+        Moves a send from pending to sending at its scheduledTime (or when
+        it was created), and to sent `send_duration` seconds later.
+        """
+        start = self.send_starts[send['sendId']]
+        now = time.time()
+        if now < start:
+            send['status'] = u'pending'
+        elif now < start + self.send_duration:
+            send['status'] = u'sending'
+        else:
+            send['status'] = u'sent'
+
+    def post_sends(self, rest, params, data):
+        sends = []
+        for values in self.items(data, 'send'):
+            self.find(self.messages, values.get('messageId', ''), 'message')
+            send_id = self.new_id()
+            record = dict(sendId=send_id, status='pending', recipientCount=0)
+            self.update_record(record, values, ('sendId', 'status'))
+            record['recipientCount'] = len(
+                [s for s in self.subscriptions.values()
+                 if s['listId'] in record.get('includeListIds', '').split(',')])
+            start = time.time()
+            if record.get('scheduledTime'):
+                try:
+                    start = time.mktime(time.strptime(
+                        record['scheduledTime'][:19].replace('T', ' '), '%Y-%m-%d %H:%M:%S'))
+                except ValueError:
+                    pass
+            self.send_starts[send_id] = start
+            self.sends[send_id] = record
+            sends.append(record)
+        return dict(sends=sends, warnings=[])
+
+    def delete_sends(self, rest, params, data):
+        send_id = self.find(self.sends, rest[:1] and rest[0] or '', 'send')['sendId']
+        del self.sends[send_id]
+        del self.send_starts[send_id]
+        return []
+
+    def get_segments(self, rest, params, data):
+        return self.page('segments', sorted(self.segments.values(),
+                                            key=lambda s: int(s['segmentId'])), params)
+
+    def post_segments(self, rest, params, data):
+        if rest[1:2] == ['criteria']:
+            segment = self.find(self.segments, rest[0], 'segment')
+            criterion = dict(criterionId=self.new_id())
+            self.update_record(criterion, data, ('criterionId',))
+            segment.setdefault('criteria', []).append(criterion)
+            return dict(criteria=[criterion], warnings=[])
+        segment_id = self.new_id()
+        segment = dict(segmentId=segment_id, name='', listId='', description='')
+        self.update_record(segment, data, ('segmentId',))
+        self.segments[segment_id] = segment
+        return dict(segments=[segment], warnings=[])
+
+    def find(self, records, record_id, name):
+        record = records.get(str(record_id))
+        if record is None:
+            raise NotFound('No %s with id %s' % (name, record_id))
+        return record
+
+
+class FakeIContactServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Serves a FakeAPI over HTTP, or HTTPS when `certfile` is given, from
+    a background thread.
+
+    - latency: seconds added to every response, plus up to `jitter` more
+      at random.
+    - error_rate: the fraction of requests answered with a 500 error.
+    - throttle_rate: the fraction answered with a 503 and a `Retry-After`
+      of `retry_after` seconds, as iContact does when rate limiting.
+    - field_size, extra_fields: generated contacts get `extra_fields`
+      custom fields of `field_size` characters each, to vary payload size.
+    - stats_recipients: the number of recipients listed in message stats.
+    - send_duration: the seconds a send spends 'sending', from its
+      scheduledTime (or creation), before it is 'sent'.
+    - compress_responses: gzip responses to requests that accept it.
+    - compressed_requests: accept gzip or deflate request bodies; when
+      False they are refused with a 415 error.
+
+    Failures can also be scheduled with `inject()`. Request counts per
+    endpoint are kept in `counts`.
+    """
+    daemon_threads = True
+    prefix = '/icp/'
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=0, certfile=None, keyfile=None,
+                 compress_responses=True, compressed_requests=True, seed=0,
+                 **api_options):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeIContactHandler)
+        self.scheme = 'http'
+        if certfile is not None:
+            self.socket = ssl.wrap_socket(self.socket, keyfile, certfile, server_side=True)
+            self.scheme = 'https'
+        self.api = FakeAPI(seed=seed, **api_options)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.compress_responses = compress_responses
+        self.compressed_requests = compressed_requests
+        self.random = random.Random(seed)
+        self.counts = {}
+        self.requests = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return '%s://%s:%d%s' % (self.scheme, self.server_address[0],
+                                 self.server_address[1], self.prefix)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.setDaemon(True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def populate(self, **kwargs):
+        """Adds generated records; see FakeAPI.populate."""
+        self.api.populate(**kwargs)
+        return self
+
+    def inject(self, status=503, count=1, retry_after=None):
+        """Answers the next `count` requests with an error `status`."""
+        self._lock.acquire()
+        try:
+            self._failures.extend([(status, retry_after)] * count)
+        finally:
+            self._lock.release()
+
+    def count(self, method, path):
+        key = (method, endpoint_template(path))
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            self.counts[key] = self.counts.get(key, 0) + 1
+        finally:
+            self._lock.release()
+
+    def delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def injected_failure(self):
+        """Returns (status, retry_after) if this request should fail."""
+        self._lock.acquire()
+        try:
+            if self._failures:
+                return self._failures.pop(0)
+            roll = self.random.random()
+        finally:
+            self._lock.release()
+        if roll < self.throttle_rate:
+            return 503, self.retry_after
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, None
+        return None
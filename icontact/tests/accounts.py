@@ -0,0 +1,140 @@
+import threading
+import time
+import unittest
+
+from icontact.accounts import AccountManager
+from icontact.testing import FakeIContactServer
+
+
+class AccountManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(contacts=5, lists=2)
+        self.manager = AccountManager('key', max_workers=1, url=self.server.url)
+        self.order = []
+        self.gate = threading.Event()
+
+    def tearDown(self):
+        self.gate.set()
+        self.manager.close()
+        self.server.stop()
+
+    def add(self, name, **options):
+        return self.manager.add_account(name, name, 'password', account_id='1000',
+                                        client_folder_id='2000', **options)
+
+    def record(self, client, name):
+        self.order.append(name)
+
+    def hold(self):
+        """Occupies the only worker until the gate opens, so calls queue up."""
+        if 'gate' not in self.manager.stats():
+            self.add('gate')
+        started = threading.Event()
+
+        def wait(client):
+            started.set()
+            self.gate.wait()
+        self.manager.submit('gate', wait)
+        started.wait(5)
+
+    def run_queued(self, *submissions):
+        futures = []
+        for name, count in submissions:
+            for i in range(count):
+                futures.append(self.manager.submit(name, self.record, name))
+        self.gate.set()
+        for future in futures:
+            future.result(5)
+
+    def test_round_robin(self):
+        self.add('big')
+        self.add('small')
+        self.hold()
+        self.run_queued(('big', 20), ('small', 5))
+        self.assertEqual(self.order[:10], ['big', 'small'] * 5)
+        self.assertEqual(self.order[10:], ['big'] * 15)
+
+    def test_weights(self):
+        self.add('a', weight=2)
+        self.add('b')
+        self.hold()
+        self.run_queued(('a', 6), ('b', 6))
+        self.assertEqual(self.order[:9].count('a'), 6)
+        self.assertEqual(self.order[9:], ['b'] * 3)
+
+    def test_idle_account_does_not_bank_turns(self):
+        self.add('a')
+        self.add('b')
+        for i in range(10):
+            self.manager.submit('a', self.record, 'a').result(5)
+        self.order = []
+        self.hold()
+        self.run_queued(('a', 3), ('b', 3))
+        self.assertEqual(self.order, ['b', 'a'] * 3)
+
+    def test_rate_budget(self):
+        client = self.add('limited', rate=20, burst=1)
+        self.assertEqual(client.transport, self.manager.transport)
+        start = time.time()
+        futures = [self.manager.submit('limited', 'lists') for i in range(5)]
+        self.assertEqual([len(f.result(5).lists) for f in futures], [2] * 5)
+        self.assertTrue(time.time() - start >= 0.18)
+        stats = self.manager.stats('limited')
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['completed'], 5)
+
+    def test_global_budget(self):
+        # Without coalescing, so that concurrent identical calls each
+        # make a request.
+        manager = AccountManager('key', max_workers=4, rate=20, burst=1, url=self.server.url,
+                                 coalesce=False)
+        try:
+            for name in ('a', 'b'):
+                manager.add_account(name, name, 'password', account_id='1000',
+                                    client_folder_id='2000')
+            start = time.time()
+            futures = [manager.submit(name, 'lists') for name in ('a', 'b') * 3]
+            for future in futures:
+                future.result(5)
+            self.assertTrue(time.time() - start >= 0.22)
+        finally:
+            manager.close()
+
+    def test_bulk_call_is_paced(self):
+        manager = AccountManager('key', max_workers=2, rate=20, burst=1, url=self.server.url)
+        try:
+            for name in ('bulk', 'other'):
+                manager.add_account(name, name, 'password', account_id='1000',
+                                    client_folder_id='2000')
+            start = time.time()
+            rows = [dict(email='bulk%d@example.com' % i) for i in range(30)]
+            bulk = manager.submit('bulk', 'create_contacts', rows, chunk_size=1)
+            time.sleep(0.1)
+            self.assertEqual(len(manager.submit('other', 'lists').result(5).lists), 2)
+            other = time.time() - start
+            self.assertEqual(len(bulk.result(10).errors), 0)
+            self.assertTrue(time.time() - start >= 1.4)
+            self.assertTrue(other < 1.0, other)
+            self.assertEqual(manager.stats('bulk')['requests'], 30)
+        finally:
+            manager.close()
+
+    def test_stats_and_errors(self):
+        self.add('a')
+        self.hold()
+        future = self.manager.submit('a', 'get_message', '999')
+        time.sleep(0.05)
+        self.gate.set()
+        self.assertRaises(Exception, future.result, 5)
+        stats = self.manager.stats()['a']
+        self.assertEqual(stats['submitted'], 1)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['queued'], 0)
+        self.assertTrue(stats['max_queue_delay'] >= 0.05)
+        self.assertRaises(ValueError, self.add, 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from datetime import date
+
+from icontact.aggregate import CampaignStats, collect_stats
+from icontact.client import IContactClient
+from icontact.testing import FakeIContactServer
+
+STATS = ('GET', 'a/{accountId}/c/{clientFolderId}/messages/{messageId}/stats')
+
+
+def summary(count, unique=None):
+    result = dict(count=count, percent=0.0, href=None)
+    if unique is not None:
+        result['unique'] = unique
+    return result
+
+
+ROWS = [
+    ('1', date(2009, 3, 2), ['10'], dict(released=summary(100), opens=summary(30, 20),
+                                         clicks=summary(5, 4))),
+    ('2', date(2009, 3, 2), ['10', '11'], dict(released=summary(50), opens=summary(10, 10),
+                                               bounces=summary(2))),
+    ('3', date(2009, 3, 5), ['11'], dict(released=summary(50), opens=summary(0, 0),
+                                         complaints=None)),
+    ('4', None, [], dict(released=summary(0))),
+]
+
+
+class CampaignStatsTestCase(unittest.TestCase):
+    use_numpy = True
+
+    def setUp(self):
+        self.stats = CampaignStats.from_rows(ROWS, use_numpy=self.use_numpy)
+
+    def test_totals(self):
+        self.assertEqual(len(self.stats), 4)
+        totals = self.stats.totals()
+        self.assertEqual(totals['released'], 200)
+        self.assertEqual(totals['opens'], 40)
+        self.assertEqual(totals['unique_opens'], 30)
+        self.assertEqual(totals['complaints'], 0)
+        rates = self.stats.rates()
+        self.assertEqual(rates['opens'], 0.2)
+        self.assertEqual(rates['bounces'], 0.01)
+        self.assertEqual(list(self.stats.message_rates('opens')), [0.3, 0.2, 0.0, 0.0])
+
+    def test_by_day(self):
+        days = self.stats.by_day()
+        self.assertEqual(days.keys(), [None, date(2009, 3, 2), date(2009, 3, 5)])
+        self.assertEqual(days[date(2009, 3, 2)]['released'], 150)
+        self.assertEqual(days[date(2009, 3, 2)]['unique_clicks'], 4)
+        self.assertEqual(days[date(2009, 3, 5)]['rates']['opens'], 0.0)
+        self.assertEqual(days[None]['rates']['opens'], 0.0)
+
+    def test_by_list(self):
+        lists = self.stats.by_list()
+        self.assertEqual(lists.keys(), ['10', '11'])
+        self.assertEqual(lists['10']['released'], 150)
+        self.assertEqual(lists['11']['opens'], 10)
+        self.assertEqual(lists['11']['rates']['opens'], 0.1)
+
+    def test_empty(self):
+        stats = CampaignStats.from_rows([], use_numpy=self.use_numpy)
+        self.assertEqual(stats.totals()['released'], 0)
+        self.assertEqual(stats.rates()['opens'], 0.0)
+        self.assertEqual(stats.by_day().keys(), [])
+        self.assertEqual(stats.by_list().keys(), [])
+
+
+class PurePythonCampaignStatsTestCase(CampaignStatsTestCase):
+    use_numpy = False
+
+    def test_arrays(self):
+        self.assertFalse(self.stats.use_numpy)
+        self.assertEqual(self.stats.columns['released'].typecode, 'l')
+
+
+class CollectStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer(stats_recipients=12).start()
+        self.server.populate(contacts=5, lists=2, messages=3)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000')
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def test_collect(self):
+        list_ids = sorted(self.server.api.lists, key=int)
+        message_ids = sorted(self.server.api.messages, key=int)
+        self.client.create_send(message_ids[0], list_ids, scheduledTime='2009-03-02 10:00:00')
+        self.client.create_send(message_ids[1], list_ids[:1],
+                                scheduledTime='2009-03-04T10:00:00-05:00')
+        stats = collect_stats(self.client, max_workers=4)
+        self.assertEqual(stats.message_ids, message_ids)
+        self.assertEqual(self.server.counts[STATS], 3)
+        self.assertEqual(stats.totals()['released'], 36)
+        self.assertEqual(stats.totals()['opens'], 9)
+        self.assertEqual(stats.rates()['bounces'], 0.5)
+        days = stats.by_day()
+        self.assertEqual(days[date(2009, 3, 2)]['released'], 12)
+        self.assertEqual(days[date(2009, 3, 4)]['released'], 12)
+        self.assertEqual(stats.by_list()[list_ids[0]]['released'], 24)
+        self.assertEqual(stats.by_list()[list_ids[1]]['released'], 12)
+
+    def test_errors(self):
+        message_ids = sorted(self.server.api.messages, key=int)
+        stats = collect_stats(self.client, [message_ids[2], '999'])
+        self.assertEqual(stats.message_ids, [message_ids[2]])
+        self.assertEqual([message_id for message_id, error in stats.errors], ['999'])
+
+
+if __name__ == '__main__':
+    unittest.main()
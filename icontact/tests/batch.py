@@ -0,0 +1,120 @@
+import unittest
+import threading
+import BaseHTTPServer
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+from icontact.client import IContactClient
+from icontact.tests.executor import ThreadingServer
+
+
+class BatchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        data = simplejson.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path.endswith('/subscriptions/'):
+            result = self.subscriptions(data)
+        else:
+            result = self.contacts(data)
+        self.server.requests += 1
+        body = simplejson.dumps(result)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def contacts(self, data):
+        contacts, warnings = [], []
+        for contact in data['contact']:
+            if contact.get('email', '').startswith('bad'):
+                warnings.append('Invalid email address: %s' % contact['email'])
+                continue
+            contact.setdefault('contactId', str(len(contacts) + 100))
+            contacts.append(contact)
+        return dict(contacts=contacts, warnings=warnings)
+
+    def subscriptions(self, data):
+        subscriptions, warnings = [], []
+        for subscription in data['subscription']:
+            if 'subscriptionId' in subscription:
+                contact_id = subscription['subscriptionId'].split('_', 1)[1]
+                status = 'normal'
+            else:
+                contact_id = subscription['contactId']
+                status = subscription['status']
+            list_id = subscription['listId']
+            if str(list_id) == '0':
+                warnings.append('Invalid list: %s' % list_id)
+                continue
+            subscriptions.append(dict(subscriptionId='%s_%s' % (list_id, contact_id),
+                                      listId=list_id, contactId=contact_id,
+                                      status=status))
+        return dict(subscriptions=subscriptions, warnings=warnings)
+
+    def log_message(self, *args):
+        pass
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), BatchHandler)
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+        self.client = IContactClient('key', 'user', 'password', url=url,
+                                     account_id=1, client_folder_id=2)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_create_contacts(self):
+        rows = [dict(email='user%d@example.com' % i) for i in range(10)]
+        rows[3]['email'] = 'bad@example'
+        result = self.client.create_contacts(iter(rows), chunk_size=4)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(len(result), 10)
+        self.assertEqual([item.index for item in result.errors], [3])
+        self.assertEqual(result[0].result.status, 'normal')
+        self.assertEqual(result[9].result.email, 'user9@example.com')
+        self.assertTrue('status' not in rows[0])
+
+    def test_update_contacts_concurrently(self):
+        rows = [dict(contactId=i, firstName='Name %d' % i) for i in range(50)]
+        result = self.client.update_contacts(rows, chunk_size=5, max_workers=4)
+        self.assertEqual(result.requests, 10)
+        self.assertEqual(result.errors, [])
+        self.assertEqual([item.result.firstName for item in result],
+                         [row['firstName'] for row in rows])
+
+    def test_create_subscriptions(self):
+        rows = [(i, 7) for i in range(9)]
+        rows[4] = (4, 0)
+        rows[5] = (5, 7, 'pending')
+        result = self.client.create_subscriptions(rows, chunk_size=4)
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual([item.index for item in result.errors], [4])
+        self.assertEqual(result[4].error, 'Invalid list: 0')
+        self.assertEqual(result[0].result.subscriptionId, '7_0')
+        self.assertEqual(result[5].result.status, 'pending')
+
+    def test_move_subscribers(self):
+        rows = [(7, i, 8) for i in range(20)]
+        result = self.client.move_subscribers(rows, chunk_size=6, max_workers=2)
+        self.assertEqual(result.requests, 4)
+        self.assertEqual(result.errors, [])
+        self.assertEqual([item.result.subscriptionId for item in result],
+                         ['8_%d' % i for i in range(20)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+from icontact.client import IContactClient
+from icontact.cache import LRUCache, DiskCache, ResponseCache
+from icontact.tests.executor import ThreadingServer
+
+
+class AccountHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def respond(self, data):
+        self.server.requests.append((self.command, self.path))
+        body = simplejson.dumps(data)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/icp/a':
+            self.respond(dict(accounts=[dict(accountId='1')]))
+        elif self.path == '/icp/a/1/c':
+            self.respond(dict(clientfolders=[dict(clientFolderId='2')]))
+        else:
+            self.respond(dict(lists=[dict(listId=str(len(self.server.requests)))]))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.respond(dict(lists=[dict(listId='3')]))
+
+    def log_message(self, *args):
+        pass
+
+
+class BackendTestCase(unittest.TestCase):
+
+    def test_lru_eviction_and_ttl(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.evictions, 1)
+        cache.set('d', 4, ttl=-1)
+        self.assertEqual(cache.get('d'), None)
+
+    def test_disk_cache_shared(self):
+        directory = tempfile.mkdtemp()
+        try:
+            DiskCache(directory).set(('k', 1), dict(x=1), ttl=60)
+            self.assertEqual(DiskCache(directory).get(('k', 1)), dict(x=1))
+            DiskCache(directory).set(('k', 2), 'old', ttl=-1)
+            self.assertEqual(DiskCache(directory).get(('k', 2)), None)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ClientCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), AccountHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+        self.cache = ResponseCache()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_client(self):
+        return IContactClient('key', 'user', 'password', url=self.url, cache=self.cache)
+
+    def test_discovery_shared(self):
+        self.get_client().lists()
+        self.get_client().lists()
+        self.assertEqual(self.server.requests, [('GET', '/icp/a'), ('GET', '/icp/a/1/c'),
+                                                ('GET', '/icp/a/1/c/2/lists/')])
+        self.assertEqual(self.cache.stats()['hits'], 3)
+
+    def test_write_invalidates(self):
+        client = self.get_client()
+        first = client.lists().lists[0].listId
+        self.assertEqual(client.lists().lists[0].listId, first)
+        client.create_list('name', 0, 0, 0, 1)
+        self.assertNotEqual(client.lists().lists[0].listId, first)
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+    def test_response_fetched_before_a_write_is_not_cached(self):
+        client = self.get_client()
+        fetch = client._do_request
+
+        def do_request(call_path, *args, **kwargs):
+            data = fetch(call_path, *args, **kwargs)
+            if call_path.endswith('/lists/'):
+                # A write lands while the response is on its way back.
+                client._invalidate(client.account_id, client.client_folder_id, 'lists')
+            return data
+        client._do_request = do_request
+        client.lists()
+        client._do_request = fetch
+        client.lists()
+        self.assertEqual(self.server.requests.count(('GET', '/icp/a/1/c/2/lists/')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
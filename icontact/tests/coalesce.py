@@ -0,0 +1,74 @@
+import unittest
+import threading
+
+from icontact.client import IContactClient, IContactServerError
+from icontact.coalesce import RequestCoalescer
+from icontact.testing import FakeIContactServer
+
+LISTS = ('GET', 'a/{accountId}/c/{clientFolderId}/lists/')
+
+
+class CoalesceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer(latency=0.2).start()
+        self.server.populate(lists=2)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def get_client(self, **kwargs):
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000', **kwargs)
+        self.client.transport.grow(8)
+        return self.client
+
+    def run_threads(self, fn, count=8):
+        results = [None] * count
+
+        def run(i):
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_gets_share_one_request(self):
+        client = self.get_client()
+        results = self.run_threads(client.lists)
+        self.assertEqual(self.server.counts[LISTS], 1)
+        self.assertEqual(client.coalescer.stats(),
+                         dict(executed=1, deduplicated=7, in_flight=0))
+        self.assertEqual(set([len(r.lists) for r in results]), set([2]))
+        # Each caller gets its own wrapper around the shared response.
+        results[0].note = 'mine'
+        self.assertFalse('note' in results[1])
+
+    def test_errors_are_shared(self):
+        client = self.get_client()
+        self.server.inject(404)
+        results = self.run_threads(client.lists, 4)
+        self.assertEqual([type(r) for r in results], [IContactServerError] * 4)
+        self.assertEqual(self.server.counts[LISTS], 1)
+
+    def test_per_endpoint(self):
+        client = self.get_client(coalesce=RequestCoalescer(['a/{accountId}/c']))
+        self.run_threads(client.lists, 3)
+        self.assertEqual(self.server.counts[LISTS], 3)
+        self.assertTrue(client.coalescer.applies_to('a/1000/c'))
+
+    def test_disabled(self):
+        client = self.get_client(coalesce=False)
+        self.run_threads(client.lists, 3)
+        self.assertEqual(self.server.counts[LISTS], 3)
+        self.assertEqual(client.coalescer, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
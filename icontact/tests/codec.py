@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import unittest
+
+from icontact.client import IContactClient
+from icontact.codec import BACKENDS, JSONCodec, available_backends, get_codec
+from icontact.testing import FakeIContactServer
+
+DOCUMENT = {'contacts': [{'contactId': '1', 'email': u'j\xfcrgen@example.com',
+                          'url': 'http://example.com/a/b', 'bounceCount': 0,
+                          'score': 1.5, 'tags': None}],
+            'total': 1}
+
+
+class CountingCodec(JSONCodec):
+    name = 'counting'
+
+    def __init__(self):
+        self.codec = get_codec('json')
+        self.calls = []
+
+    def dumps(self, obj):
+        self.calls.append('dumps')
+        return self.codec.dumps(obj)
+
+    def loads(self, data):
+        self.calls.append('loads')
+        return self.codec.loads(data)
+
+
+class CodecTestCase(unittest.TestCase):
+
+    def test_backends_round_trip(self):
+        backends = available_backends()
+        self.assertTrue('json' in backends)
+        for name in backends:
+            codec = get_codec(name)
+            self.assertEqual(codec.name, name)
+            data = codec.dumps(DOCUMENT)
+            self.assertTrue(isinstance(data, str), name)
+            self.assertTrue('/a/b' in data, name)
+            self.assertEqual(codec.loads(data), DOCUMENT)
+            self.assertRaises(ValueError, codec.loads, '{"contacts": [')
+
+    def test_default_is_first_installed(self):
+        self.assertEqual(get_codec().name, available_backends()[0])
+        self.assertTrue(get_codec() is get_codec())
+        self.assertRaises(ValueError, get_codec, 'yaml')
+
+    def test_client_codec(self):
+        server = FakeIContactServer().start()
+        try:
+            codec = CountingCodec()
+            client = IContactClient('key', 'user', 'password', url=server.url,
+                                    account_id='1000', client_folder_id='2000',
+                                    json_codec=codec)
+            client.create_contact('someone@example.com')
+            self.assertEqual(codec.calls, ['dumps', 'loads'])
+            client = IContactClient('key', 'user', 'password', json_codec='json')
+            self.assertEqual(client.json_codec.name, 'json')
+        finally:
+            server.stop()
+
+    def test_lazy_imports(self):
+        script = ('import sys; import icontact.client, icontact.cache; '
+                  'print(" ".join(sorted(set(m.split(".")[0] for m in sys.modules '
+                  'if sys.modules[m] is not None))))')
+        modules = subprocess.check_output([sys.executable, '-c', script]).split()
+        for name in ('xml', 'dateutil', 'django', 'email', 'uuid', 'ctypes') + BACKENDS:
+            self.assertFalse(name in modules, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import zlib
+
+from icontact.client import IContactClient
+from icontact.compression import Decoder, decoder_for, gzip_encode
+from icontact.testing import FakeIContactServer
+
+CONTACTS = ('POST', 'a/{accountId}/c/{clientFolderId}/contacts/')
+
+
+class DecoderTestCase(unittest.TestCase):
+
+    def decode_in_chunks(self, decoder, data, size=7):
+        result = ''
+        for i in range(0, len(data), size):
+            result += decoder.decompress(data[i:i + size])
+        return result + decoder.flush()
+
+    def test_formats(self):
+        data = 'contact ' * 1000
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = raw.compress(data) + raw.flush()
+        self.assertEqual(self.decode_in_chunks(Decoder('gzip'), gzip_encode(data)), data)
+        self.assertEqual(self.decode_in_chunks(Decoder('deflate'), zlib.compress(data)), data)
+        self.assertEqual(self.decode_in_chunks(Decoder('deflate'), raw), data)
+        self.assertEqual(decoder_for('identity'), None)
+        self.assertEqual(decoder_for(' GZIP').encoding, 'gzip')
+
+
+class CompressedClientTestCase(unittest.TestCase):
+
+    def start(self, compress=True, **options):
+        self.server = FakeIContactServer(**options).start()
+        self.server.populate(contacts=200, lists=1, messages=1)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000',
+                                     compress=compress)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def test_responses(self):
+        self.start()
+        events = []
+        self.client.add_observer(events.append)
+        result = self.client.search_contacts(limit='200')
+        self.assertEqual(len(result.contacts), 200)
+        self.assertEqual(len(list(self.client.stream_contacts(limit='200'))), 200)
+        stats = self.client.message_delivery_details(
+            self.client.messages().messages[0].messageId, 'opens')
+        self.assertEqual(len(stats['contacts']), stats['opens']['count'])
+        for event in events:
+            self.assertTrue(event.wire_bytes_in < event.bytes_in, event)
+        traffic = self.client.traffic.stats()
+        self.assertEqual(traffic['bytes_in'], sum([e.bytes_in for e in events]))
+        self.assertTrue(traffic['saved'] > traffic['bytes_in'] / 2)
+        # Decompressed responses still return their connections to the pool.
+        self.assertEqual(self.client.transport.stats()['created'], 1)
+
+    def test_request_bodies(self):
+        self.start()
+        rows = [dict(email='new%d@example.com' % i) for i in range(50)]
+        self.assertEqual(self.client.create_contacts(rows).errors, [])
+        self.client.create_contacts([dict(email='small@example.com')])
+        traffic = self.client.traffic.stats()
+        self.assertTrue(traffic['wire_bytes_out'] < traffic['bytes_out'])
+
+    def test_refused_compressed_body(self):
+        self.start(compressed_requests=False)
+        rows = [dict(email='new%d@example.com' % i) for i in range(50)]
+        self.assertEqual(self.client.create_contacts(rows).errors, [])
+        self.assertFalse(self.client.compress_requests)
+        self.client.create_contacts(rows)
+        self.assertEqual(self.server.counts[CONTACTS], 3)
+
+    def test_uncompressed(self):
+        self.start(compress=False)
+        self.client.search_contacts(limit='200')
+        traffic = self.client.traffic.stats()
+        self.assertEqual(traffic['saved'], 0)
+        self.assertTrue(traffic['bytes_in'] > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
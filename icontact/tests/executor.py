@@ -0,0 +1,112 @@
+import unittest
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
+
+from icontact.client import AsyncIContactClient, IContactClient
+from icontact.executor import ThreadPoolExecutor, Future, as_completed
+from icontact.retry import RetryPolicy
+from icontact.tests.retry import ThrottlingHandler
+from icontact.tests.transport import KeepAliveHandler
+
+
+class ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ExecutorTestCase(unittest.TestCase):
+
+    def test_submit(self):
+        executor = ThreadPoolExecutor(2)
+        futures = [executor.submit(pow, 2, i) for i in range(8)]
+        self.assertEqual([f.result() for f in futures], [2 ** i for i in range(8)])
+        self.assertTrue(len(executor._threads) <= 2)
+        executor.shutdown()
+
+    def test_exception(self):
+        executor = ThreadPoolExecutor(1)
+        future = executor.submit(int, 'x')
+        self.assertTrue(isinstance(future.exception(), ValueError))
+        self.assertRaises(ValueError, future.result)
+        executor.shutdown()
+
+    def test_as_completed(self):
+        executor = ThreadPoolExecutor(2)
+        slow = executor.submit(time.sleep, 0.2)
+        fast = executor.submit(time.sleep, 0)
+        self.assertEqual(list(as_completed([slow, fast])), [fast, slow])
+        executor.shutdown()
+
+
+class AsyncClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_methods_return_futures(self):
+        client = AsyncIContactClient('key', 'user', 'password', concurrency=4,
+                                     account_id=1, client_folder_id=2, url=self.url)
+        futures = [client.get_send(i) for i in range(20)]
+        self.assertTrue(isinstance(futures[0], Future))
+        self.assertEqual([f.result().path for f in futures],
+                         ['/icp/a/1/c/2/sends/%d' % i for i in range(20)])
+        self.assertTrue(client.client.transport.stats()['created'] <= 4)
+        client.close()
+
+
+class MapTestCase(unittest.TestCase):
+
+    def start_server(self, handler):
+        self.server = ThreadingServer(('127.0.0.1', 0), handler)
+        self.server.failures = 0
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+        self.client = IContactClient('key', 'user', 'password', url=url,
+                                     account_id=1, client_folder_id=2,
+                                     retry_policy=RetryPolicy(base_delay=0))
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_ordered(self):
+        self.start_server(KeepAliveHandler)
+        items = list(self.client.map('get_send', range(30), max_workers=4))
+        self.assertEqual([item.index for item in items], range(30))
+        self.assertEqual([item.result.path for item in items],
+                         ['/icp/a/1/c/2/sends/%d' % i for i in range(30)])
+        self.assertTrue(self.client.transport.stats()['created'] <= 4)
+
+    def test_unordered_with_errors(self):
+        self.start_server(KeepAliveHandler)
+        args = [(i,) for i in range(10)] + [dict(bogus=1)]
+        items = list(self.client.map(self.client.get_send, args, max_workers=3,
+                                     ordered=False))
+        self.assertEqual(sorted([item.index for item in items]), range(11))
+        errors = [item for item in items if item.error is not None]
+        self.assertEqual([item.index for item in errors], [10])
+        self.assertTrue(isinstance(errors[0].error, TypeError))
+
+    def test_throttling_pauses_all_calls(self):
+        self.start_server(ThrottlingHandler)
+        self.server.failures = 1
+        items = list(self.client.map('account', [()] * 8, max_workers=4))
+        self.assertEqual([item.error for item in items], [None] * 8)
+        self.assertEqual(self.client.retry_policy.stats()['throttled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+from icontact.client import IContactClient
+from icontact.export import export, in_background, main
+from icontact.testing import FakeIContactServer
+
+CONTACTS = ('GET', 'a/{accountId}/c/{clientFolderId}/contacts/')
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer(history_actions=2).start()
+        self.server.populate(contacts=25, lists=2)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_ndjson_gzip(self):
+        count = export(self.client, 'contacts', self.path('c.ndjson.gz'), page_size=10)
+        self.assertEqual(count, 25)
+        self.assertEqual(self.server.counts[CONTACTS], 3)
+        lines = gzip.open(self.path('c.ndjson.gz')).read().splitlines()
+        self.assertEqual(simplejson.loads(lines[3])['email'], 'user3@example.com')
+
+    def test_csv(self):
+        count = export(self.client, 'subscriptions', self.path('s.csv'), format='csv',
+                       background=False, filters=dict(status='normal'))
+        self.assertEqual(count, 25)
+        rows = list(csv.reader(open(self.path('s.csv'))))
+        self.assertEqual(rows[0], ['subscriptionId', 'contactId', 'listId', 'status',
+                                   'addDate'])
+        self.assertEqual(len(rows), 26)
+        export(self.client, 'contacts', self.path('c.csv'), format='csv',
+               fields=['email', 'missing'], params=dict(email='user1@example.com'))
+        self.assertEqual(open(self.path('c.csv')).read(),
+                         'email,missing\r\nuser1@example.com,\r\n')
+
+    def test_history(self):
+        contact_ids = self.server.api.contact_order[:3]
+        count = export(self.client, 'history', self.path('h.ndjson'),
+                       contact_ids=contact_ids)
+        self.assertEqual(count, 6)
+        actions = [simplejson.loads(line) for line in open(self.path('h.ndjson'))]
+        self.assertEqual([a['contactId'] for a in actions][::2], contact_ids)
+
+    def test_background_errors(self):
+        def failing():
+            yield 1
+            raise ValueError('broken')
+        records = in_background(failing())
+        self.assertEqual(records.next(), 1)
+        self.assertRaises(ValueError, records.next)
+
+    def test_command_line(self):
+        status = main(['--url', self.server.url, '--api-key', 'key', '--username', 'user',
+                       '--password', 'password', '--fields', 'contactId,email',
+                       'contacts', self.path('contacts.csv')])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(open(self.path('contacts.csv')).readlines()), 26)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from icontact.client import IContactClient
+from icontact.fingerprints import ContactFingerprints
+from icontact.testing import FakeIContactServer
+
+CONTACTS = ('POST', 'a/{accountId}/c/{clientFolderId}/contacts/')
+
+
+class ContactFingerprintsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(contacts=10)
+        self.fingerprints = ContactFingerprints()
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000',
+                                     fingerprints=self.fingerprints)
+        self.contact_ids = sorted(self.server.api.contacts, key=int)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def posted(self):
+        return self.server.counts.get(CONTACTS, 0)
+
+    def test_changes(self):
+        self.assertEqual(self.fingerprints.changes('1', dict(city='Raleigh')),
+                         dict(city='Raleigh'))
+        self.assertEqual(self.fingerprints.stats()['fields_sent'], 0)
+        self.fingerprints.remember('1', dict(city='Raleigh', bounceCount=0, fax=None))
+        self.assertEqual(self.fingerprints.changes(1, dict(city='Raleigh', bounceCount='0',
+                                                           fax='')), {})
+        self.assertEqual(self.fingerprints.changes('1', dict(city=u'Dur\xe9ham', fax=None)),
+                         dict(city=u'Dur\xe9ham'))
+        self.fingerprints.forget('1')
+        self.assertEqual(len(self.fingerprints.changes('1', dict(city='Raleigh'))), 1)
+        self.assertEqual(self.fingerprints.stats(),
+                         dict(contacts=0, checked=4, unchanged=1, fields_sent=3,
+                              fields_skipped=4))
+
+    def test_update_contact_skips_unchanged(self):
+        contact_id = self.contact_ids[0]
+        self.client.update_contact(contact_id, firstName='Ann', city='Durham')
+        self.assertEqual(self.client.update_contact(contact_id, firstName='Ann',
+                                                    city='Durham'), None)
+        self.assertEqual(self.posted(), 1)
+        result = self.client.update_contact(contact_id, firstName='Ann', city='Cary')
+        self.assertEqual(result.contacts[0].city, 'Cary')
+        self.assertEqual(self.posted(), 2)
+        self.assertEqual(self.server.api.contacts[contact_id]['firstName'], 'Ann')
+        stats = self.fingerprints.stats()
+        self.assertEqual((stats['checked'], stats['unchanged']), (3, 1))
+        self.assertEqual((stats['fields_sent'], stats['fields_skipped']), (3, 3))
+
+    def test_failed_update_is_not_remembered(self):
+        contact_id = self.contact_ids[0]
+        self.server.inject(status=400)
+        self.assertRaises(Exception, self.client.update_contact, contact_id, city='Durham')
+        self.client.update_contact(contact_id, city='Durham')
+        self.assertEqual(self.server.api.contacts[contact_id]['city'], 'Durham')
+        self.assertEqual(self.fingerprints.stats()['fields_sent'], 1)
+
+    def test_field_names_are_shared(self):
+        self.fingerprints.remember('1', dict(city='Durham', state='NC'))
+        self.fingerprints.remember(2, dict(state='SC'))
+        self.fingerprints.remember('1', dict(fax='555'))
+        self.assertEqual(len(self.fingerprints._names), 3)
+        self.assertEqual([len(self.fingerprints._contacts[key]) for key in ('1', '2')],
+                         [24, 8 * (1 + self.fingerprints._names.index('state'))])
+        self.assertEqual(self.fingerprints.changes('1', dict(city='Durham', state='NC',
+                                                             fax='555')), {})
+        self.assertEqual(self.fingerprints.changes('2', dict(state='SC', city='Durham')),
+                         dict(city='Durham'))
+
+    def test_update_contacts_sends_only_changes(self):
+        rows = [dict(contactId=contact_id, city='Durham', state='NC')
+                for contact_id in self.contact_ids]
+        batch = self.client.update_contacts(rows, chunk_size=4)
+        self.assertEqual(len(batch.skipped), 0)
+        self.assertEqual(batch.requests, 3)
+
+        rows[2] = dict(rows[2], city='Cary')
+        rows[7] = dict(rows[7], city='Apex')
+        self.server.api.contacts[self.contact_ids[7]]['state'] = 'SC'
+        batch = self.client.update_contacts(rows, chunk_size=4, max_workers=2)
+        self.assertEqual(batch.requests, 1)
+        self.assertEqual([item.index for item in batch], range(10))
+        self.assertTrue(batch[2].row is rows[2])
+        self.assertEqual(batch[2].result.city, 'Cary')
+        self.assertEqual(len(batch.skipped), 8)
+        self.assertEqual(len(batch.errors), 0)
+        # Only the changed city was sent, so the state changed elsewhere stays.
+        self.assertEqual(self.server.api.contacts[self.contact_ids[7]]['state'], 'SC')
+        self.assertEqual(self.fingerprints.stats()['unchanged'], 8)
+
+    def test_delete_forgets(self):
+        contact_id = self.contact_ids[0]
+        self.client.update_contact(contact_id, city='Durham')
+        self.client.delete_contact(contact_id)
+        self.assertEqual(len(self.fingerprints), 0)
+
+    def test_save_and_load(self):
+        path = os.path.join(self.directory, 'fingerprints.pickle')
+        fingerprints = ContactFingerprints(path)
+        self.assertEqual(len(fingerprints), 0)
+        fingerprints.remember('1', dict(city='Durham'))
+        fingerprints.remember('2', dict(state='NC'))
+        fingerprints.save()
+        self.assertEqual(os.listdir(self.directory), ['fingerprints.pickle'])
+        fingerprints = ContactFingerprints(path)
+        self.assertEqual(len(fingerprints), 2)
+        self.assertEqual(fingerprints.changes('1', dict(city='Durham')), {})
+        self.assertEqual(fingerprints.changes('2', dict(state='NC', city='Durham')),
+                         dict(city='Durham'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import threading
+import logging
+
+from icontact.client import IContactClient
+from icontact.instrumentation import endpoint_template
+from icontact.tests.executor import ThreadingServer
+from icontact.tests.retry import ThrottlingHandler
+from icontact.retry import RetryPolicy
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), ThrottlingHandler)
+        self.server.failures = 0
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+        self.client = IContactClient('key', 'user', 'password', url=url,
+                                     retry_policy=RetryPolicy(base_delay=0))
+        self.events = []
+        self.client.add_observer(self.events.append)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_endpoint_template(self):
+        self.assertEqual(endpoint_template('a/1/c/22/subscriptions/5_6?limit=1'),
+                         'a/{accountId}/c/{clientFolderId}/subscriptions/{subscriptionId}')
+        self.assertEqual(endpoint_template('a/1/c/2/contacts/3/actions/'),
+                         'a/{accountId}/c/{clientFolderId}/contacts/{contactId}/actions/')
+
+    def test_event(self):
+        self.server.failures = 1
+        self.client.get_send(7, account_id=1, client_folder_id=2)
+        self.client.get_send(8, account_id=1, client_folder_id=2)
+        first, second = self.events
+        self.assertEqual(first.endpoint, 'a/{accountId}/c/{clientFolderId}/sends/{sendId}')
+        self.assertEqual((first.method, first.status, first.retries), ('GET', 200, 1))
+        self.assertTrue(first.bytes_in > 0)
+        self.assertTrue(first.connect_time > 0)
+        self.assertEqual(second.connect_time, 0)
+        self.assertTrue(second.total_time >= second.server_time)
+        self.assertEqual(second.error, None)
+
+    def test_observer_removed(self):
+        self.client.remove_observer(self.events.append)
+        self.client.account()
+        self.assertEqual(self.events, [])
+
+    def test_debug_logging_is_lazy(self):
+        calls = []
+        transport = self.client.transport
+        request = transport.request
+
+        def counting_request(*args, **kwargs):
+            response = request(*args, **kwargs)
+            getheaders = response.getheaders
+            response.getheaders = lambda: calls.append(1) or getheaders()
+            return response
+        transport.request = counting_request
+
+        log = logging.getLogger('icontact')
+        level = log.level
+        try:
+            log.setLevel(logging.INFO)
+            self.client.account()
+            self.assertEqual(calls, [])
+            log.setLevel(logging.DEBUG)
+            self.client.account()
+            self.assertEqual(calls, [1])
+        finally:
+            log.setLevel(level)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import threading
+import time
+import unittest
+
+from icontact.client import ExcessiveRetriesException, IContactClient
+from icontact.limiter import CircuitBreaker, CircuitOpenError, ConcurrencyLimiter
+from icontact.retry import RetryPolicy
+from icontact.testing import FakeIContactServer
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConcurrencyLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = ConcurrencyLimiter(initial=4, max_limit=6)
+        self.limiter.clock = self.clock = Clock()
+
+    def run_requests(self, count, latency=0.01, overloaded=False):
+        for i in range(count):
+            self.limiter.acquire()
+        for i in range(count):
+            self.limiter.release(latency, overloaded)
+
+    def test_additive_increase(self):
+        self.run_requests(4)
+        self.assertTrue(4.5 < self.limiter.limit < 5.0)
+        for i in range(20):
+            self.run_requests(int(self.limiter.limit))
+        self.assertEqual(self.limiter.limit, 6)
+
+    def test_no_increase_when_idle(self):
+        for i in range(10):
+            self.run_requests(1)
+        self.assertEqual(self.limiter.limit, 4)
+
+    def test_multiplicative_decrease(self):
+        self.run_requests(4, overloaded=True)
+        # Overload reported by requests that were in flight together
+        # only cuts the limit once.
+        self.assertEqual(self.limiter.limit, 2)
+        self.clock.now += 1
+        self.run_requests(2, overloaded=True)
+        self.assertEqual(self.limiter.limit, 1)
+        self.clock.now += 1
+        self.run_requests(1, overloaded=True)
+        self.assertEqual(self.limiter.limit, 1)
+        self.assertEqual(self.limiter.decreases, 3)
+
+    def test_latency_spike(self):
+        self.run_requests(4, latency=0.1)
+        self.run_requests(1, latency=0.15)
+        self.assertEqual(self.limiter.decreases, 0)
+        self.run_requests(1, latency=0.5)
+        self.assertEqual(self.limiter.latency_spikes, 1)
+        self.assertEqual(self.limiter.decreases, 1)
+
+    def test_waits_for_limit(self):
+        limiter = ConcurrencyLimiter(initial=2)
+        limiter.acquire()
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def third():
+            limiter.acquire()
+            acquired.set()
+        thread = threading.Thread(target=third)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.01)
+        thread.join(1)
+        self.assertTrue(acquired.isSet())
+        self.assertEqual(limiter.stats()['waits'], 1)
+        self.assertEqual(limiter.in_flight, 2)
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+        self.breaker.clock = self.clock = Clock()
+
+    def record_failures(self, count):
+        for i in range(count):
+            self.breaker.before()
+            self.breaker.record(False)
+
+    def test_opens_after_consecutive_failures(self):
+        self.record_failures(2)
+        self.breaker.before()
+        self.breaker.record(True)
+        self.record_failures(2)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.record_failures(1)
+        self.assertEqual(self.breaker.state, 'open')
+        try:
+            self.breaker.before()
+        except CircuitOpenError as e:
+            self.assertEqual(e.retry_in, 10)
+        else:
+            self.fail('circuit should be open')
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_half_open(self):
+        self.record_failures(3)
+        self.clock.now += 10
+        self.breaker.before()
+        self.assertEqual(self.breaker.state, 'half-open')
+        # Only one trial request at a time.
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertRaises(CircuitOpenError, self.breaker.before)
+        self.clock.now += 10
+        self.breaker.before()
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.before()
+        self.assertEqual(self.breaker.opened, 2)
+
+
+class ClientOverloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(contacts=5, lists=1)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000',
+                                     retry_policy=RetryPolicy(base_delay=0.001),
+                                     max_retry_count=2, concurrency_limiter=True,
+                                     circuit_breaker=CircuitBreaker(failure_threshold=3,
+                                                                    reset_timeout=0.2))
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def test_throttling_reduces_limit(self):
+        limiter = self.client.concurrency_limiter
+        self.server.inject(503, count=1, retry_after='0')
+        self.client.lists()
+        self.assertEqual(limiter.decreases, 1)
+        # Halved to 2, then raised by 1/2 by the successful retry.
+        self.assertEqual(limiter.limit, 2.5)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(self.client.circuit_breaker.state, 'closed')
+
+    def test_throttling_does_not_open_circuit(self):
+        client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                account_id='1000', client_folder_id='2000',
+                                retry_policy=RetryPolicy(base_delay=0.001),
+                                concurrency_limiter=True, circuit_breaker=True)
+        try:
+            self.server.inject(503, count=5, retry_after='0')
+            self.assertEqual(len(client.lists().lists), 1)
+            self.assertEqual(client.retry_count, 5)
+            self.assertEqual(client.circuit_breaker.stats()['opened'], 0)
+            self.assertEqual(client.circuit_breaker.state, 'closed')
+            self.assertTrue(client.concurrency_limiter.decreases >= 1)
+        finally:
+            client.transport.clear()
+
+    def test_circuit_opens_and_recovers(self):
+        self.server.inject(502, count=3)
+        self.assertRaises(ExcessiveRetriesException, self.client.lists)
+        self.assertEqual(self.client.circuit_breaker.state, 'open')
+        requests = self.server.requests
+        self.assertRaises(CircuitOpenError, self.client.lists)
+        self.assertEqual(self.server.requests, requests)
+        time.sleep(0.2)
+        self.assertEqual(len(self.client.lists().lists), 1)
+        self.assertEqual(self.client.circuit_breaker.state, 'closed')
+        self.assertEqual(self.client.concurrency_limiter.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
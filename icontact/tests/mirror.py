@@ -0,0 +1,87 @@
+import unittest
+
+from icontact.client import IContactClient, IContactServerError
+from icontact.mirror import Mirror
+from icontact.retry import RetryPolicy
+from icontact.testing import FakeIContactServer
+
+CONTACTS = 'a/{accountId}/c/{clientFolderId}/contacts/'
+
+
+class MirrorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.api.now = lambda: '2011-01-01 00:00:00'
+        self.server.populate(contacts=25, lists=2)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     retry_policy=RetryPolicy(base_delay=0))
+        self.mirror = Mirror(self.client, ':memory:', page_size=10)
+
+    def tearDown(self):
+        self.mirror.close()
+        self.client.transport.clear()
+        self.server.stop()
+
+    def test_full_sync_and_reads(self):
+        self.assertEqual(self.mirror.sync(), dict(lists=2, contacts=25, subscriptions=25))
+        contact_id = self.mirror.contact_id('USER3@example.com')
+        self.assertEqual(contact_id, self.server.api.emails['user3@example.com'])
+        self.assertEqual(self.mirror.find_contact('user3@example.com').firstName, 'First3')
+        self.assertEqual(self.mirror.contact(contact_id).lastName, 'Last3')
+        self.assertEqual(self.mirror.contact_id('nobody@example.com'), None)
+        list_ids = [l.listId for l in self.mirror.lists()]
+        self.assertEqual(len(self.mirror.list_members(list_ids[0])), 13)
+        self.assertEqual(len(self.mirror.list_members(list_ids[1], status='pending')), 0)
+        self.assertEqual([s.listId for s in self.mirror.subscriptions(contact_id)],
+                         [list_ids[1]])
+        self.assertEqual(self.mirror.checkpoint('contacts')['high_water'],
+                         '2011-01-01 00:00:00')
+
+    def test_incremental_sync(self):
+        self.mirror.sync()
+        self.mirror.overlap = self.mirror.overlap * 0
+        requests = self.server.counts[('GET', CONTACTS)]
+        self.server.api.now = lambda: '2011-02-01 00:00:00'
+        self.server.populate(contacts=3)
+        self.assertEqual(self.mirror.sync()['contacts'], 3)
+        self.assertEqual(self.server.counts[('GET', CONTACTS)], requests + 1)
+        self.assertTrue(self.mirror.contact_id('user27@example.com'))
+
+    def test_full_sync_removes_deleted(self):
+        self.mirror.sync()
+        self.client.delete_contact(self.mirror.contact_id('user4@example.com'))
+        self.mirror.sync()
+        self.assertTrue(self.mirror.contact_id('user4@example.com'))
+        self.mirror.sync(full=True)
+        self.assertEqual(self.mirror.contact_id('user4@example.com'), None)
+
+    def test_resume_interrupted_sync(self):
+        self.client.max_retry_count = 0
+        original = self.mirror._store
+        stored = []
+
+        def failing_store(resource, records, generation):
+            original(resource, records, generation)
+            stored.append(resource)
+            if resource == 'contacts' and len(stored) == 2:
+                self.server.inject(500)
+        self.mirror._store = failing_store
+        self.assertRaises(IContactServerError, self.mirror.sync)
+        self.assertEqual(self.mirror.checkpoint('contacts')['offset'], 10)
+        requests = self.server.counts[('GET', CONTACTS)]
+        self.assertEqual(self.mirror.sync()['contacts'], 15)
+        self.assertEqual(self.server.counts[('GET', CONTACTS)], requests + 2)
+        self.assertEqual(self.mirror.checkpoint('contacts')['offset'], None)
+        self.assertEqual(len(self.mirror._query('SELECT * FROM contacts')), 25)
+
+    def test_add_contacts(self):
+        self.mirror.sync()
+        result = self.client.create_contacts([dict(email='new@example.com')])
+        self.mirror.add_contacts(result.results)
+        self.assertEqual(self.mirror.contact_id('new@example.com'),
+                         result[0].result.contactId)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import threading
+import cgi
+import urlparse
+import BaseHTTPServer
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+from icontact.client import IContactClient
+from icontact.tests.executor import ThreadingServer
+
+TOTAL = 23
+
+
+class PagingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path, query = urlparse.urlparse(self.path)[2], urlparse.urlparse(self.path)[4]
+        query = dict(cgi.parse_qsl(query))
+        limit, offset = int(query.get('limit', 20)), int(query.get('offset', 0))
+        collection = path.rstrip('/').split('/')[-1]
+        records = [dict(id=str(i)) for i in range(offset, min(offset + limit, TOTAL))]
+        self.server.pages.append((collection, offset, limit))
+        body = simplejson.dumps({collection: records, 'total': TOTAL})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PagingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingServer(('127.0.0.1', 0), PagingHandler)
+        self.server.pages = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+        self.client = IContactClient('key', 'user', 'password', url=url,
+                                     account_id=1, client_folder_id=2)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_iter_contacts(self):
+        ids = [c.id for c in self.client.iter_contacts({'status': 'normal'}, page_size=10)]
+        self.assertEqual(ids, [str(i) for i in range(TOTAL)])
+        self.assertEqual(self.server.pages, [('contacts', 0, 10), ('contacts', 10, 10),
+                                             ('contacts', 20, 10)])
+
+    def test_iter_stops_at_total(self):
+        ids = [s.id for s in self.client.iter_subscriptions(page_size=23)]
+        self.assertEqual(len(ids), TOTAL)
+        self.assertEqual(len(self.server.pages), 1)
+
+    def test_prefetch(self):
+        records = self.client.iter_contact_history(5, filters={'offset': 3},
+                                                   page_size=5, prefetch=True)
+        first = records.next()
+        self.assertEqual(first.id, '3')
+        ids = [first.id] + [r.id for r in records]
+        self.assertEqual(ids, [str(i) for i in range(3, TOTAL)])
+        self.assertEqual(self.server.pages[0], ('actions', 3, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import pickle
+
+from icontact.client import json_to_obj
+from icontact.records import Object, CompactRecord
+
+
+def page():
+    return dict(total=2, contacts=[dict(contactId='1', email='a@example.com'),
+                                   dict(contactId='2', email='b@example.com')],
+                list=dict(listId='5', tags=[dict(name='x')]))
+
+
+class RecordsTestCase(unittest.TestCase):
+
+    def test_attribute_access(self):
+        result = json_to_obj(page())
+        self.assertEqual(result.contacts[1].email, 'b@example.com')
+        self.assertEqual(result.list.tags[0].name, 'x')
+        self.assertEqual(len(result.contacts), 2)
+        self.assertEqual([c.contactId for c in result.contacts], ['1', '2'])
+        self.assertRaises(AttributeError, getattr, result, 'missing')
+
+    def test_lazy(self):
+        data = page()
+        result = json_to_obj(data)
+        self.assertTrue(result._attrs is None)
+        result.contacts[0].email
+        self.assertTrue(isinstance(data['contacts'][0], dict))
+
+    def test_compact(self):
+        result = json_to_obj(page(), compact=True)
+        contact = result.contacts[0]
+        self.assertTrue(isinstance(contact, CompactRecord))
+        self.assertEqual(contact.email, 'a@example.com')
+        self.assertTrue(type(contact) is type(result.contacts[1]))
+        self.assertTrue(isinstance(result.list, Object))
+
+    def test_pickle(self):
+        for compact in (False, True):
+            result = pickle.loads(pickle.dumps(json_to_obj(page(), compact), 2))
+            self.assertEqual(result.contacts[1].contactId, '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import threading
+import BaseHTTPServer
+
+from icontact.client import IContactClient, ExcessiveRetriesException
+from icontact.retry import RetryPolicy, RetryBudget
+from icontact.testing import FakeIContactServer
+
+
+class ThrottlingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    failures = 0
+
+    def do_GET(self):
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            status = getattr(self.server, 'status', 503)
+            body = '{"errors": ["Rate limit exceeded"]}'
+        else:
+            status, body = 200, '{"accounts": [{"accountId": "1"}]}'
+        self.server.requests += 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 503:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+        self.server.failures = 0
+        self.server.requests = 0
+        self.server.status = 503
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_client(self, **kwargs):
+        policy = RetryPolicy(base_delay=0, **kwargs)
+        return IContactClient('key', 'user', 'password', url=self.url,
+                              max_retry_count=3, retry_policy=policy)
+
+    def test_retries_503(self):
+        self.server.failures = 2
+        client = self.get_client()
+        self.assertEqual(client.account().accountId, '1')
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(client.retry_policy.stats()['retries'], 2)
+
+    def test_max_retry_count(self):
+        self.server.failures = 10
+        client = self.get_client()
+        self.assertRaises(ExcessiveRetriesException, client.account)
+        self.assertEqual(self.server.requests, 4)
+
+    def test_budget_exhausted(self):
+        self.server.status = 502
+        self.server.failures = 10
+        client = self.get_client(budget=RetryBudget(ratio=0, initial=1))
+        self.assertRaises(ExcessiveRetriesException, client.account)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(client.retry_policy.stats()['budget_exhausted'], 1)
+
+    def test_throttling_does_not_spend_budget(self):
+        self.server.failures = 3
+        client = self.get_client(budget=RetryBudget(ratio=0, initial=0))
+        self.assertEqual(client.account().accountId, '1')
+        self.assertEqual(client.retry_policy.stats()['retries'], 3)
+
+    def test_parse_retry_after(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.parse_retry_after('12'), 12.0)
+        self.assertEqual(policy.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertEqual(policy.parse_retry_after('soon'), None)
+        self.assertEqual(policy.backoff(0, retry_after=1000), None)
+
+
+class IdempotencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(lists=1, messages=1)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000',
+                                     retry_policy=RetryPolicy(base_delay=0))
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def create_send(self):
+        return self.client.create_send(self.server.api.messages.keys()[0],
+                                       self.server.api.lists.keys())
+
+    def test_gateway_error_on_create_not_retried(self):
+        self.server.inject(502)
+        self.assertRaises(Exception, self.create_send)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(len(self.server.api.sends), 0)
+
+    def test_throttled_create_retried(self):
+        self.server.inject(503, retry_after=0)
+        self.create_send()
+        self.assertEqual(len(self.server.api.sends), 1)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_keyed_writes_retried(self):
+        self.server.inject(502)
+        self.client.create_contact('someone@example.com')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_sustained_throttling(self):
+        # Calls slow down rather than fail while 30% of requests are
+        # rate limited.
+        self.server.throttle_rate = 0.3
+        for i in range(300):
+            self.client.search_contacts(email='user%d@example.com' % i)
+        stats = self.client.retry_policy.stats()
+        self.assertEqual(stats['budget_exhausted'], 0)
+        self.assertTrue(stats['retries'] > 60, stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import time
+import unittest
+
+from icontact.client import AsyncIContactClient, IContactClient
+from icontact.executor import TimeoutError
+from icontact.testing import FakeIContactServer
+
+SEND = ('GET', 'a/{accountId}/c/{clientFolderId}/sends/{sendId}')
+
+
+class WaitForSendsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer(send_duration=0.2).start()
+        self.server.populate(contacts=5, lists=2, messages=3)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000')
+        self.message_ids = sorted(self.server.api.messages)
+        self.list_ids = sorted(self.server.api.lists)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def send(self, message=0, delay=None):
+        options = {}
+        if delay is not None:
+            options['scheduledTime'] = time.strftime('%Y-%m-%d %H:%M:%S',
+                                                     time.localtime(time.time() + delay))
+        result = self.client.create_send(self.message_ids[message], self.list_ids, **options)
+        return result.sends[0].sendId
+
+    def test_yields_sends_as_they_finish(self):
+        late = self.send(0, delay=1)
+        early = self.send(1)
+        start = time.time()
+        items = list(self.client.wait_for_sends([late, early], timeout=10, min_interval=0.05))
+        self.assertEqual([(item.index, item.row) for item in items], [(1, early), (0, late)])
+        self.assertEqual([item.result.status for item in items], ['sent', 'sent'])
+        self.assertTrue(time.time() - start >= 0.2)
+
+    def test_scheduled_send_is_not_polled_until_due(self):
+        send_id = self.send(delay=1.5)
+        items = list(self.client.wait_for_sends([send_id], timeout=10, min_interval=0.05))
+        self.assertEqual(items[0].result.status, 'sent')
+        # One look while pending, then a few while sending around 1.5s.
+        self.assertTrue(self.server.counts[SEND] <= 6, self.server.counts[SEND])
+
+    def test_finished_sends_are_not_polled_again(self):
+        send_ids = [self.send(0, delay=-60), self.send(1, delay=-60)]
+        items = list(self.client.wait_for_sends(send_ids, timeout=10, min_interval=0.05))
+        self.assertEqual(sorted(item.row for item in items), sorted(send_ids))
+        self.assertEqual(self.server.counts[SEND], 2)
+
+    def test_backoff_grows_to_max_interval(self):
+        self.server.api.send_duration = 1.0
+        send_id = self.send()
+        list(self.client.wait_for_sends([send_id], timeout=10, min_interval=0.05,
+                                        max_interval=0.2, backoff=2))
+        # 0.05, 0.1 and then 0.2 seconds apart for the rest of the second.
+        self.assertTrue(5 <= self.server.counts[SEND] <= 9, self.server.counts[SEND])
+
+    def test_deleted_send_is_an_error(self):
+        send_id = self.send()
+        self.client.delete_send(send_id)
+        items = list(self.client.wait_for_sends([send_id, '999'], timeout=10))
+        self.assertEqual(len(items), 2)
+        for item in items:
+            self.assertTrue(item.result is None)
+            self.assertTrue(item.error is not None)
+
+    def test_timeout(self):
+        send_id = self.send(delay=60)
+        start = time.time()
+        self.assertRaises(TimeoutError, list,
+                          self.client.wait_for_sends([send_id], timeout=0.3, min_interval=0.05))
+        self.assertTrue(time.time() - start < 2)
+
+    def test_async(self):
+        client = AsyncIContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000')
+        try:
+            send_ids = [self.send(0), self.send(1, delay=60)]
+            futures = client.wait_for_sends(send_ids, timeout=0.6, min_interval=0.05)
+            self.assertEqual(futures[0].result(5).status, 'sent')
+            self.assertRaises(TimeoutError, futures[1].result, 5)
+        finally:
+            client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
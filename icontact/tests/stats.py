@@ -0,0 +1,108 @@
+import unittest
+import threading
+import BaseHTTPServer
+from xml.etree import ElementTree
+
+from dateutil.parser import parse
+
+from icontact.client import IContactClient, parse_datetime
+from icontact.testing import FakeIContactServer
+from icontact.tests.executor import ThreadingServer
+
+STATS = ('<response xmlns:xlink="http://www.w3.org/1999/xlink"><stats>'
+         '<released count="3" percent="100" xlink:href="/r"/>'
+         '<opens count="2" percent="66.7" unique="2" xlink:href="/o">'
+         '<contact email="a@example.com" name="A" xlink:href="/c/1">'
+         '<open date="2009-03-02T11:32:10-05:00"/><open date="2009-03-03T09:00:00-05:00"/>'
+         '</contact>'
+         '<contact email="b@example.com" name="B" xlink:href="/c/2">'
+         '<open date="2009-03-02 12:00:00"/></contact>'
+         '</opens><complaints count="1" percent="33.3"/>'
+         '</stats></response>')
+
+
+class StatsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(STATS)))
+        self.end_headers()
+        self.wfile.write(STATS)
+
+    def log_message(self, *args):
+        pass
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def test_parse_datetime(self):
+        for value in ('2009-03-02T11:32:10-05:00', '2009-03-02T11:32:10+0530',
+                      '2009-03-02T11:32:10Z', '2009-03-02 11:32:10',
+                      '2009-03-02T11:32:10.25-05:00', 'March 2, 2009 11:32'):
+            self.assertEqual(parse_datetime(value), parse(value))
+            self.assertEqual(parse_datetime(value).utcoffset(), parse(value).utcoffset())
+
+    def test_parse_stats(self):
+        client = IContactClient('key', 'user', 'password')
+        stats = client._parse_stats(ElementTree.fromstring(STATS).find('stats'))
+        self.assertEqual(stats['complaints']['count'], 1)
+        self.assertEqual([c['email'] for c in stats['contacts']],
+                         ['a@example.com', 'b@example.com'])
+
+    def test_message_delivery_details(self):
+        server = ThreadingServer(('127.0.0.1', 0), StatsHandler)
+        server.paths = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        try:
+            url = 'http://127.0.0.1:%d/icp/' % server.server_address[1]
+            client = IContactClient('key', 'user', 'password', url=url,
+                                    account_id=1, client_folder_id=2)
+            stats = client.message_delivery_details(9, 'opens')
+            self.assertEqual(server.paths, ['/icp/a/1/c/2/messages/9/stats/opens'])
+            self.assertEqual(stats['opens'], dict(count=2, percent=66.7, unique=2, href='/o'))
+            self.assertEqual(stats['bounces'], None)
+            self.assertEqual(stats['complaints']['count'], 1)
+            first, second = stats['contacts']
+            self.assertEqual((first.email, first.name, first.href), ('a@example.com', 'A', '/c/1'))
+            self.assertEqual(first.dates, (parse('2009-03-02T11:32:10-05:00'),
+                                           parse('2009-03-03T09:00:00-05:00')))
+            self.assertEqual(len(second.dates), 1)
+            self.assertEqual(client.message_stats(9)['released']['count'], 3)
+            client.transport.clear()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_released_dates(self):
+        # Released recipients' dates are <released date="..."/> elements,
+        # which must not be taken for the released summary.
+        server = FakeIContactServer(stats_recipients=3).start()
+        server.populate(messages=1)
+        try:
+            client = IContactClient('key', 'user', 'password', url=server.url,
+                                    account_id='1000', client_folder_id='2000')
+            message_id = server.api.messages.keys()[0]
+            stats = client.message_delivery_details(message_id, 'released')
+            document = ElementTree.fromstring(server.api.stats(
+                server.api.messages[message_id], 'released'))
+            parsed = client._parse_stats(document.find('stats'))
+            for name in client.STATS_SUMMARIES:
+                self.assertEqual(stats[name], parsed[name])
+            self.assertEqual([(c.email, c.dates) for c in stats['contacts']],
+                             [(c.email, c.dates) for c in parsed['contacts']])
+            self.assertEqual(stats['released']['count'], 3)
+            self.assertEqual([len(c.dates) for c in stats['contacts']], [1, 1, 1])
+            self.assertEqual(stats['contacts'][2].dates[0],
+                             parse('2009-03-02T11:00:02-05:00'))
+            client.transport.clear()
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import threading
+import BaseHTTPServer
+import StringIO
+
+try:
+    import simplejson
+except ImportError:
+    import json as simplejson
+
+from icontact.client import IContactClient
+from icontact.streaming import iter_json_items, iter_xml_elements
+from icontact.tests.executor import ThreadingServer
+
+CONTACTS = [dict(contactId=str(i), email=u'user%d@example.com' % i, bounceCount=i * 1001)
+            for i in range(50)]
+
+
+class ContactsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = simplejson.dumps(dict(contacts=CONTACTS, total=len(CONTACTS)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StreamingTestCase(unittest.TestCase):
+
+    def test_json_items_across_chunks(self):
+        document = simplejson.dumps(dict(warnings=['w'], contacts=CONTACTS, total=123456,
+                                         lists=[{'listId': '1'}]), indent=1)
+        for chunk_size in (1, 7, 4096):
+            meta = {}
+            items = list(iter_json_items(StringIO.StringIO(document), ['contacts', 'lists'],
+                                         meta, chunk_size=chunk_size))
+            self.assertEqual([item for key, item in items if key == 'contacts'], CONTACTS)
+            self.assertEqual(items[-1], ('lists', {'listId': '1'}))
+            self.assertEqual(meta, dict(warnings=['w'], total=123456))
+
+    def test_xml_elements(self):
+        document = ('<response><stats><opens><contact email="a"/><contact email="b"/>'
+                    '</opens></stats></response>')
+        emails = [e.get('email') for e in iter_xml_elements(StringIO.StringIO(document),
+                                                            ['contact'])]
+        self.assertEqual(emails, ['a', 'b'])
+
+    def test_xml_elements_by_parent(self):
+        document = ('<stats><released count="2"><contact email="a"><released date="1"/>'
+                    '</contact></released></stats>')
+        elements = iter_xml_elements(StringIO.StringIO(document),
+                                     dict(contact=('released',), released=('stats',)))
+        contact = elements.next()
+        self.assertEqual([d.get('date') for d in contact], ['1'])
+        self.assertEqual(elements.next().get('count'), '2')
+        self.assertRaises(StopIteration, elements.next)
+
+    def test_stream_contacts(self):
+        server = ThreadingServer(('127.0.0.1', 0), ContactsHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        try:
+            url = 'http://127.0.0.1:%d/icp/' % server.server_address[1]
+            client = IContactClient('key', 'user', 'password', url=url,
+                                    account_id=1, client_folder_id=2)
+            emails = [c.email for c in client.stream_contacts(limit='1000')]
+            self.assertEqual(emails, [c['email'] for c in CONTACTS])
+            raw = list(client.stream_contacts(raw=True))
+            self.assertEqual(raw, CONTACTS)
+            self.assertEqual(client.transport.stats()['created'], 1)
+            client.transport.clear()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
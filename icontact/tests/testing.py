@@ -0,0 +1,79 @@
+import unittest
+
+from icontact.client import IContactClient, IContactServerError
+from icontact.retry import RetryPolicy
+from icontact.testing import FakeIContactServer
+
+
+class FakeServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(contacts=30, lists=2, messages=1)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     retry_policy=RetryPolicy(base_delay=0))
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def test_discovery_and_search(self):
+        contact = self.client.search_contacts(email='USER7@example.com').contacts[0]
+        self.assertEqual(self.client.account_id, '1000')
+        self.assertEqual(self.client.client_folder_id, '2000')
+        self.assertEqual(contact.firstName, 'First7')
+        result = self.client.search_contacts(firstName='First2*', limit='100')
+        self.assertEqual(int(result.total), 11)
+
+    def test_contacts_and_subscriptions(self):
+        created = self.client.create_contacts([dict(email='new%d@example.com' % i)
+                                               for i in range(5)], chunk_size=2)
+        self.assertEqual(created.errors, [])
+        list_ids = [l.listId for l in self.client.lists().lists]
+        contact_ids = [item.result.contactId for item in created]
+        self.client.create_subscriptions([(c, list_ids[0]) for c in contact_ids])
+        moved = self.client.move_subscribers([(list_ids[0], c, list_ids[1])
+                                              for c in contact_ids])
+        self.assertEqual(moved.errors, [])
+        members = [s.contactId for s in self.client.iter_subscriptions(
+            filters=dict(listId=list_ids[1]), page_size=7)]
+        self.assertEqual(len(members), 20)
+        self.assertTrue(set(contact_ids) <= set(members))
+
+        self.client.delete_contact(contact_ids[0])
+        self.assertEqual(self.client.search_contacts(email='new0@example.com').contacts, [])
+        self.assertRaises(IContactServerError, self.client.delete_contact, contact_ids[0])
+
+    def test_iter_contacts(self):
+        emails = [c.email for c in self.client.iter_contacts(page_size=8)]
+        self.assertEqual(len(emails), 30)
+        self.assertEqual(self.server.counts[('GET', 'a/{accountId}/c/{clientFolderId}/contacts/')],
+                         4)
+
+    def test_stats(self):
+        self.server.api.stats_recipients = 12
+        message_id = self.client.messages().messages[0].messageId
+        stats = self.client.message_delivery_details(message_id, 'opens')
+        self.assertEqual(stats['released']['count'], 12)
+        self.assertEqual(len(stats['contacts']), stats['opens']['count'])
+
+    def test_injected_failures(self):
+        self.server.inject(503, count=2, retry_after=0)
+        self.assertEqual(self.client.account().accountId, '1000')
+        self.assertEqual(self.client.retry_count, 2)
+        self.server.inject(404)
+        self.assertRaises(IContactServerError, self.client.account)
+
+    def test_error_rate(self):
+        self.server.error_rate = 1.0
+        self.client.max_retry_count = 0
+        try:
+            self.client.account()
+        except IContactServerError as e:
+            self.assertEqual(e.http_status, 500)
+        else:
+            self.fail('Expected a server error')
+
+
+if __name__ == '__main__':
+    unittest.main()
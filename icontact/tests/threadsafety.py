@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from icontact.client import IContactClient
+from icontact.instrumentation import endpoint_template
+from icontact.retry import RetryPolicy
+from icontact.testing import FakeIContactServer
+
+THREADS = 64
+CALLS = 15
+
+
+class ThreadSafetyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer(jitter=0.002, throttle_rate=0.05).start()
+        self.server.populate(contacts=200, lists=3)
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     retry_policy=RetryPolicy(base_delay=0.001))
+        self.client.transport.grow(THREADS)
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+
+    def run_threads(self, target):
+        errors = []
+
+        def run(n):
+            try:
+                target(n)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+        self.assertEqual(errors, [])
+
+    def test_discovery_happens_once(self):
+        def lists(n):
+            self.assertEqual(len(self.client.lists().lists), 3)
+        self.server.throttle_rate = 0
+        self.server.latency = 0.05
+        # Without coalescing, so that only the discovery lock can prevent
+        # duplicate lookups.
+        self.client.coalescer = None
+        self.run_threads(lists)
+        self.assertEqual(self.server.counts[('GET', endpoint_template('a'))], 1)
+        self.assertEqual(self.server.counts[('GET', endpoint_template('a/1000/c'))], 1)
+        self.assertEqual(self.client.client_folder_id, '2000')
+
+    def test_concurrent_calls(self):
+        last_event = threading.local()
+        self.client.add_observer(lambda event: setattr(last_event, 'event', event))
+
+        def check():
+            """The thread's retry_count is that of its own last call."""
+            event = getattr(last_event, 'event', None)
+            self.assertEqual(self.client.retry_count, event and event.retries or 0)
+            last_event.event = None
+
+        def work(n):
+            for i in range(CALLS):
+                email = 'user%d@example.com' % ((n * CALLS + i) % 200)
+                contacts = self.client.search_contacts(email=email).contacts
+                self.assertEqual([c.email for c in contacts], [email])
+                check()
+                created = self.client.create_contact('thread%d-%d@example.com' % (n, i),
+                                                     firstName='Thread%d' % n)
+                check()
+                self.assertEqual(self.client.search_contacts(
+                    email='thread%d-%d@example.com' % (n, i)).contacts[0].firstName,
+                    'Thread%d' % n)
+                check()
+                self.assertEqual(len(self.client.lists().lists), 3)
+                check()
+        self.run_threads(work)
+        self.assertEqual(len(self.server.api.contacts), 200 + THREADS * CALLS)
+        self.assertTrue(self.client.retry_policy.retries > 0)
+        stats = self.client.transport.stats()
+        self.assertTrue(stats['created'] <= THREADS * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
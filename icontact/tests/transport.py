@@ -0,0 +1,141 @@
+import httplib
+import socket
+import time
+import unittest
+import threading
+import BaseHTTPServer
+
+from icontact.transport import HTTPTransport, RequestNotSentError
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = '{"path": "%s"}' % self.path
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class DroppingHandler(KeepAliveHandler):
+    """
+    Answers the first request on each connection, and then reads the next
+    one and either hangs up without a response or stalls.
+    """
+    answered = False
+
+    def respond(self):
+        self.server.received.append(self.command)
+        if not self.answered:
+            self.answered = True
+            return KeepAliveHandler.do_GET(self)
+        if self.server.stall:
+            time.sleep(self.server.stall)
+        self.close_connection = 1
+
+    do_GET = do_POST = respond
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self):
+        transport = HTTPTransport(maxsize=2)
+        for i in range(3):
+            response = transport.request('GET', self.url + 'a/?n=%d' % i)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.read(), '{"path": "/icp/a/?n=%d"}' % i)
+        stats = transport.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 2)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_unread_response_is_not_reused(self):
+        transport = HTTPTransport()
+        transport.request('POST', self.url + 'a/', '{}').close()
+        transport.request('GET', self.url + 'a/').read()
+        self.assertEqual(transport.stats()['created'], 2)
+
+    def test_stale_connection_replaced(self):
+        transport = HTTPTransport(idle_timeout=0)
+        transport.request('GET', self.url + 'a/').read()
+        transport.request('GET', self.url + 'a/').read()
+        stats = transport.stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['discarded'], 1)
+
+
+class QuietServer(BaseHTTPServer.HTTPServer):
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class ResendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = QuietServer(('127.0.0.1', 0), DroppingHandler)
+        self.server.received = []
+        self.server.stall = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/icp/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_resent_after_hang_up(self):
+        transport = HTTPTransport()
+        transport.request('GET', self.url + 'a/').read()
+        self.assertEqual(transport.request('GET', self.url + 'a/').status, 200)
+        self.assertEqual(self.server.received, ['GET'] * 3)
+
+    def test_post_not_resent_after_hang_up(self):
+        transport = HTTPTransport()
+        transport.request('GET', self.url + 'a/').read()
+        self.assertRaises(httplib.BadStatusLine, transport.request, 'POST',
+                          self.url + 'a/', '{}')
+        self.assertEqual(self.server.received, ['GET', 'POST'])
+        transport.request('GET', self.url + 'a/').read()
+        transport.request('POST', self.url + 'a/', '{}', idempotent=True).read()
+        self.assertEqual(self.server.received, ['GET', 'POST', 'GET', 'POST', 'POST'])
+
+    def test_timeout_not_resent(self):
+        self.server.stall = 0.5
+        transport = HTTPTransport(timeout=0.2)
+        transport.request('GET', self.url + 'a/').read()
+        self.assertRaises(socket.timeout, transport.request, 'GET', self.url + 'a/')
+        time.sleep(0.5)
+        self.assertEqual(self.server.received, ['GET', 'GET'])
+
+    def test_connection_refused_is_not_sent(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/icp/a/' % listener.getsockname()[1]
+        listener.close()
+        transport = HTTPTransport()
+        self.assertRaises(RequestNotSentError, transport.request, 'POST', url, '{}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from icontact.client import IContactClient
+from icontact.fingerprints import ContactFingerprints
+from icontact.limiter import CircuitBreaker
+from icontact.retry import RetryPolicy
+from icontact.testing import FakeIContactServer
+from icontact.writebehind import WriteBehindQueue
+
+CONTACTS = ('POST', 'a/{accountId}/c/{clientFolderId}/contacts/')
+SUBSCRIPTIONS = ('POST', 'a/{accountId}/c/{clientFolderId}/subscriptions/')
+
+
+class WriteBehindTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeIContactServer().start()
+        self.server.populate(contacts=5, lists=1)
+        self.list_id = self.server.api.lists.keys()[0]
+        self.client = IContactClient('key', 'user', 'password', url=self.server.url,
+                                     account_id='1000', client_folder_id='2000',
+                                     max_retry_count=1,
+                                     retry_policy=RetryPolicy(base_delay=0))
+        self.directory = tempfile.mkdtemp()
+        self.journal = os.path.join(self.directory, 'journal')
+        self.failures = []
+
+    def tearDown(self):
+        self.client.transport.clear()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def queue(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        return WriteBehindQueue(self.client, on_failure=lambda *args: self.failures.append(args),
+                                **kwargs)
+
+    def test_coalescing_and_order(self):
+        queue = self.queue()
+        queue.create_contact('Signup@example.com', firstName='A')
+        queue.create_subscription('signup@example.com', self.list_id)
+        queue.create_contact('signup@example.com', lastName='B')
+        contact_id = self.server.api.emails['user1@example.com']
+        queue.update_contact(contact_id, firstName='X')
+        queue.update_contact(contact_id, firstName='Y', city='Cary')
+        queue.create_contact('bad-address', firstName='C')
+        self.assertEqual(queue.depth(), 4)
+        self.assertEqual(self.server.requests, 0)
+        queue.flush()
+
+        self.assertEqual(self.server.counts[CONTACTS], 2)
+        self.assertEqual(self.server.counts[SUBSCRIPTIONS], 1)
+        created = self.server.api.contacts[self.server.api.emails['signup@example.com']]
+        self.assertEqual((created['firstName'], created['lastName']), ('A', 'B'))
+        updated = self.server.api.contacts[contact_id]
+        self.assertEqual((updated['firstName'], updated['city']), ('Y', 'Cary'))
+        self.assertTrue('%s_%s' % (self.list_id, created['contactId'])
+                        in self.server.api.subscriptions)
+        self.assertEqual([f[:2] for f in self.failures],
+                         [('create_contact', dict(email='bad-address', firstName='C'))])
+        stats = queue.stats()
+        self.assertEqual((stats['enqueued'], stats['coalesced'], stats['sent'], stats['failed'],
+                          stats['depth']), (6, 2, 3, 1, 0))
+        queue.close()
+
+    def test_unchanged_updates_with_fingerprints(self):
+        self.client.fingerprints = ContactFingerprints()
+        queue = self.queue()
+        contact_ids = sorted(self.server.api.contacts, key=int)[:2]
+        queue.update_contact(contact_ids[0], city='Cary')
+        queue.flush()
+        queue.update_contact(contact_ids[0], city='Cary')
+        queue.update_contact(contact_ids[1], city='Apex')
+        queue.flush()
+        self.assertEqual(self.server.counts[CONTACTS], 2)
+        self.assertEqual(self.server.api.contacts[contact_ids[1]]['city'], 'Apex')
+        stats = queue.stats()
+        self.assertEqual((stats['sent'], stats['requeued'], stats['depth']), (3, 0, 0))
+        queue.flush()
+        self.assertEqual(self.server.counts[CONTACTS], 2)
+        queue.close()
+
+    def test_backs_off_while_circuit_is_open(self):
+        self.client.circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.5)
+        flushed = []
+        queue = self.queue(batch_size=5, flush_interval=0.1, on_flush=flushed.append)
+        self.server.inject(500)
+        for i in range(5):
+            queue.create_contact('held%d@example.com' % i)
+        time.sleep(0.3)
+        # The 500 is requeued rather than reported, and the queue waits
+        # for the circuit to close instead of flushing again at once.
+        self.assertEqual(self.failures, [])
+        self.assertTrue(len(flushed) <= 3, len(flushed))
+        deadline = time.time() + 5
+        while queue.stats()['sent'] < 5 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(queue.stats()['sent'], 5)
+        self.assertTrue(queue.stats()['requeued'] <= 15, queue.stats())
+        queue.close()
+
+    def test_background_flush(self):
+        flushed = []
+        queue = self.queue(batch_size=3, on_flush=flushed.append)
+        for i in range(3):
+            queue.create_contact('new%d@example.com' % i)
+        deadline = time.time() + 5
+        while not flushed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(flushed[0]['sent'], 3)
+        queue.close()
+
+        queue = self.queue(flush_interval=0.05)
+        queue.create_contact('later@example.com')
+        time.sleep(0.5)
+        self.assertTrue('later@example.com' in self.server.api.emails)
+        queue.close()
+
+    def test_journal(self):
+        queue = self.queue(journal=self.journal)
+        queue.create_contact('kept@example.com', firstName='K')
+        self.server.inject(503, count=2, retry_after=0)
+        queue.flush()
+        self.assertEqual(queue.stats()['requeued'], 1)
+        self.assertEqual(self.failures, [])
+        # Simulate a crash: the queued change is only in the journal.
+        queue._closed = True
+        self.assertEqual(len(open(self.journal).readlines()), 1)
+
+        queue = self.queue(journal=self.journal)
+        self.assertEqual(queue.depth(), 1)
+        queue.close()
+        self.assertEqual(self.server.api.contacts[
+            self.server.api.emails['kept@example.com']]['firstName'], 'K')
+        self.assertEqual(open(self.journal).read(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,427 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+HTTP transport for the iContact API client.
+
+All requests made by `IContactClient` go through an `HTTPTransport`, which
+keeps a bounded pool of keep-alive connections for each host so that
+consecutive API calls reuse an open (and already TLS-negotiated) socket
+instead of paying for a new handshake every time.
+"""
+import httplib
+import select
+import socket
+import ssl
+import sys
+import threading
+import time
+import urlparse
+
+from icontact.compression import decoder_for
+
+# Methods that may be sent twice without changing the result.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+
+class RequestNotSentError(socket.error):
+    """
+    A connection failed before the whole request had been written, so the
+    server cannot have acted on it and it is safe to send again, whatever
+    its method.
+    """
+
+
+class TimedHTTPConnection(httplib.HTTPConnection):
+    """An HTTPConnection that records how long it took to connect."""
+    connect_time = 0.0
+    tls_time = 0.0
+
+    def connect(self):
+        start = time.time()
+        httplib.HTTPConnection.connect(self)
+        self.connect_time = time.time() - start
+
+
+class TimedHTTPSConnection(httplib.HTTPSConnection):
+    """
+    An HTTPSConnection that records the time taken by the TCP connect and
+    by the TLS handshake separately.
+    """
+    connect_time = 0.0
+    tls_time = 0.0
+
+    def connect(self):
+        start = time.time()
+        sock = socket.create_connection((self.host, self.port), self.timeout,
+                                        self.source_address)
+        self.connect_time = time.time() - start
+        start = time.time()
+        context = getattr(self, '_context', None)
+        if context is not None:
+            self.sock = context.wrap_socket(sock, server_hostname=self.host)
+        else:
+            self.sock = ssl.wrap_socket(sock, self.key_file, self.cert_file)
+        self.tls_time = time.time() - start
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of idle keep-alive connections to a single host.
+
+    At most `maxsize` idle connections are kept. When every pooled
+    connection is busy a new one is opened; if the pool is already full
+    when that connection is released it is closed rather than kept.
+    Idle connections older than `idle_timeout` seconds, or whose socket
+    has been closed by the server, are discarded instead of reused.
+    """
+
+    def __init__(self, scheme, host, port=None, maxsize=4, idle_timeout=60.0,
+                 timeout=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            cls = TimedHTTPSConnection
+        else:
+            cls = TimedHTTPConnection
+        if self.timeout is None:
+            return cls(self.host, self.port)
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _is_stale(self, conn, idle_since):
+        """
+        Returns True if an idle connection should not be reused: it has
+        been idle too long, or the server has closed (or written to) the
+        socket while it was sitting in the pool.
+        """
+        if self.idle_timeout is not None and \
+               time.time() - idle_since > self.idle_timeout:
+            return True
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            readable = select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return True
+        # An idle keep-alive socket should have nothing to read; if it is
+        # readable the peer has either sent EOF or something unexpected.
+        return bool(readable)
+
+    def get(self):
+        """
+        Returns a tuple of (connection, reused). `reused` is True when the
+        connection came out of the pool rather than being newly created.
+        """
+        self._lock.acquire()
+        try:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if self._is_stale(conn, idle_since):
+                    self.discarded += 1
+                    conn.close()
+                    continue
+                self.reused += 1
+                return conn, True
+            self.created += 1
+        finally:
+            self._lock.release()
+        return self._new_connection(), False
+
+    def get_fresh(self):
+        """Returns a newly created connection, bypassing the idle pool."""
+        self._lock.acquire()
+        try:
+            self.created += 1
+        finally:
+            self._lock.release()
+        return self._new_connection(), False
+
+    def put(self, conn):
+        """Returns a connection whose response has been fully read."""
+        self._lock.acquire()
+        try:
+            if conn.sock is not None and len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.time()))
+                return
+            self.discarded += 1
+        finally:
+            self._lock.release()
+        conn.close()
+
+    def discard(self, conn):
+        """Closes a connection that must not be reused."""
+        self._lock.acquire()
+        try:
+            self.discarded += 1
+        finally:
+            self._lock.release()
+        conn.close()
+
+    def clear(self):
+        """Closes every idle connection in the pool."""
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, []
+        finally:
+            self._lock.release()
+        for conn, idle_since in idle:
+            conn.close()
+
+    def stats(self):
+        self._lock.acquire()
+        try:
+            return dict(created=self.created, reused=self.reused,
+                        discarded=self.discarded, idle=len(self._idle))
+        finally:
+            self._lock.release()
+
+
+class PooledResponse(object):
+    """
+    Wraps an `httplib.HTTPResponse` so that its connection is handed back
+    to the pool as soon as the body has been read to the end. A response
+    that is closed before being fully read takes its connection with it.
+
+    A body sent with a gzip or deflate Content-Encoding is decompressed
+    as it is read; `read(amt)` may then return somewhat more than `amt`
+    bytes.
+
+    Timings for the request are kept as attributes: `connect_time` and
+    `tls_time` (both 0 on a reused connection), `wait_time` (from sending
+    the request to receiving the response headers), `bytes_read` (as
+    received) and `bytes_decoded` (after decompression).
+    """
+
+    def __init__(self, pool, conn, response, reused=False, wait_time=0.0):
+        self._pool = pool
+        self._conn = conn
+        self._response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.msg = response.msg
+        self.reused = reused
+        if reused:
+            self.connect_time = self.tls_time = 0.0
+        else:
+            self.connect_time = conn.connect_time
+            self.tls_time = conn.tls_time
+        self.wait_time = wait_time
+        self.bytes_read = 0
+        self.bytes_decoded = 0
+        self._decoder = decoder_for(response.getheader('Content-Encoding'))
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def getheaders(self):
+        return self._response.getheaders()
+
+    def read(self, amt=None):
+        if self._conn is None:
+            return ''
+        try:
+            data = self._read(amt)
+            if self._decoder is not None:
+                # Keep reading until some output is produced, since an
+                # empty string would look like the end of the body.
+                raw, data = data, self._decoder.decompress(data)
+                while not data and raw:
+                    raw = self._read(amt)
+                    data = self._decoder.decompress(raw)
+                if not raw or self._response.isclosed():
+                    data += self._decoder.flush()
+        except:
+            self.close()
+            raise
+        self.bytes_decoded += len(data)
+        if self._response.isclosed():
+            self.release()
+        return data
+
+    def _read(self, amt):
+        if amt is None:
+            data = self._response.read()
+        else:
+            data = self._response.read(amt)
+        self.bytes_read += len(data)
+        return data
+
+    def release(self):
+        """
+        Returns the connection to the pool if the body has been consumed,
+        or closes it otherwise.
+        """
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool.put(conn)
+        else:
+            self._pool.discard(conn)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.discard(conn)
+
+
+class HTTPTransport(object):
+    """
+    Sends HTTP requests over pooled keep-alive connections, with one
+    `ConnectionPool` per (scheme, host, port). A single transport may be
+    shared by several `IContactClient` instances.
+
+    - maxsize: the number of idle connections kept per host.
+    - idle_timeout: seconds an idle connection may sit in the pool before
+      it is considered stale and closed instead of reused.
+    - timeout: (Optional) socket timeout in seconds for new connections.
+    """
+
+    # Errors that indicate a pooled connection was closed by the server
+    # while it sat idle: the request could not be written, or the server
+    # hung up without a status line. The request is then resent once on
+    # a freshly opened connection (the latter only for idempotent
+    # methods, since the server may have acted on it after all). Other
+    # failures, such as a timeout or reset while waiting for the
+    # response, are left to the caller.
+    STALE_CONNECTION_ERRORS = (RequestNotSentError, httplib.BadStatusLine)
+
+    def __init__(self, maxsize=4, idle_timeout=60.0, timeout=None):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, scheme, host, port=None):
+        key = (scheme, host, port)
+        self._lock.acquire()
+        try:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(scheme, host, port, maxsize=self.maxsize,
+                                      idle_timeout=self.idle_timeout,
+                                      timeout=self.timeout)
+                self._pools[key] = pool
+            return pool
+        finally:
+            self._lock.release()
+
+    def request(self, method, url, body=None, headers={}, idempotent=None):
+        """
+        Sends a request and returns a `PooledResponse`. The caller must
+        read the response body to the end (or close the response) so the
+        connection can be reused.
+
+        `idempotent` says whether the request may be resent after the
+        server could have received it; by default it is True for methods
+        in IDEMPOTENT_METHODS. Errors raised before the request was
+        written are RequestNotSentErrors.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        scheme, netloc, path, params, query, fragment = urlparse.urlparse(url)
+        if ':' in netloc:
+            host, port = netloc.rsplit(':', 1)
+            port = int(port)
+        else:
+            host, port = netloc, None
+        if query:
+            path = '%s?%s' % (path, query)
+        pool = self.get_pool(scheme, host, port)
+
+        conn, reused = pool.get()
+        try:
+            response, wait_time = self._exchange(conn, method, path, body, headers)
+        except self.STALE_CONNECTION_ERRORS as e:
+            pool.discard(conn)
+            if not reused or not (idempotent or isinstance(e, RequestNotSentError)):
+                raise
+            # The pooled socket went away underneath us; try once more on
+            # a brand new connection.
+            conn, reused = pool.get_fresh()
+            try:
+                response, wait_time = self._exchange(conn, method, path, body, headers)
+            except:
+                pool.discard(conn)
+                raise
+        except:
+            pool.discard(conn)
+            raise
+        return PooledResponse(pool, conn, response, reused, wait_time)
+
+    def _exchange(self, conn, method, path, body, headers):
+        try:
+            if conn.sock is None:
+                conn.connect()
+            start = time.time()
+            conn.request(method, path, body, headers)
+        except (socket.error, httplib.HTTPException) as e:
+            raise RequestNotSentError(*e.args or (str(e),)), None, sys.exc_info()[2]
+        response = conn.getresponse()
+        return response, time.time() - start
+
+    def grow(self, maxsize):
+        """
+        Raises the number of idle connections kept per host to at least
+        `maxsize`, e.g. to suit the number of threads sharing the transport.
+        """
+        self._lock.acquire()
+        try:
+            self.maxsize = max(self.maxsize, maxsize)
+            for pool in self._pools.values():
+                pool.maxsize = max(pool.maxsize, maxsize)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Closes all idle connections."""
+        self._lock.acquire()
+        try:
+            pools = self._pools.values()
+        finally:
+            self._lock.release()
+        for pool in pools:
+            pool.clear()
+
+    def stats(self):
+        """
+        Returns connection counters summed over every host:
+        `created` (new connections opened), `reused` (requests sent on a
+        pooled connection), `discarded` (connections closed because they
+        were stale, broken or surplus) and `idle` (currently pooled).
+        """
+        totals = dict(created=0, reused=0, discarded=0, idle=0)
+        self._lock.acquire()
+        try:
+            pools = self._pools.values()
+        finally:
+            self._lock.release()
+        for pool in pools:
+            for k, v in pool.stats().items():
+                totals[k] += v
+        return totals
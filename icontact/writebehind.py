@@ -0,0 +1,364 @@
+# Copyright 2008 Online Agility (www.onlineagility.com)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""
+A write-behind queue for contact and subscription changes.
+
+Instead of waiting for iContact while handling, say, a signup, callers
+enqueue the change and return immediately; a background thread sends the
+queued changes in batches:
+
+  >>> queue = WriteBehindQueue(client, journal='/var/spool/myapp/icontact.journal')
+  >>> queue.create_contact('someone@example.com', firstName='Some')
+  >>> queue.create_subscription('someone@example.com', list_id)
+  ...
+  >>> queue.close()
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from icontact.client import ExcessiveRetriesException, IContactServerError
+from icontact.codec import get_codec
+from icontact.limiter import CircuitOpenError
+
+CREATE_CONTACT = 'create_contact'
+UPDATE_CONTACT = 'update_contact'
+CREATE_SUBSCRIPTION = 'create_subscription'
+
+
+class WriteBehindQueue(object):
+    """
+    Buffers create_contact, update_contact and create_subscription calls
+    and sends them with the client's batch methods once `batch_size`
+    changes are waiting or the oldest has waited `flush_interval` seconds.
+
+    Changes to the same record are merged while they wait: two updates
+    to one contact are sent as a single update with the fields of both,
+    the later value winning where they overlap.
+
+    - journal: (Optional) a file in which queued changes are recorded
+      before the call returns, so that changes not yet sent when the
+      process stops are sent by the next queue opened on the journal.
+      With `fsync`, each change is also flushed to disk.
+    - on_failure: (Optional) called as `on_failure(operation, fields,
+      error)` for each change iContact rejected. Changes that failed
+      because the server could not be reached, answered with a 5xx error,
+      kept rate limiting us or tripped the client's circuit breaker are
+      queued again instead, and after a flush that sent nothing the next
+      is put off for `flush_interval` seconds (or until the circuit
+      breaker lets requests through again).
+    - on_flush: (Optional) called with the `stats()` after each flush.
+
+    Queued changes are sent in the order contacts are created, contacts
+    are updated, then subscriptions are created, so a subscription may
+    name a contact by the email address of a contact queued for creation.
+    """
+
+    def __init__(self, client, batch_size=500, flush_interval=1.0, journal=None,
+                 fsync=False, on_failure=None, on_flush=None):
+        self.client = client
+        self._codec = get_codec()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.fsync = fsync
+        self.on_failure = on_failure
+        self.on_flush = on_flush
+        self.log = logging.getLogger('icontact')
+
+        self._pending = OrderedDict()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._journal_file = None
+        self._resume_at = 0.0
+        self._retry_in = 0.0
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.requeued = 0
+        self.flushes = 0
+        self.flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+        if journal is not None:
+            self._replay()
+            self._journal_file = open(journal, 'a')
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    # Queueing
+
+    def create_contact(self, email, **fields):
+        fields['email'] = email
+        self._enqueue(CREATE_CONTACT, email.lower(), fields)
+
+    def update_contact(self, contact_id, **fields):
+        fields['contactId'] = contact_id
+        self._enqueue(UPDATE_CONTACT, str(contact_id), fields)
+
+    def create_subscription(self, contact, list_id, status='normal'):
+        """
+        Subscribes a contact, given by its contactId or by its email
+        address, to a list.
+        """
+        contact = str(contact)
+        if '@' in contact:
+            contact = contact.lower()
+        self._enqueue(CREATE_SUBSCRIPTION, (contact, str(list_id)), dict(status=status))
+
+    def _enqueue(self, operation, key, fields):
+        self._condition.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError("cannot enqueue after close")
+            if self._journal_file is not None:
+                self._journal_file.write(self._codec.dumps([operation, key, fields]) + '\n')
+                self._journal_file.flush()
+                if self.fsync:
+                    os.fsync(self._journal_file.fileno())
+            self._add(operation, key, fields)
+            self.enqueued += 1
+            if len(self._pending) >= self.batch_size or len(self._pending) == 1:
+                self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def _add(self, operation, key, fields, older=False):
+        """Queues a change, merging it into any change waiting for the same record."""
+        queued = self._pending.get((operation, key))
+        if queued is None:
+            self._pending[(operation, key)] = dict(fields)
+            if self._oldest is None:
+                self._oldest = time.time()
+            return
+        self.coalesced += 1
+        if older:
+            merged = dict(fields)
+            merged.update(queued)
+            self._pending[(operation, key)] = merged
+        else:
+            queued.update(fields)
+
+    # Flushing
+
+    def _run(self):
+        self._condition.acquire()
+        try:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                now = time.time()
+                wait = self._oldest + self.flush_interval - now
+                if len(self._pending) < self.batch_size and wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                if self._resume_at > now:
+                    # The last flush could not send anything.
+                    self._condition.wait(self._resume_at - now)
+                    continue
+                self._condition.release()
+                try:
+                    self.flush()
+                except Exception:
+                    self.log.exception("Write-behind flush failed")
+                finally:
+                    self._condition.acquire()
+        finally:
+            self._condition.release()
+
+    def flush(self):
+        """Sends every queued change now, returning once they have been sent."""
+        self._flush_lock.acquire()
+        try:
+            self._lock.acquire()
+            try:
+                batch, self._pending = self._pending, OrderedDict()
+                self._oldest = None
+            finally:
+                self._lock.release()
+            if not batch:
+                return
+            start = time.time()
+            retry = []
+            done = self.sent + self.failed
+            self._retry_in = 0.0
+            try:
+                self._send(batch, retry)
+            except Exception:
+                # Send the whole batch again later; creates and updates are
+                # keyed on email or contactId, so repeating one is harmless.
+                retry = batch.items()
+                raise
+            finally:
+                latency = time.time() - start
+                self._lock.acquire()
+                try:
+                    for (operation, key), fields in retry:
+                        self._add(operation, key, fields, older=True)
+                    self.requeued += len(retry)
+                    if retry and self.sent + self.failed == done:
+                        self._resume_at = time.time() + max(self.flush_interval,
+                                                            self._retry_in)
+                    self.flushes += 1
+                    self.flush_latency = latency
+                    self.max_flush_latency = max(self.max_flush_latency, latency)
+                    if self._journal_file is not None:
+                        self._rewrite_journal()
+                finally:
+                    self._lock.release()
+        finally:
+            self._flush_lock.release()
+        if self.on_flush is not None:
+            self.on_flush(self.stats())
+
+    def _send(self, batch, retry):
+        groups = dict([(op, []) for op in (CREATE_CONTACT, UPDATE_CONTACT,
+                                           CREATE_SUBSCRIPTION)])
+        for (operation, key), fields in batch.items():
+            groups[operation].append((key, fields))
+
+        contact_ids = {}
+        for operation, method in ((CREATE_CONTACT, self.client.create_contacts),
+                                  (UPDATE_CONTACT, self.client.update_contacts)):
+            changes = groups[operation]
+            if not changes:
+                continue
+            result = method([fields for key, fields in changes], chunk_size=self.batch_size)
+            for item in result:
+                key, fields = changes[item.index]
+                # Unchanged updates skipped by the client's fingerprints
+                # have no result, and count as sent.
+                if operation == CREATE_CONTACT and item.result is not None:
+                    contact_ids[fields.get('email', '').lower()] = item.result.contactId
+                self._done(operation, key, fields, item.error, retry)
+
+        changes = []
+        for (contact, list_id), fields in groups[CREATE_SUBSCRIPTION]:
+            contact_id = contact
+            if '@' in contact:
+                try:
+                    contact_id = contact_ids.get(contact) or self._lookup(contact)
+                except Exception as e:
+                    self._done(CREATE_SUBSCRIPTION, (contact, list_id), fields, e, retry)
+                    continue
+            if contact_id is None:
+                self._done(CREATE_SUBSCRIPTION, (contact, list_id), fields,
+                           'No contact with email %s' % contact, retry)
+            else:
+                changes.append(((contact, list_id), fields, contact_id))
+        if changes:
+            result = self.client.create_subscriptions(
+                [(contact_id, key[1], fields['status']) for key, fields, contact_id in changes],
+                chunk_size=self.batch_size)
+            for item in result:
+                key, fields, contact_id = changes[item.index]
+                self._done(CREATE_SUBSCRIPTION, key, fields, item.error, retry)
+
+    def _lookup(self, email):
+        contacts = self.client.search_contacts(email=email).contacts
+        return contacts and contacts[0].contactId or None
+
+    def _done(self, operation, key, fields, error, retry):
+        if error is None:
+            self.sent += 1
+        elif isinstance(error, (ExcessiveRetriesException, CircuitOpenError)) or \
+                 (isinstance(error, IContactServerError) and error.http_status >= 500) or \
+                 self.client.retry_policy.is_retryable_error(error):
+            if isinstance(error, CircuitOpenError):
+                self._retry_in = max(self._retry_in, error.retry_in)
+            retry.append(((operation, key), fields))
+        else:
+            self.failed += 1
+            if self.on_failure is not None:
+                try:
+                    self.on_failure(operation, fields, error)
+                except Exception:
+                    self.log.exception("Write-behind failure callback failed")
+            else:
+                self.log.error("%s %r failed: %s", operation, fields, error)
+
+    # Journal
+
+    def _replay(self):
+        if not os.path.exists(self.journal):
+            return
+        f = open(self.journal)
+        try:
+            for line in f:
+                try:
+                    operation, key, fields = self._codec.loads(line)
+                except ValueError:
+                    # A change cut short by a crash was never acknowledged.
+                    continue
+                if isinstance(key, list):
+                    key = tuple(key)
+                self._add(operation, key, fields)
+        finally:
+            f.close()
+
+    def _rewrite_journal(self):
+        """Replaces the journal with the changes still queued."""
+        directory = os.path.dirname(os.path.abspath(self.journal))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        f = os.fdopen(fd, 'w')
+        try:
+            for (operation, key), fields in self._pending.items():
+                f.write(self._codec.dumps([operation, key, fields]) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(tmp, self.journal)
+        self._journal_file.close()
+        self._journal_file = open(self.journal, 'a')
+
+    # Status
+
+    def depth(self):
+        """Returns the number of changes waiting to be sent."""
+        return len(self._pending)
+
+    def stats(self):
+        return dict(depth=len(self._pending), enqueued=self.enqueued,
+                    coalesced=self.coalesced, sent=self.sent, failed=self.failed,
+                    requeued=self.requeued, flushes=self.flushes,
+                    flush_latency=self.flush_latency,
+                    max_flush_latency=self.max_flush_latency)
+
+    def close(self):
+        """Sends the remaining changes and stops the background thread."""
+        self._condition.acquire()
+        try:
+            self._closed = True
+            self._condition.notify()
+        finally:
+            self._condition.release()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None